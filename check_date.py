@@ -2,7 +2,22 @@
 检查K线数据文件中是否包含指定日期的数据
 """
 import json
-from datetime import datetime
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+
+def kline_to_dict(kline) -> dict:
+    """把一根原始K线转换成输出用的字典"""
+    timestamp = int(kline[0])
+    return {
+        'timestamp': timestamp,
+        'datetime': datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M'),
+        'open': float(kline[1]),
+        'high': float(kline[2]),
+        'low': float(kline[3]),
+        'close': float(kline[4]),
+        'volume': float(kline[5])
+    }
 
 
 def check_date_in_klines(json_file: str, target_date: str) -> dict:
@@ -40,28 +55,27 @@ def check_date_in_klines(json_file: str, target_date: str) -> dict:
         first_date = datetime.fromtimestamp(first_ts / 1000).strftime('%Y-%m-%d %H:%M')
         last_date = datetime.fromtimestamp(last_ts / 1000).strftime('%Y-%m-%d %H:%M')
         
-        # 查找目标日期的K线
-        target_klines = []
-        for kline in klines:
-            timestamp = int(kline[0])
-            kline_date = datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d')
-            
-            if kline_date == target_date:
-                target_klines.append({
-                    'timestamp': timestamp,
-                    'datetime': datetime.fromtimestamp(timestamp / 1000).strftime('%Y-%m-%d %H:%M'),
-                    'open': float(kline[1]),
-                    'high': float(kline[2]),
-                    'low': float(kline[3]),
-                    'close': float(kline[4]),
-                    'volume': float(kline[5])
-                })
+        # K线按时间升序排列，二分查找该日期K线的起止位置，不用逐根格式化日期
+        start = end = 0
+        try:
+            day_start = datetime.strptime(target_date, '%Y-%m-%d')
+        except ValueError:
+            day_start = None
+        # 日期格式不对(或不是补零的YYYY-MM-DD)时没有K线能匹配，仍返回文件的日期范围
+        if day_start is not None and day_start.strftime('%Y-%m-%d') == target_date:
+            # 目标日期只换算一次: 当天0点到次日0点(本地时间)的毫秒时间戳
+            start_ts = int(day_start.timestamp() * 1000)
+            end_ts = int((day_start + timedelta(days=1)).timestamp() * 1000)
+            ts = [int(k[0]) for k in klines]
+            start = bisect_left(ts, start_ts)
+            end = bisect_left(ts, end_ts, lo=start)
+        count = end - start
         
         return {
-            'found': len(target_klines) > 0,
-            'count': len(target_klines),
-            'first_kline': target_klines[0] if target_klines else None,
-            'last_kline': target_klines[-1] if target_klines else None,
+            'found': count > 0,
+            'count': count,
+            'first_kline': kline_to_dict(klines[start]) if count else None,
+            'last_kline': kline_to_dict(klines[end - 1]) if count else None,
             'date_range': f"{first_date} 至 {last_date}",
             'total_klines': len(klines)
         }
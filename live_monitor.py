@@ -20,12 +20,23 @@ import urllib.request
 import urllib.error
 import json
 import time
+import random
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
 from datetime import datetime
 from typing import List, Dict, Optional
 import winsound  # Windows系统通知音
 import ctypes  # Windows消息框
 import threading  # 多线程播放声音
 
+# websockets可选: 安装后可使用websocket组合流监听，未安装时只能使用REST轮询
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+
 
 class BinanceLiveAPI:
     """币安实时API接口，带多端点与重试"""
@@ -142,25 +153,54 @@ class SimpleKLine:
         return f"K[{dt.strftime('%H:%M')}, O:{self.open:.2f}, H:{self.high:.2f}, L:{self.low:.2f}, C:{self.close:.2f}]"
 
 
+@dataclass
+class SymbolState:
+    """单个交易对的监听状态"""
+    symbol: str
+    last_15m_kline: Optional[SimpleKLine] = None  # 上一根完整的15分钟K线
+    current_15m_start_time: int = 0  # 当前15分钟K线的开始时间
+    alerted_signals: set = field(default_factory=set)  # 已通知的信号(避免重复通知)
+    
+    # 突破状态记录
+    breakout_high: bool = False  # 是否已突破最高点
+    breakout_low: bool = False   # 是否已突破最低点
+    breakout_high_price: float = 0.0  # 突破最高点的价格
+    breakout_low_price: float = 0.0   # 突破最低点的价格
+    
+    # 信号记录(用于延迟弹窗通知)
+    pending_signal: Optional[Dict] = None  # 待通知的信号
+    popup_notified: bool = False  # 本周期是否已弹窗通知
+    
+    # websocket模式下最近3根1分钟K线(最后一根为当前K线)
+    recent_1m: deque = field(default_factory=lambda: deque(maxlen=3))
+    
+    def reset_cycle(self):
+        """清空本周期的通知记录和突破状态"""
+        self.alerted_signals.clear()
+        self.breakout_high = False
+        self.breakout_low = False
+        self.breakout_high_price = 0.0
+        self.breakout_low_price = 0.0
+        self.pending_signal = None
+        self.popup_notified = False
+
+
 class LiveMonitor:
-    """实时监听器"""
+    """实时监听器(支持多个交易对)"""
+    
+    WS_URL = "wss://stream.binance.com:9443/stream?streams="
+    # websocket重连退避：首次等待3秒，连续失败时翻倍（上限60秒），并叠加随机抖动
+    RECONNECT_DELAY_MIN = 3
+    RECONNECT_DELAY_MAX = 60
     
-    def __init__(self, min_k1_range_percent: float = 0.21, serverchan_sendkey: str = None):
+    def __init__(self, symbols: List[str] = None, min_k1_range_percent: float = 0.21,
+                 serverchan_sendkey: str = None):
         self.min_k1_range = min_k1_range_percent / 100  # 转换为小数
-        self.last_15m_kline = None  # 上一根完整的15分钟K线
-        self.current_15m_start_time = 0  # 当前15分钟K线的开始时间
-        self.alerted_signals = set()  # 已通知的信号(避免重复通知)
         self.api = BinanceLiveAPI()
         
-        # 突破状态记录
-        self.breakout_high = False  # 是否已突破最高点
-        self.breakout_low = False   # 是否已突破最低点
-        self.breakout_high_price = 0.0  # 突破最高点的价格
-        self.breakout_low_price = 0.0   # 突破最低点的价格
-        
-        # 信号记录(用于延迟弹窗通知)
-        self.pending_signal = None  # 待通知的信号
-        self.popup_notified = False  # 本周期是否已弹窗通知
+        # 每个交易对一份监听状态
+        symbols = symbols or ["BTCUSDT"]
+        self.states: Dict[str, SymbolState] = {sym.upper(): SymbolState(sym.upper()) for sym in symbols}
         
         # 微信通知配置
         self.serverchan_sendkey = serverchan_sendkey
@@ -170,12 +210,28 @@ class LiveMonitor:
         self.failed_count = 0   # 失败次数
         self.last_success_time = time.time()  # 上次成功请求时间
         
+        # 日志时间格式化缓存(秒级)
+        self._hms_t = -1
+        self._hms_s = ""
+        
+        # 异步运行时的事件循环(由run_async设置)
+        self._loop = None
+        self._15m_ready = None  # 首次15分钟K线更新完成事件
+        
+    def _hms(self) -> str:
+        """当前时间 HH:MM:SS，同一秒内复用格式化结果"""
+        t = int(time.time())
+        if t != self._hms_t:
+            self._hms_t = t
+            self._hms_s = time.strftime('%H:%M:%S', time.localtime(t))
+        return self._hms_s
+    
     def check_k1_qualification(self, k1: SimpleKLine) -> bool:
         """检查K1是否符合涨跌幅要求"""
         body_range = k1.get_body_range()
         return body_range >= self.min_k1_range
     
-    def check_signal(self, k1_15m: SimpleKLine, k1_1m: SimpleKLine) -> Optional[Dict]:
+    def check_signal(self, state: SymbolState, k1_15m: SimpleKLine, k1_1m: SimpleKLine) -> Optional[Dict]:
         """
         检查1分钟K线是否满足信号条件
         
@@ -185,6 +241,7 @@ class LiveMonitor:
         3. 如果同时突破最高点和最低点(吞噬形态),返回'engulfed'信号,策略失效
         
         参数:
+            state: 交易对监听状态
             k1_15m: 前一根15分钟K线(已完成)
             k1_1m: 当前1分钟K线
         
@@ -194,25 +251,25 @@ class LiveMonitor:
         """
         # 检测是否突破最高点
         if k1_1m.high > k1_15m.high:
-            if not self.breakout_high:
-                self.breakout_high = True
-                self.breakout_high_price = k1_1m.high
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⬆️ 检测到向上突破! 突破价:{k1_1m.high:.2f} > 参考最高:{k1_15m.high:.2f}")
+            if not state.breakout_high:
+                state.breakout_high = True
+                state.breakout_high_price = k1_1m.high
+                print(f"\n[{self._hms()}] [{state.symbol}] ⬆️ 检测到向上突破! 突破价:{k1_1m.high:.2f} > 参考最高:{k1_15m.high:.2f}")
                 print(f"    等待收盘价回到区间内 [{k1_15m.low:.2f} - {k1_15m.high:.2f}] 以触发做空信号...")
         
         # 检测是否突破最低点
         if k1_1m.low < k1_15m.low:
-            if not self.breakout_low:
-                self.breakout_low = True
-                self.breakout_low_price = k1_1m.low
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⬇️ 检测到向下突破! 突破价:{k1_1m.low:.2f} < 参考最低:{k1_15m.low:.2f}")
+            if not state.breakout_low:
+                state.breakout_low = True
+                state.breakout_low_price = k1_1m.low
+                print(f"\n[{self._hms()}] [{state.symbol}] ⬇️ 检测到向下突破! 突破价:{k1_1m.low:.2f} < 参考最低:{k1_15m.low:.2f}")
                 print(f"    等待收盘价回到区间内 [{k1_15m.low:.2f} - {k1_15m.high:.2f}] 以触发做多信号...")
         
         # 检测吞噬形态: 同时突破最高点和最低点
-        if self.breakout_high and self.breakout_low:
-            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 检测到吞噬形态! 1分钟K线同时突破上下边界")
-            print(f"    最高突破: {self.breakout_high_price:.2f} > {k1_15m.high:.2f}")
-            print(f"    最低突破: {self.breakout_low_price:.2f} < {k1_15m.low:.2f}")
+        if state.breakout_high and state.breakout_low:
+            print(f"\n[{self._hms()}] [{state.symbol}] ⚠️ 检测到吞噬形态! 1分钟K线同时突破上下边界")
+            print(f"    最高突破: {state.breakout_high_price:.2f} > {k1_15m.high:.2f}")
+            print(f"    最低突破: {state.breakout_low_price:.2f} < {k1_15m.low:.2f}")
             print(f"    策略失效，重新寻找符合条件的15分钟K线...")
             return {'type': 'engulfed'}
         
@@ -223,30 +280,32 @@ class LiveMonitor:
             return None
         
         # 如果之前向上突破过,现在收盘价回到区间 -> 做空信号
-        if self.breakout_high:
-            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ✅ 收盘价已回到区间内! 当前价:{k1_1m.close:.2f} 在 [{k1_15m.low:.2f} - {k1_15m.high:.2f}]")
+        if state.breakout_high:
+            print(f"\n[{self._hms()}] [{state.symbol}] ✅ 收盘价已回到区间内! 当前价:{k1_1m.close:.2f} 在 [{k1_15m.low:.2f} - {k1_15m.high:.2f}]")
             return {
+                'symbol': state.symbol,
                 'type': 'short',
                 'direction': '做空',
                 'k15m': k1_15m,
                 'k1m': k1_1m,
                 'breakout_type': '向上突破后回落',
-                'breakout_price': self.breakout_high_price,
+                'breakout_price': state.breakout_high_price,
                 'reference_price': k1_15m.high,
                 'current_price': k1_1m.close,
                 'timestamp': k1_1m.timestamp
             }
         
         # 如果之前向下突破过,现在收盘价回到区间 -> 做多信号
-        if self.breakout_low:
-            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ✅ 收盘价已回到区间内! 当前价:{k1_1m.close:.2f} 在 [{k1_15m.low:.2f} - {k1_15m.high:.2f}]")
+        if state.breakout_low:
+            print(f"\n[{self._hms()}] [{state.symbol}] ✅ 收盘价已回到区间内! 当前价:{k1_1m.close:.2f} 在 [{k1_15m.low:.2f} - {k1_15m.high:.2f}]")
             return {
+                'symbol': state.symbol,
                 'type': 'long',
                 'direction': '做多',
                 'k15m': k1_15m,
                 'k1m': k1_1m,
                 'breakout_type': '向下突破后回升',
-                'breakout_price': self.breakout_low_price,
+                'breakout_price': state.breakout_low_price,
                 'reference_price': k1_15m.low,
                 'current_price': k1_1m.close,
                 'timestamp': k1_1m.timestamp
@@ -266,6 +325,7 @@ class LiveMonitor:
             return False
         
         try:
+            symbol = signal['symbol']
             direction = signal['direction']
             current_price = signal['current_price']
             reference_price = signal['reference_price']
@@ -273,12 +333,13 @@ class LiveMonitor:
             signal_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
             # 构建通知标题和内容
-            title = f"🚨 BTC交易信号 - {direction}"
+            title = f"🚨 {symbol}交易信号 - {direction}"
             
             # 使用Markdown格式构建内容
             content = f"""
 ## 交易信号提醒
 
+**交易对:** {symbol}  
 **方向:** {direction}  
 **当前价格:** {current_price:.2f} USDT  
 **参考价格:** {reference_price:.2f} USDT  
@@ -287,7 +348,7 @@ class LiveMonitor:
 ---
 
 **时间:** {signal_time}  
-**策略:** BTC 15分钟K线策略  
+**策略:** {symbol} 15分钟K线策略  
 
 > 💡 15分钟周期即将结束，建议立即查看行情！
 """
@@ -330,7 +391,8 @@ class LiveMonitor:
             show_popup: 是否显示弹窗(仅在15分钟周期快结束时显示)
         """
         # 格式化通知信息
-        signal_time = datetime.now().strftime('%H:%M:%S')
+        signal_time = self._hms()
+        symbol = signal['symbol']
         direction = signal['direction']
         current_price = signal['current_price']
         breakout_type = signal['breakout_type']
@@ -341,6 +403,7 @@ class LiveMonitor:
         print(f"🚨🚨🚨 交易信号触发! 🚨🚨🚨")
         print(f"{'='*80}")
         print(f"时间: {signal_time}")
+        print(f"交易对: {symbol}")
         print(f"方向: {direction}")
         print(f"当前价格: {current_price:.2f}")
         print(f"参考价格: {reference_price:.2f}")
@@ -374,13 +437,14 @@ class LiveMonitor:
             # 构建弹窗消息
             message = (
                 f"🚨 交易信号提醒!\n\n"
+                f"交易对: {symbol}\n"
                 f"方向: {direction}\n"
                 f"当前价格: {current_price:.2f}\n"
                 f"参考价格: {reference_price:.2f}\n"
                 f"突破类型: {breakout_type}\n\n"
                 f"15分钟周期即将结束，请查看行情!"
             )
-            title = f"⚠️ {direction}信号 - BTC 15分钟策略"
+            title = f"⚠️ {direction}信号 - {symbol} 15分钟策略"
             
             # MB_ICONWARNING (0x30) = 警告图标
             # MB_TOPMOST (0x40000) = 窗口置顶
@@ -400,21 +464,39 @@ class LiveMonitor:
         try:
             for i in range(10):
                 if i % 2 == 0:
-                    ctypes.windll.kernel32.SetConsoleTitleW(f"🚨🚨🚨 {direction}信号! 🚨🚨🚨")
+                    ctypes.windll.kernel32.SetConsoleTitleW(f"🚨🚨🚨 {symbol} {direction}信号! 🚨🚨🚨")
                 else:
-                    ctypes.windll.kernel32.SetConsoleTitleW(f"实时监听器 - BTC 15分钟策略")
+                    ctypes.windll.kernel32.SetConsoleTitleW("实时监听器 - 15分钟策略")
                 time.sleep(0.3)
             # 恢复原标题
-            ctypes.windll.kernel32.SetConsoleTitleW("实时监听器 - BTC 15分钟策略")
+            ctypes.windll.kernel32.SetConsoleTitleW("实时监听器 - 15分钟策略")
         except:
             pass
     
-    def update_15m_kline(self):
-        """更新15分钟K线数据"""
-        klines_15m = self.api.get_latest_klines(symbol="BTCUSDT", interval="15m", limit=2)
+    def dispatch_notification(self, signal: Dict):
+        """
+        弹窗通知分发
+        
+        微信请求和标题闪烁都是阻塞操作，异步运行时放到线程池执行，避免卡住事件循环
+        """
+        if self._loop is not None and self._loop.is_running():
+            self._loop.run_in_executor(None, self.send_notification, signal, True)
+        else:
+            self.send_notification(signal, show_popup=True)
+    
+    def update_15m_kline(self, state: SymbolState, klines_15m: List[List] = None):
+        """
+        更新15分钟K线数据
+        
+        参数:
+            state: 交易对监听状态
+            klines_15m: 已获取的15分钟K线(为None时自动请求)
+        """
+        if klines_15m is None:
+            klines_15m = self.api.get_latest_klines(symbol=state.symbol, interval="15m", limit=2)
         if len(klines_15m) < 2:
             if len(klines_15m) == 0:
-                print(f"[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 获取15分钟K线失败，跳过本次检查", end='\r')
+                print(f"[{self._hms()}] [{state.symbol}] ⚠️ 获取15分钟K线失败，跳过本次检查", end='\r')
             return False
         
         # 倒数第二根是已完成的K线
@@ -422,129 +504,125 @@ class LiveMonitor:
         prev_kline = SimpleKLine(prev_kline_data)
         
         # 如果是新的15分钟K线周期
-        if self.last_15m_kline is None or prev_kline.timestamp != self.last_15m_kline.timestamp:
+        if state.last_15m_kline is None or prev_kline.timestamp != state.last_15m_kline.timestamp:
             # 检查是否符合涨跌幅要求
             if self.check_k1_qualification(prev_kline):
-                self.last_15m_kline = prev_kline
+                state.last_15m_kline = prev_kline
                 current_kline_data = klines_15m[-1]
-                self.current_15m_start_time = current_kline_data[0]
+                state.current_15m_start_time = current_kline_data[0]
                 
                 # 新周期开始,清空已通知信号和突破状态
-                self.alerted_signals.clear()
-                self.breakout_high = False
-                self.breakout_low = False
-                self.breakout_high_price = 0.0
-                self.breakout_low_price = 0.0
-                self.pending_signal = None
-                self.popup_notified = False
+                state.reset_cycle()
                 
-                print(f"\n✓ [{datetime.now().strftime('%H:%M:%S')}] 15分钟K线符合条件! 涨跌幅:{prev_kline.get_body_range()*100:.3f}% 开始监听1分钟K线")
+                print(f"\n✓ [{self._hms()}] [{state.symbol}] 15分钟K线符合条件! 涨跌幅:{prev_kline.get_body_range()*100:.3f}% 开始监听1分钟K线")
                 
                 return True
             else:
                 # 不符合条件，清除监听
-                if self.last_15m_kline is not None:
-                    print(f"\n✗ [{datetime.now().strftime('%H:%M:%S')}] 15分钟K线涨跌幅不足,停止监听")
-                self.last_15m_kline = None
-                self.current_15m_start_time = 0
-                self.alerted_signals.clear()
-                self.breakout_high = False
-                self.breakout_low = False
-                self.breakout_high_price = 0.0
-                self.breakout_low_price = 0.0
-                self.pending_signal = None
-                self.popup_notified = False
+                if state.last_15m_kline is not None:
+                    print(f"\n✗ [{self._hms()}] [{state.symbol}] 15分钟K线涨跌幅不足,停止监听")
+                state.last_15m_kline = None
+                state.current_15m_start_time = 0
+                state.reset_cycle()
         
         return False
     
-    def check_1m_klines(self):
-        """检查1分钟K线"""
-        if self.last_15m_kline is None:
+    def check_1m_klines(self, state: SymbolState, klines_1m: List[List] = None, fetch_missing: bool = True):
+        """
+        检查1分钟K线
+        
+        参数:
+            state: 交易对监听状态
+            klines_1m: 已获取的最近1分钟K线(为None时自动请求)，最后一根为当前K线
+            fetch_missing: 后三根检查时K线不足3根是否同步请求补齐；
+                           在事件循环中调用时传False(由调用方提前在线程中补齐)，避免阻塞事件循环
+        """
+        if state.last_15m_kline is None:
             return
 
         # 获取最新的1分钟K线
-        klines_1m = self.api.get_latest_klines(symbol="BTCUSDT", interval="1m", limit=1)
+        if klines_1m is None:
+            klines_1m = self.api.get_latest_klines(symbol=state.symbol, interval="1m", limit=1)
         if not klines_1m:
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 获取1分钟K线失败，跳过本次检查", end='\r')
+            print(f"[{self._hms()}] [{state.symbol}] ⚠️ 获取1分钟K线失败，跳过本次检查", end='\r')
             return
 
-        k1m = SimpleKLine(klines_1m[0])
+        k1m = SimpleKLine(klines_1m[-1])
 
         # 计算当前1分钟K线在15分钟周期中的位置
         # 15分钟 = 15根1分钟K线
         # 倒数第二根 = 第13根 (0-based index: 12)
-        time_since_15m_start = (k1m.timestamp - self.current_15m_start_time) / 60000  # 转换为分钟
+        time_since_15m_start = (k1m.timestamp - state.current_15m_start_time) / 60000  # 转换为分钟
         minutes_in_period = int(time_since_15m_start)
 
         # 检查是否还在当前15分钟周期内 (如果超过15分钟,说明进入了新周期)
-        if k1m.timestamp < self.current_15m_start_time or minutes_in_period >= 15:
+        if k1m.timestamp < state.current_15m_start_time or minutes_in_period >= 15:
             # 新周期开始,等待下次15分钟K线更新
             if minutes_in_period >= 15:
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] 15分钟周期已结束，等待下一个周期...")
+                print(f"\n[{self._hms()}] [{state.symbol}] 15分钟周期已结束，等待下一个周期...")
             return
 
         # 打印每分钟K线 (包含突破状态和周期位置)
         status = ""
-        if self.breakout_high:
+        if state.breakout_high:
             status = " [已突破上方]"
-        elif self.breakout_low:
+        elif state.breakout_low:
             status = " [已突破下方]"
 
-        if self.pending_signal and not self.popup_notified:
+        if state.pending_signal and not state.popup_notified:
             status += f" [有信号-等待第13分钟弹窗]"
 
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] 1分钟K线({minutes_in_period+1}/15): O:{k1m.open:.2f} H:{k1m.high:.2f} L:{k1m.low:.2f} C:{k1m.close:.2f}{status}", end='\r')
+        print(f"[{self._hms()}] [{state.symbol}] 1分钟K线({minutes_in_period+1}/15): O:{k1m.open:.2f} H:{k1m.high:.2f} L:{k1m.low:.2f} C:{k1m.close:.2f}{status}", end='\r')
 
         # 检查是否满足信号条件
-        signal = self.check_signal(self.last_15m_kline, k1m)
+        signal = self.check_signal(state, state.last_15m_kline, k1m)
 
         if signal:
             # 检测到吞噬形态,策略失效,清除监听状态
             if signal.get('type') == 'engulfed':
                 print(f"\n{'='*80}")
-                print(f"⚠️ 吞噬形态导致策略失效,停止当前监听")
+                print(f"⚠️ [{state.symbol}] 吞噬形态导致策略失效,停止当前监听")
                 print(f"{'='*80}\n")
                 # 清除监听状态,等待下一个符合条件的15分钟K线
-                self.last_15m_kline = None
-                self.current_15m_start_time = 0
-                self.alerted_signals.clear()
-                self.breakout_high = False
-                self.breakout_low = False
-                self.breakout_high_price = 0.0
-                self.breakout_low_price = 0.0
-                self.pending_signal = None
-                self.popup_notified = False
+                state.last_15m_kline = None
+                state.current_15m_start_time = 0
+                state.reset_cycle()
                 return
             
             # 生成唯一标识，避免重复通知同一根1分钟K线
             signal_key = f"{signal['type']}_{k1m.timestamp}"
 
-            if signal_key not in self.alerted_signals:
-                print(f"\n>>> 检测到信号! 类型:{signal['type']} 价格:{signal['current_price']:.2f}")
+            if signal_key not in state.alerted_signals:
+                print(f"\n>>> [{state.symbol}] 检测到信号! 类型:{signal['type']} 价格:{signal['current_price']:.2f}")
                 # 首次检测到信号，只打印，不弹窗
                 self.send_notification(signal, show_popup=False)
-                self.alerted_signals.add(signal_key)
+                state.alerted_signals.add(signal_key)
                 # 保存信号，等待倒数第二根1分钟K线时弹窗
-                if self.pending_signal is None:
-                    self.pending_signal = signal
+                if state.pending_signal is None:
+                    state.pending_signal = signal
 
         # 检查是否到了倒数第二根1分钟K线 (第13根，即minutes_in_period == 12)
         # 新逻辑：只要后三根1分钟K线中任意一根在区间内，就发送微信提醒
-        if minutes_in_period == 12 and self.pending_signal and not self.popup_notified:
-            # 获取倒数后三根1分钟K线
-            klines_1m_last3 = self.api.get_latest_klines(symbol="BTCUSDT", interval="1m", limit=3)
+        if minutes_in_period == 12 and state.pending_signal and not state.popup_notified:
+            # 获取倒数后三根1分钟K线(已随本次请求获取则直接复用)
+            if len(klines_1m) >= 3:
+                klines_1m_last3 = klines_1m[-3:]
+            elif fetch_missing:
+                klines_1m_last3 = self.api.get_latest_klines(symbol=state.symbol, interval="1m", limit=3)
+            else:
+                klines_1m_last3 = klines_1m
             if len(klines_1m_last3) == 3:
                 # 只要后三根1分钟K线中任意一根的收盘价在15分钟K线区间内，即发送通知
                 any_in_range = False
                 in_range_count = 0
                 
                 print(f"\n\n{'='*80}")
-                print(f"📊 检查后三根1分钟K线 (15分钟K线区间: [{self.last_15m_kline.low:.2f} - {self.last_15m_kline.high:.2f}])")
+                print(f"📊 [{state.symbol}] 检查后三根1分钟K线 (15分钟K线区间: [{state.last_15m_kline.low:.2f} - {state.last_15m_kline.high:.2f}])")
                 print(f"{'-'*80}")
                 
                 for i, kline_data in enumerate(klines_1m_last3, 1):
                     k = SimpleKLine(kline_data)
-                    is_in_range = self.last_15m_kline.low <= k.close <= self.last_15m_kline.high
+                    is_in_range = state.last_15m_kline.low <= k.close <= state.last_15m_kline.high
                     status = "✓ 在区间内" if is_in_range else "✗ 不在区间内"
                     time_str = datetime.fromtimestamp(k.timestamp/1000).strftime('%H:%M')
                     print(f"  第{i}根 [{time_str}]: 收盘价 {k.close:.2f} {status}")
@@ -560,8 +638,8 @@ class LiveMonitor:
                 if any_in_range:
                     print(f"✅ 发送微信通知! (有{in_range_count}根K线在区间内)")
                     print(f"{'='*80}\n")
-                    self.send_notification(self.pending_signal, show_popup=True)
-                    self.popup_notified = True
+                    self.dispatch_notification(state.pending_signal)
+                    state.popup_notified = True
                 else:
                     print(f"❌ 不发送微信通知 (后三根K线均不在区间内)")
                     print(f"{'='*80}\n")
@@ -570,39 +648,152 @@ class LiveMonitor:
                 print(f"⚠️ 15分钟周期倒数第二根K线，获取后三根1分钟K线失败(网络问题)，不发送微信通知!")
                 print(f"{'='*80}\n")
     
-    def run(self, check_interval: int = 10):
+    async def _refresh_15m_loop(self):
+        """每分钟检查一次所有交易对的15分钟K线"""
+        states = list(self.states.values())
+        while True:
+            results = await asyncio.gather(*[
+                asyncio.to_thread(self.api.get_latest_klines, symbol=state.symbol, interval="15m", limit=2)
+                for state in states
+            ])
+            for state, klines_15m in zip(states, results):
+                self.update_15m_kline(state, klines_15m)
+            self._15m_ready.set()
+            await asyncio.sleep(60)
+    
+    async def _check_1m_loop(self, check_interval: int):
+        """按检查间隔轮询正在监听的交易对的1分钟K线"""
+        # 等待首次15分钟K线更新完成
+        await self._15m_ready.wait()
+        while True:
+            # 只检查正在监听的交易对
+            watching = [state for state in self.states.values() if state.last_15m_kline is not None]
+            if watching:
+                # 一次取3根，第13分钟检查后三根时无需再次请求
+                results = await asyncio.gather(*[
+                    asyncio.to_thread(self.api.get_latest_klines, symbol=state.symbol, interval="1m", limit=3)
+                    for state in watching
+                ])
+                for state, klines_1m in zip(watching, results):
+                    self.check_1m_klines(state, klines_1m)
+            else:
+                print(f"[{self._hms()}] 等待符合条件的15分钟K线...", end='\r')
+            
+            await asyncio.sleep(check_interval)
+    
+    def _print_banner(self, mode: str):
+        symbols = ",".join(self.states)
+        print("="*80)
+        print(f"实时监听器启动 | 交易对:{symbols} | K1涨跌幅>={self.min_k1_range*100:.2f}% | {mode}")
+        print("="*80)
+    
+    async def run_async(self, check_interval: int = 10):
         """
-        运行监听器
+        运行监听器(异步轮询)
+        
+        15分钟K线刷新和1分钟K线检查作为两个独立任务运行在同一个事件循环中，
+        网络请求放到线程中执行，状态只在事件循环线程中修改
         
         参数:
             check_interval: 检查间隔(秒)
         """
-        print("="*80)
-        print(f"实时监听器启动 | 交易对:BTCUSDT | K1涨跌幅>={self.min_k1_range*100:.2f}% | 间隔:{check_interval}秒")
-        print("="*80)
+        self._print_banner(f"间隔:{check_interval}秒")
+        
+        self._loop = asyncio.get_running_loop()
+        self._15m_ready = asyncio.Event()
+        
+        tasks = [
+            asyncio.create_task(self._refresh_15m_loop()),
+            asyncio.create_task(self._check_1m_loop(check_interval)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._loop = None
+    
+    async def _on_ws_kline(self, state: SymbolState, k: Dict):
+        """处理websocket推送的一条K线事件"""
+        kline_data = [k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T']]
+        
+        if k['i'] == '15m':
+            # 15分钟K线收盘: 已完成的K线 + 下一根K线的开始时间
+            if k['x']:
+                next_start = k['T'] + 1
+                close = k['c']
+                next_kline = [next_start, close, close, close, close, 0, next_start + 15 * 60 * 1000 - 1]
+                self.update_15m_kline(state, [kline_data, next_kline])
+            return
         
-        last_15m_check = 0
+        # 1分钟K线: 同一根K线的推送覆盖，新K线追加
+        if state.recent_1m and state.recent_1m[-1][0] == k['t']:
+            state.recent_1m[-1] = kline_data
+        else:
+            state.recent_1m.append(kline_data)
+            # 刚启动/重连后缓存不足3根时，用REST补齐更早的K线(放到线程中执行，不阻塞事件循环)，
+            # 每根新K线最多补一次
+            missing = state.recent_1m.maxlen - len(state.recent_1m)
+            if missing > 0 and state.last_15m_kline is not None:
+                fetched = await asyncio.to_thread(self.api.get_latest_klines, symbol=state.symbol, interval="1m", limit=3)
+                older = [row for row in fetched if int(row[0]) < state.recent_1m[0][0]]
+                state.recent_1m.extendleft(reversed(older[-missing:]))
+        
+        if state.last_15m_kline is not None:
+            self.check_1m_klines(state, list(state.recent_1m), fetch_missing=False)
+    
+    async def run_ws(self):
+        """
+        运行监听器(websocket)
         
+        所有交易对的15分钟和1分钟K线通过一个组合流订阅，一个连接服务全部交易对
+        """
+        streams = []
+        for symbol in self.states:
+            streams.append(f"{symbol.lower()}@kline_15m")
+            streams.append(f"{symbol.lower()}@kline_1m")
+        url = self.WS_URL + "/".join(streams)
+        
+        self._print_banner("websocket组合流")
+        self._loop = asyncio.get_running_loop()
+        
+        # 启动时先用REST获取一次15分钟K线，不必等到下一根收盘
+        states = list(self.states.values())
+        results = await asyncio.gather(*[
+            asyncio.to_thread(self.api.get_latest_klines, symbol=state.symbol, interval="15m", limit=2)
+            for state in states
+        ])
+        for state, klines_15m in zip(states, results):
+            self.update_15m_kline(state, klines_15m)
+        
+        backoff = self.RECONNECT_DELAY_MIN
         try:
             while True:
-                current_time = time.time()
-                
-                # 每分钟检查一次15分钟K线(或首次运行)
-                if current_time - last_15m_check >= 60 or last_15m_check == 0:
-                    self.update_15m_kline()
-                    last_15m_check = current_time
-                
-                # 如果正在监听，检查1分钟K线
-                if self.last_15m_kline is not None:
-                    self.check_1m_klines()
-                else:
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] 等待符合条件的15分钟K线...", end='\r')
-                
-                time.sleep(check_interval)
-                
-        except KeyboardInterrupt:
-            print("\n\n监听器已停止")
-            print("="*80)
+                try:
+                    async with websockets.connect(url, ping_interval=20) as ws:
+                        # 连接成功，退避从头开始
+                        backoff = self.RECONNECT_DELAY_MIN
+                        print(f"\n✓ [{self._hms()}] websocket已连接 ({len(streams)}个数据流)")
+                        async for msg in ws:
+                            # 单条推送格式异常时跳过该条，不影响连接
+                            try:
+                                data = json.loads(msg)
+                                payload = data.get('data')
+                                if not payload or payload.get('e') != 'kline':
+                                    continue
+                                state = self.states.get(payload['s'])
+                                if state is not None:
+                                    await self._on_ws_kline(state, payload['k'])
+                            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                                print(f"\n⚠️ [{self._hms()}] 跳过无法解析的推送: {e!r}")
+                except (websockets.WebSocketException, OSError) as e:
+                    # 断线、握手被拒(如HTTP 429/5xx)、连接超时等都按退避重连
+                    delay = backoff + random.uniform(0, backoff / 2)
+                    print(f"\n⚠️ [{self._hms()}] websocket断开/连接失败: {e}，{delay:.1f}秒后重连...")
+                    await asyncio.sleep(delay)
+                    backoff = min(backoff * 2, self.RECONNECT_DELAY_MAX)
+        finally:
+            self._loop = None
 
 
 def test_wechat_notification(sendkey: str):
@@ -706,8 +897,10 @@ def main():
     SERVERCHAN_SENDKEY = 'SCT301567TtEeQSvoSSyo0240Rbe4OUkSO'  # 填写你的SendKey，例如: "SCT123456xxxxx"
     
     # 策略参数
+    symbols = ["BTCUSDT"]  # 监听的交易对，可填写多个，例如: ["BTCUSDT", "ETHUSDT"]
     min_k1_range_percent = 0.21  # 15分钟K线最小涨跌幅要求(%)
     check_interval = 30  # 检查间隔(秒)，可以设置为5-15秒
+    use_websocket = False  # True: 使用websocket组合流(一个连接监听所有交易对); False: REST轮询
     # ==============================
     
     # 检查配置
@@ -730,10 +923,21 @@ def main():
     
     # 创建并运行监听器
     monitor = LiveMonitor(
+        symbols=symbols,
         min_k1_range_percent=min_k1_range_percent,
         serverchan_sendkey=SERVERCHAN_SENDKEY
     )
-    monitor.run(check_interval=check_interval)
+    try:
+        if use_websocket and not WEBSOCKETS_AVAILABLE:
+            print("⚠️ 未安装websockets，改用REST轮询 (pip install websockets)")
+            use_websocket = False
+        if use_websocket:
+            asyncio.run(monitor.run_ws())
+        else:
+            asyncio.run(monitor.run_async(check_interval=check_interval))
+    except KeyboardInterrupt:
+        print("\n\n监听器已停止")
+        print("="*80)
 
 
 if __name__ == '__main__':
@@ -18,15 +18,110 @@
 3. 在main()函数中填入你的SENDKEY
 """
 
-import urllib.request
-import urllib.error
 import json
+import sys
+import string
 import time
+import asyncio
+import random
+from collections import deque
 from datetime import datetime
 from typing import List, Dict, Optional
-import winsound  # Windows系统通知音
-import ctypes  # Windows消息框
 import threading  # 多线程播放声音
+import queue  # 通知队列
+import websockets  # 实时K线推送
+import requests
+from requests.adapters import HTTPAdapter
+
+# 优先使用更快的JSON解析库(可直接解析bytes)，未安装时退回标准库
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import ujson as fast_json
+    except ImportError:
+        fast_json = json
+
+# 声音、弹窗和控制台标题只在Windows上可用，其他系统(如Linux服务器)使用空操作代替
+IS_WINDOWS = sys.platform == 'win32'
+if IS_WINDOWS:
+    import winsound  # Windows系统通知音
+    import ctypes  # Windows消息框
+    Beep = winsound.Beep
+    MessageBox = ctypes.windll.user32.MessageBoxW
+    SetConsoleTitle = ctypes.windll.kernel32.SetConsoleTitleW
+else:
+    # 非Windows平台：提示音/消息框/控制台标题均为空操作
+    def Beep(*args, **kwargs):
+        return None
+
+    def MessageBox(*args, **kwargs):
+        return None
+
+    def SetConsoleTitle(*args, **kwargs):
+        return None
+
+
+# Server酱接口地址，发送时只需填入SendKey
+SERVERCHAN_URL = "https://sctapi.ftqq.com/{}.send"
+
+# 微信通知内容模板(Markdown)，模块加载时构建一次，发送时只做替换
+NOTIFY_TEMPLATE = string.Template("""
+## 交易信号提醒 (包含关系策略)
+
+**策略类型:** 包含关系 - 三K线形态  
+**方向:** $direction  
+**当前价格:** $current_price USDT  
+**参考价格(K1):** $reference_price USDT  
+**突破类型:** $breakout_type  
+
+---
+
+**K1区间:** [$k1_low - $k1_high]  
+**K2区间:** [$k2_low - $k2_high] (被K1包含)  
+
+---
+
+**时间:** $signal_time  
+**策略:** ETH 15分钟包含关系策略  
+
+> 💡 15分钟周期即将结束，建议立即查看行情！
+""")
+
+TEST_NOTIFY_TEMPLATE = string.Template("""
+## 测试通知
+
+这是一条来自 **ETH包含关系策略监听器** 的测试通知。
+
+---
+
+**发送时间:** $signal_time  
+**状态:** ✅ 微信通知功能正常  
+
+> 💡 如果你收到这条消息，说明微信通知配置成功！
+
+---
+
+### 策略说明:
+- 监听三根15分钟K线的包含关系
+- K2被K1包含，K3突破K1
+""")
+
+
+def post_serverchan(sendkey: str, title: str, content: str) -> Dict:
+    """
+    通过Server酱发送消息，返回接口响应
+
+    请求发往Server酱而不是币安，不计入币安的频率限制，因此不经过BinanceLiveAPI的限速
+    """
+    resp = BinanceLiveAPI.SESSION.post(SERVERCHAN_URL.format(sendkey),
+                                       data={'title': title, 'desp': content},
+                                       timeout=10)
+    return fast_json.loads(resp.content)
+
+
+# 信号类型代码，用于已通知信号的去重键
+SIGNAL_TYPE_CODES = {'short': 0, 'long': 1}
 
 
 class BinanceLiveAPI:
@@ -38,6 +133,75 @@ class BinanceLiveAPI:
         "https://api3.binance.com",
     ]
     
+    # 熔断器: 某个端点连续失败BREAKER_THRESHOLD次后，BREAKER_COOLDOWN秒内不再使用
+    BREAKER_THRESHOLD = 5
+    BREAKER_COOLDOWN = 30
+    BASE_STATE = {url: {"failures": 0, "opened_at": 0.0} for url in BASE_URLS}
+    
+    # 请求超时(秒): (连接, 读取)，略高于正常响应的p95，卡住的请求尽快失败，交给重试和熔断处理
+    REQUEST_TIMEOUT = (1.0, 1.5)
+    
+    # 复用连接的HTTP会话，避免每次请求都重新建立TCP+TLS连接
+    SESSION = requests.Session()
+    SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=0))
+    SESSION.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Python-requests/monitor"
+    
+    # 并发与频率限制: 同时最多4个请求，60秒内最多1100次(币安限制1200权重/分钟，留出余量)
+    # 同步请求(如get_server_time)在其他线程中也占用同一个滑动窗口，用锁保护
+    SEM = asyncio.Semaphore(4)
+    RATE_LIMIT = 1100
+    RATE_WINDOW = 60
+    _req_times = deque()
+    _req_lock = threading.Lock()
+    
+    # 请求合并与短期缓存: 相同参数的请求在进行中时共享结果，完成后在TTL内直接返回
+    KLINE_CACHE_TTL = {"1m": 0.5, "15m": 5.0}
+    _inflight = {}  # (symbol, interval, limit) -> 进行中的请求任务
+    _kline_cache = {}  # (symbol, interval, limit) -> (过期时间, K线数据)
+    SERVER_TIME_TTL = 1.0
+    _server_time_cache = None  # (本地monotonic时间, 服务器时间ms)
+    
+    @staticmethod
+    def pick_base(attempt: int) -> str:
+        """
+        选择一个可用端点(跳过熔断中的端点)
+        
+        冷却期结束后的第一次调用作为探测请求(半开状态)，探测期间其他调用仍跳过该端点
+        """
+        urls = BinanceLiveAPI.BASE_URLS
+        now = time.monotonic()
+        for i in range(len(urls)):
+            base = urls[(attempt + i) % len(urls)]
+            state = BinanceLiveAPI.BASE_STATE[base]
+            if state["failures"] < BinanceLiveAPI.BREAKER_THRESHOLD:
+                return base
+            if now - state["opened_at"] >= BinanceLiveAPI.BREAKER_COOLDOWN:
+                state["opened_at"] = now  # 半开: 只放行这一次探测
+                return base
+        
+        # 所有端点都在熔断中，选择最早熔断的一个
+        return min(urls, key=lambda url: BinanceLiveAPI.BASE_STATE[url]["opened_at"])
+    
+    @staticmethod
+    def record_result(base: str, success: bool):
+        """记录端点请求结果，更新熔断状态"""
+        state = BinanceLiveAPI.BASE_STATE[base]
+        if success:
+            state["failures"] = 0
+            state["opened_at"] = 0.0
+            return
+        
+        state["failures"] += 1
+        if state["failures"] >= BinanceLiveAPI.BREAKER_THRESHOLD:
+            if state["failures"] == BinanceLiveAPI.BREAKER_THRESHOLD:
+                print(f"\n⚠️ 端点 {base} 连续失败{state['failures']}次，熔断{BinanceLiveAPI.BREAKER_COOLDOWN}秒")
+            state["opened_at"] = time.monotonic()
+    
+    @staticmethod
+    def backoff(attempt: int) -> float:
+        """重试等待时间: 截断指数退避 + 全抖动，避免多个监听器同时重试"""
+        return random.uniform(0, min(30, 0.5 * (2 ** attempt)))
+    
     @staticmethod
     def get_latest_klines(symbol: str = "ETHUSDT", interval: str = "1m", limit: int = 2, max_retries: int = 3) -> List[List]:
         """
@@ -49,48 +213,132 @@ class BinanceLiveAPI:
             limit: 返回数量
             max_retries: 最大重试次数
         """
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Python-urllib/monitor"}
-        
         for attempt in range(max_retries):
-            base = BinanceLiveAPI.BASE_URLS[attempt % len(BinanceLiveAPI.BASE_URLS)]
+            base = BinanceLiveAPI.pick_base(attempt)
             url = f"{base}/api/v3/klines?symbol={symbol}&interval={interval}&limit={limit}"
             try:
-                req = urllib.request.Request(url, headers=headers, method="GET")
-                with urllib.request.urlopen(req, timeout=10) as resp:
-                    data = json.loads(resp.read().decode('utf-8'))
-                    return data
-            except urllib.error.URLError as e:
-                # 网络连接错误
+                resp = BinanceLiveAPI.SESSION.get(url, timeout=BinanceLiveAPI.REQUEST_TIMEOUT)
+                resp.raise_for_status()
+                data = fast_json.loads(resp.content)
+                BinanceLiveAPI.record_result(base, True)
+                return data
+            except requests.exceptions.HTTPError as e:
+                # HTTP状态码错误
+                BinanceLiveAPI.record_result(base, False)
+                status = e.response.status_code
                 if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 2  # 递增等待时间: 2秒, 4秒, 6秒
-                    print(f"\n⚠️ 网络请求失败(尝试{attempt+1}/{max_retries}): {e}")
-                    print(f"   等待{wait_time}秒后重试...")
+                    wait_time = BinanceLiveAPI.backoff(attempt)
+                    print(f"\n⚠️ HTTP错误(尝试{attempt+1}/{max_retries}): {status} {e.response.reason}")
+                    print(f"   等待{wait_time:.2f}秒后重试...")
                     time.sleep(wait_time)
                 else:
-                    print(f"\n✗ 获取K线数据失败，已重试{max_retries}次: {e}")
+                    print(f"\n✗ 获取K线数据失败(HTTP {status})，已重试{max_retries}次")
                     return []
-            except urllib.error.HTTPError as e:
-                # HTTP状态码错误
+            except requests.exceptions.RequestException as e:
+                # 网络连接错误
+                BinanceLiveAPI.record_result(base, False)
                 if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 2
-                    print(f"\n⚠️ HTTP错误(尝试{attempt+1}/{max_retries}): {e.code} {e.reason}")
-                    print(f"   等待{wait_time}秒后重试...")
+                    wait_time = BinanceLiveAPI.backoff(attempt)
+                    print(f"\n⚠️ 网络请求失败(尝试{attempt+1}/{max_retries}): {e}")
+                    print(f"   等待{wait_time:.2f}秒后重试...")
                     time.sleep(wait_time)
                 else:
-                    print(f"\n✗ 获取K线数据失败(HTTP {e.code})，已重试{max_retries}次")
+                    print(f"\n✗ 获取K线数据失败，已重试{max_retries}次: {e}")
                     return []
-            except json.JSONDecodeError as e:
+            except ValueError as e:
+                BinanceLiveAPI.record_result(base, False)
                 print(f"\n✗ 解析JSON失败: {e}")
                 return []
             except Exception as e:
+                BinanceLiveAPI.record_result(base, False)
                 print(f"\n✗ 未知错误: {e}")
                 if attempt < max_retries - 1:
-                    time.sleep(2)
+                    time.sleep(BinanceLiveAPI.backoff(attempt))
                 else:
                     return []
         
         return []
     
+    @staticmethod
+    def _reserve_slot() -> float:
+        """
+        滑动窗口限速: 窗口未满时占用一个名额并返回0，
+        否则返回需要等待的秒数(等最早的请求移出窗口)
+        """
+        req_times = BinanceLiveAPI._req_times
+        with BinanceLiveAPI._req_lock:
+            now = time.monotonic()
+            while req_times and now - req_times[0] >= BinanceLiveAPI.RATE_WINDOW:
+                req_times.popleft()
+            if len(req_times) < BinanceLiveAPI.RATE_LIMIT:
+                req_times.append(now)
+                return 0.0
+            return BinanceLiveAPI.RATE_WINDOW - (now - req_times[0])
+    
+    @staticmethod
+    async def throttle():
+        """滑动窗口限速(异步): 窗口内请求数达到上限时等待最早的请求移出窗口"""
+        while True:
+            wait = BinanceLiveAPI._reserve_slot()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+    
+    @staticmethod
+    def throttle_sync():
+        """滑动窗口限速(同步): 供不在事件循环中的同步请求使用，与throttle共享同一个窗口"""
+        while True:
+            wait = BinanceLiveAPI._reserve_slot()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+    
+    @staticmethod
+    async def get_latest_klines_async(symbol: str = "ETHUSDT", interval: str = "1m", limit: int = 2,
+                                      refresh: bool = False) -> List[List]:
+        """
+        异步获取最新的K线数据(受并发数和请求频率限制)
+        
+        参数:
+            symbol: 交易对
+            interval: K线周期
+            limit: 返回数量
+            refresh: 为True时跳过缓存和进行中的请求，强制重新请求(用于收盘后K线尚未生成时的重试)
+        """
+        key = (symbol, interval, limit)
+        if not refresh:
+            cached = BinanceLiveAPI._kline_cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+        
+        # 相同参数的请求正在进行中，等待它的结果而不是重复请求
+        task = None if refresh else BinanceLiveAPI._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(BinanceLiveAPI._fetch_klines(symbol, interval, limit))
+            BinanceLiveAPI._inflight[key] = task
+            task.add_done_callback(lambda t: BinanceLiveAPI._on_klines_fetched(key, t))
+        # shield: 某个等待者被取消时不影响其他等待者
+        return await asyncio.shield(task)
+    
+    @staticmethod
+    async def _fetch_klines(symbol: str, interval: str, limit: int) -> List[List]:
+        async with BinanceLiveAPI.SEM:
+            await BinanceLiveAPI.throttle()
+            return await asyncio.to_thread(BinanceLiveAPI.get_latest_klines, symbol=symbol, interval=interval, limit=limit)
+    
+    @staticmethod
+    def _on_klines_fetched(key: tuple, task: asyncio.Future):
+        # 强制刷新会替换掉进行中的旧请求，旧请求完成时不能移除新请求，也不能用旧数据覆盖缓存
+        if BinanceLiveAPI._inflight.get(key) is not task:
+            return
+        BinanceLiveAPI._inflight.pop(key)
+        if task.cancelled() or task.exception() is not None:
+            return
+        data = task.result()
+        ttl = BinanceLiveAPI.KLINE_CACHE_TTL.get(key[1], 0)
+        if data and ttl > 0:
+            BinanceLiveAPI._kline_cache[key] = (time.monotonic() + ttl, data)
+    
     @staticmethod
     def get_server_time(max_retries: int = 3) -> int:
         """
@@ -99,21 +347,30 @@ class BinanceLiveAPI:
         参数:
             max_retries: 最大重试次数
         """
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) Python-urllib/monitor"}
+        # 1秒内复用上次获取的服务器时间，加上本地经过的时间
+        cached = BinanceLiveAPI._server_time_cache
+        if cached is not None:
+            elapsed = time.monotonic() - cached[0]
+            if elapsed < BinanceLiveAPI.SERVER_TIME_TTL:
+                return cached[1] + int(elapsed * 1000)
         
         for attempt in range(max_retries):
-            base = BinanceLiveAPI.BASE_URLS[attempt % len(BinanceLiveAPI.BASE_URLS)]
+            base = BinanceLiveAPI.pick_base(attempt)
             url = f"{base}/api/v3/time"
+            BinanceLiveAPI.throttle_sync()
             try:
-                req = urllib.request.Request(url, headers=headers, method="GET")
-                with urllib.request.urlopen(req, timeout=10) as resp:
-                    data = json.loads(resp.read().decode('utf-8'))
-                    return data['serverTime']
+                resp = BinanceLiveAPI.SESSION.get(url, timeout=BinanceLiveAPI.REQUEST_TIMEOUT)
+                resp.raise_for_status()
+                data = fast_json.loads(resp.content)
+                BinanceLiveAPI.record_result(base, True)
+                BinanceLiveAPI._server_time_cache = (time.monotonic(), data['serverTime'])
+                return data['serverTime']
             except Exception as e:
+                BinanceLiveAPI.record_result(base, False)
                 if attempt < max_retries - 1:
-                    wait_time = (attempt + 1) * 2
+                    wait_time = BinanceLiveAPI.backoff(attempt)
                     print(f"\n⚠️ 获取服务器时间失败(尝试{attempt+1}/{max_retries}): {e}")
-                    print(f"   等待{wait_time}秒后重试...")
+                    print(f"   等待{wait_time:.2f}秒后重试...")
                     time.sleep(wait_time)
                 else:
                     print(f"\n✗ 获取服务器时间失败，使用本地时间")
@@ -125,6 +382,9 @@ class BinanceLiveAPI:
 class SimpleKLine:
     """简化的K线数据类"""
     
+    # 固定属性，省去每个实例的__dict__
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'is_closed', '_body_range')
+    
     def __init__(self, kline_data: List):
         self.timestamp = int(kline_data[0])
         self.open = float(kline_data[1])
@@ -134,10 +394,11 @@ class SimpleKLine:
         self.volume = float(kline_data[5])
         self.close_time = int(kline_data[6])
         self.is_closed = True  # 最后一根K线可能未完成
+        self._body_range = abs(self.close - self.open) / self.open
         
     def get_body_range(self):
         """获取实体涨跌幅"""
-        return abs(self.close - self.open) / self.open
+        return self._body_range
     
     def is_contained_by(self, other):
         """检查自己是否被另一根K线包含"""
@@ -151,12 +412,17 @@ class SimpleKLine:
 class LiveMonitorContain:
     """实时监听器 - 包含关系策略"""
     
+    WS_URL = "wss://stream.binance.com:9443/stream?streams=ethusdt@kline_1m/ethusdt@kline_15m"
+    # 断线重连退避(秒)：从最小值开始每次翻倍，封顶最大值，并加随机抖动
+    RECONNECT_DELAY_MIN = 3
+    RECONNECT_DELAY_MAX = 60
+    
     def __init__(self, min_k1_range_percent: float = 0.21, serverchan_sendkey: str = None):
         self.min_k1_range = min_k1_range_percent / 100  # 转换为小数
         self.k1_15m = None  # 第一根15分钟K线（符合涨跌幅条件）
         self.k2_15m = None  # 第二根15分钟K线（被K1包含）
         self.current_15m_start_time = 0  # 当前15分钟K线（第三根）的开始时间
-        self.alerted_signals = set()  # 已通知的信号(避免重复通知)
+        self.alerted_signals = set()  # 已通知的信号(类型代码, 1分钟K线时间)，避免重复通知
         self.api = BinanceLiveAPI()
         
         # 状态：waiting_k1 -> waiting_k2 -> monitoring_k3
@@ -175,6 +441,36 @@ class LiveMonitorContain:
         # 微信通知配置
         self.serverchan_sendkey = serverchan_sendkey
         
+        # 最近两根已收盘的15分钟K线: [0]为K1候选, [1]为K2候选
+        self.recent_15m = deque(maxlen=2)
+        self.last_closed_15m_ts = 0  # 最后处理的已收盘15分钟K线开始时间
+        
+        # websocket模式下最近3根已收盘的1分钟K线(第13分钟检查时直接使用，无需请求REST)
+        self.recent_1m_closed = deque(maxlen=3)
+        
+        # K1的上下边界及其显示文本(进入K3监听时计算一次)
+        self._k1_high = 0.0
+        self._k1_low = 0.0
+        self._k1_range_str = ""
+        
+        # 单行状态输出的上次打印时间(monotonic)，限制为每秒最多一次
+        self._last_status_print = 0.0
+        
+        # 上次处理的1分钟K线(时间, 最高, 最低, 收盘, 是否收盘)，没有变化时跳过
+        self._last_1m_key = None
+        
+        # 弹窗/微信通知在后台线程中发送，不阻塞K线检查
+        self._notify_q = queue.Queue()
+        threading.Thread(target=self._notify_worker, daemon=True).start()
+        
+    def status_due(self) -> bool:
+        """单行状态(end='\\r')是否可以打印: 每秒最多一次，websocket高频推送时避免刷屏"""
+        now = time.monotonic()
+        if now - self._last_status_print < 1:
+            return False
+        self._last_status_print = now
+        return True
+    
     def check_k1_qualification(self, k1: SimpleKLine) -> bool:
         """检查K1是否符合涨跌幅要求"""
         body_range = k1.get_body_range()
@@ -196,39 +492,44 @@ class LiveMonitorContain:
         返回:
             如果满足条件返回信号字典,否则返回None
         """
+        # K1的上下边界在进入K3监听时已计算好
+        k1_high = self._k1_high
+        k1_low = self._k1_low
+        k1_range_str = self._k1_range_str
+        
         # 检测是否突破最高点
-        if k1_1m.high > k1_15m.high:
+        if k1_1m.high > k1_high:
             if not self.breakout_high:
                 self.breakout_high = True
                 self.breakout_high_price = k1_1m.high
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⬆️ 检测到向上突破! 突破价:{k1_1m.high:.2f} > K1最高:{k1_15m.high:.2f}")
-                print(f"    等待收盘价回到区间内 [{k1_15m.low:.2f} - {k1_15m.high:.2f}] 以触发做空信号...")
+                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⬆️ 检测到向上突破! 突破价:{k1_1m.high:.2f} > K1最高:{k1_high:.2f}")
+                print(f"    等待收盘价回到区间内 {k1_range_str} 以触发做空信号...")
         
         # 检测是否突破最低点
-        if k1_1m.low < k1_15m.low:
+        if k1_1m.low < k1_low:
             if not self.breakout_low:
                 self.breakout_low = True
                 self.breakout_low_price = k1_1m.low
-                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⬇️ 检测到向下突破! 突破价:{k1_1m.low:.2f} < K1最低:{k1_15m.low:.2f}")
-                print(f"    等待收盘价回到区间内 [{k1_15m.low:.2f} - {k1_15m.high:.2f}] 以触发做多信号...")
+                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⬇️ 检测到向下突破! 突破价:{k1_1m.low:.2f} < K1最低:{k1_low:.2f}")
+                print(f"    等待收盘价回到区间内 {k1_range_str} 以触发做多信号...")
         
         # 检测吞噬形态: 同时突破最高点和最低点
         if self.breakout_high and self.breakout_low:
             print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 检测到吞噬形态! 1分钟K线同时突破K1上下边界")
-            print(f"    最高突破: {self.breakout_high_price:.2f} > {k1_15m.high:.2f}")
-            print(f"    最低突破: {self.breakout_low_price:.2f} < {k1_15m.low:.2f}")
+            print(f"    最高突破: {self.breakout_high_price:.2f} > {k1_high:.2f}")
+            print(f"    最低突破: {self.breakout_low_price:.2f} < {k1_low:.2f}")
             print(f"    策略失效，重新寻找符合条件的K1...")
             return {'type': 'engulfed'}
         
         # 检查收盘价是否回到区间内
-        close_in_range = k1_15m.low <= k1_1m.close <= k1_15m.high
+        close_in_range = k1_low <= k1_1m.close <= k1_high
         
         if not close_in_range:
             return None
         
         # 如果之前向上突破过,现在收盘价回到区间 -> 做空信号
         if self.breakout_high:
-            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ✅ 收盘价已回到K1区间内! 当前价:{k1_1m.close:.2f} 在 [{k1_15m.low:.2f} - {k1_15m.high:.2f}]")
+            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ✅ 收盘价已回到K1区间内! 当前价:{k1_1m.close:.2f} 在 {k1_range_str}")
             return {
                 'type': 'short',
                 'direction': '做空',
@@ -237,7 +538,7 @@ class LiveMonitorContain:
                 'k1m': k1_1m,
                 'breakout_type': '向上突破K1后回落',
                 'breakout_price': self.breakout_high_price,
-                'reference_price': k1_15m.high,
+                'reference_price': k1_high,
                 'current_price': k1_1m.close,
                 'timestamp': k1_1m.timestamp,
                 'strategy': 'contain'  # 标记为包含关系策略
@@ -245,7 +546,7 @@ class LiveMonitorContain:
         
         # 如果之前向下突破过,现在收盘价回到区间 -> 做多信号
         if self.breakout_low:
-            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ✅ 收盘价已回到K1区间内! 当前价:{k1_1m.close:.2f} 在 [{k1_15m.low:.2f} - {k1_15m.high:.2f}]")
+            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] ✅ 收盘价已回到K1区间内! 当前价:{k1_1m.close:.2f} 在 {k1_range_str}")
             return {
                 'type': 'long',
                 'direction': '做多',
@@ -254,7 +555,7 @@ class LiveMonitorContain:
                 'k1m': k1_1m,
                 'breakout_type': '向下突破K1后回升',
                 'breakout_price': self.breakout_low_price,
-                'reference_price': k1_15m.low,
+                'reference_price': k1_low,
                 'current_price': k1_1m.close,
                 'timestamp': k1_1m.timestamp,
                 'strategy': 'contain'  # 标记为包含关系策略
@@ -275,61 +576,29 @@ class LiveMonitorContain:
         
         try:
             direction = signal['direction']
-            current_price = signal['current_price']
-            reference_price = signal['reference_price']
-            breakout_type = signal['breakout_type']
-            signal_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            k1, k2 = signal['k1_15m'], signal['k2_15m']
             
             # 构建通知标题和内容 - 特殊标记包含关系策略
             title = f"📊 ETH包含策略信号 - {direction}"
+            content = NOTIFY_TEMPLATE.substitute(
+                direction=direction,
+                current_price=f"{signal['current_price']:.2f}",
+                reference_price=f"{signal['reference_price']:.2f}",
+                breakout_type=signal['breakout_type'],
+                k1_low=f"{k1.low:.2f}", k1_high=f"{k1.high:.2f}",
+                k2_low=f"{k2.low:.2f}", k2_high=f"{k2.high:.2f}",
+                signal_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            )
             
-            # 使用Markdown格式构建内容
-            content = f"""
-## 交易信号提醒 (包含关系策略)
-
-**策略类型:** 包含关系 - 三K线形态  
-**方向:** {direction}  
-**当前价格:** {current_price:.2f} USDT  
-**参考价格(K1):** {reference_price:.2f} USDT  
-**突破类型:** {breakout_type}  
-
----
-
-**K1区间:** [{signal['k1_15m'].low:.2f} - {signal['k1_15m'].high:.2f}]  
-**K2区间:** [{signal['k2_15m'].low:.2f} - {signal['k2_15m'].high:.2f}] (被K1包含)  
-
----
-
-**时间:** {signal_time}  
-**策略:** ETH 15分钟包含关系策略  
-
-> 💡 15分钟周期即将结束，建议立即查看行情！
-"""
-            
-            # Server酱API地址
-            url = f"https://sctapi.ftqq.com/{self.serverchan_sendkey}.send"
-            
-            # 构建POST数据
-            data = {
-                'title': title,
-                'desp': content
-            }
-            
-            # URL编码
-            import urllib.parse
-            post_data = urllib.parse.urlencode(data).encode('utf-8')
+            # 发送请求(复用连接)
+            result = post_serverchan(self.serverchan_sendkey, title, content)
             
-            # 发送请求
-            req = urllib.request.Request(url, data=post_data, method='POST')
-            with urllib.request.urlopen(req, timeout=10) as resp:
-                result = json.loads(resp.read().decode('utf-8'))
-                
-                if result.get('code') == 0:
-                    print(f"✓ 微信通知发送成功!")
-                    return True
-                else:
-                    print(f"✗ 微信通知发送失败: {result.get('message', '未知错误')}")
-                    return False
+            if result.get('code') == 0:
+                print(f"✓ 微信通知发送成功!")
+                return True
+            else:
+                print(f"✗ 微信通知发送失败: {result.get('message', '未知错误')}")
+                return False
                     
         except Exception as e:
             print(f"✗ 微信通知发送异常: {e}")
@@ -366,158 +635,235 @@ class LiveMonitorContain:
             print("(信号已记录，将在15分钟周期倒数第二根1分钟K线时通知)")
             return
         
+        # 微信、声音、弹窗和标题闪烁交给后台线程，检查线程立即返回
+        self._notify_q.put((signal, show_popup))
+    
+    def _notify_worker(self):
+        """后台通知线程: 依次发送队列中的弹窗通知"""
+        while True:
+            signal, show_popup = self._notify_q.get()
+            try:
+                if show_popup:
+                    self._popup_notification(signal)
+            except Exception as e:
+                print(f"通知发送异常: {e}")
+            finally:
+                self._notify_q.task_done()
+    
+    def _popup_notification(self, signal: Dict):
+        """
+        发送微信通知、播放警报声、弹窗并闪烁控制台标题(在通知线程中执行)
+        
+        参数:
+            signal: 信号字典
+        """
+        direction = signal['direction']
+        current_price = signal['current_price']
+        breakout_type = signal['breakout_type']
+        reference_price = signal['reference_price']
+        
         # 发送微信通知
         print("\n正在发送微信通知...")
         self.send_wechat_notification(signal)
         
         # 1. 播放急促的警报声(在后台线程中播放,避免阻塞)
-        def play_alert_sound():
-            try:
-                for i in range(5):
-                    # 高低交替的警报声
-                    winsound.Beep(1500, 200)  # 高音
-                    winsound.Beep(1000, 200)  # 低音
-            except:
-                pass
+        threading.Thread(target=self.play_alert_sound, daemon=True).start()
         
-        sound_thread = threading.Thread(target=play_alert_sound, daemon=True)
-        sound_thread.start()
+        # 2. 系统弹窗(最强提示!)
+        message = (
+            f"📊 包含策略信号提醒!\n\n"
+            f"方向: {direction}\n"
+            f"当前价格: {current_price:.2f}\n"
+            f"参考价格(K1): {reference_price:.2f}\n"
+            f"突破类型: {breakout_type}\n\n"
+            f"15分钟周期即将结束，请查看行情!"
+        )
+        self.show_messagebox(message, f"⚠️ {direction}信号 - ETH包含策略")
         
-        # 2. Windows系统弹窗(最强提示!)
+        # 3. 闪烁控制台标题
+        self.blink_console_title(direction)
+    
+    @staticmethod
+    def play_alert_sound():
+        """播放高低交替的警报声(仅Windows)"""
         try:
-            # 构建弹窗消息
-            message = (
-                f"📊 包含策略信号提醒!\n\n"
-                f"方向: {direction}\n"
-                f"当前价格: {current_price:.2f}\n"
-                f"参考价格(K1): {reference_price:.2f}\n"
-                f"突破类型: {breakout_type}\n\n"
-                f"15分钟周期即将结束，请查看行情!"
-            )
-            title = f"⚠️ {direction}信号 - ETH包含策略"
-            
-            # MB_ICONWARNING (0x30) = 警告图标
-            # MB_TOPMOST (0x40000) = 窗口置顶
-            MessageBox = ctypes.windll.user32.MessageBoxW
-            
-            # 在后台线程中显示弹窗,避免阻塞主循环
-            def show_messagebox():
+            for i in range(5):
+                Beep(1500, 200)  # 高音
+                Beep(1000, 200)  # 低音
+        except:
+            pass
+    
+    @staticmethod
+    def show_messagebox(message: str, title: str):
+        """在后台线程中显示置顶警告弹窗(仅Windows)，避免阻塞"""
+        if not IS_WINDOWS:
+            return
+        
+        # MB_ICONWARNING (0x30) = 警告图标
+        # MB_TOPMOST (0x40000) = 窗口置顶
+        def show():
+            try:
                 MessageBox(None, message, title, 0x30 | 0x40000)
-            
-            mb_thread = threading.Thread(target=show_messagebox, daemon=True)
-            mb_thread.start()
-            
-        except Exception as e:
-            print(f"弹窗通知失败: {e}")
+            except Exception as e:
+                print(f"弹窗通知失败: {e}")
         
-        # 3. 闪烁控制台标题
+        threading.Thread(target=show, daemon=True).start()
+    
+    @staticmethod
+    def blink_console_title(direction: str):
+        """闪烁控制台标题(仅Windows)"""
+        if not IS_WINDOWS:
+            return
         try:
             for i in range(10):
                 if i % 2 == 0:
-                    ctypes.windll.kernel32.SetConsoleTitleW(f"📊📊📊 {direction}信号! 📊📊📊")
+                    SetConsoleTitle(f"📊📊📊 {direction}信号! 📊📊📊")
                 else:
-                    ctypes.windll.kernel32.SetConsoleTitleW(f"包含策略监听器 - ETH")
+                    SetConsoleTitle(f"包含策略监听器 - ETH")
                 time.sleep(0.3)
             # 恢复原标题
-            ctypes.windll.kernel32.SetConsoleTitleW("包含策略监听器 - ETH 15分钟")
+            SetConsoleTitle("包含策略监听器 - ETH 15分钟")
         except:
             pass
     
-    def update_15m_klines(self):
-        """更新15分钟K线数据并检查包含关系"""
-        klines_15m = self.api.get_latest_klines(symbol="ETHUSDT", interval="15m", limit=3)
+    def reset_monitoring(self):
+        """清空K1/K2和K3的突破状态，回到等待K1"""
+        self.state = "waiting_k1"
+        self.k1_15m = None
+        self.k2_15m = None
+        self.current_15m_start_time = 0
+        self.alerted_signals.clear()
+        self.breakout_high = False
+        self.breakout_low = False
+        self.breakout_high_price = 0.0
+        self.breakout_low_price = 0.0
+        self.pending_signal = None
+        self.popup_notified = False
+    
+    def update_15m_klines(self, klines_15m: List[List] = None):
+        """
+        更新15分钟K线数据(REST)，只把新收盘的K线交给状态机
+        
+        参数:
+            klines_15m: 已获取的最近3根15分钟K线(为None时自动请求)
+        """
+        if klines_15m is None:
+            klines_15m = self.api.get_latest_klines(symbol="ETHUSDT", interval="15m", limit=3)
         if len(klines_15m) < 3:
             if len(klines_15m) == 0:
                 print(f"[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 获取15分钟K线失败，跳过本次检查", end='\r')
             return False
         
-        # 解析K线
-        k_minus2 = SimpleKLine(klines_15m[-3])  # 倒数第三根（已完成）
-        k_minus1 = SimpleKLine(klines_15m[-2])  # 倒数第二根（已完成）
-        k_current = SimpleKLine(klines_15m[-1])  # 当前K线（未完成）
-        
-        # 状态机逻辑
-        if self.state == "waiting_k1":
-            # 等待K1：倒数第三根符合涨跌幅条件
-            if self.check_k1_qualification(k_minus2):
-                self.k1_15m = k_minus2
-                self.state = "waiting_k2"
-                print(f"\n✓ [{datetime.now().strftime('%H:%M:%S')}] 找到K1! 涨跌幅:{k_minus2.get_body_range()*100:.3f}%")
-                print(f"   K1区间: [{k_minus2.low:.2f} - {k_minus2.high:.2f}]")
-                print(f"   等待K2（检查包含关系）...")
-                
-        elif self.state == "waiting_k2":
-            # 检查K2是否被K1包含
-            # 如果K1的timestamp发生了变化，说明进入了新周期，需要重新检查
-            if k_minus2.timestamp != self.k1_15m.timestamp:
-                # K1已经不是倒数第三根了，重置状态
+        # 前两根已收盘，最后一根为当前K线（未完成）
+        entered = False
+        for kline_data in klines_15m[:-1]:
+            if int(kline_data[0]) > self.last_closed_15m_ts:
+                entered = self.on_15m_closed(SimpleKLine(kline_data)) or entered
+        self.on_15m_current(int(klines_15m[-1][0]))
+        return entered
+    
+    def on_15m_closed(self, kline: SimpleKLine) -> bool:
+        """
+        一根15分钟K线收盘，推进状态机
+        
+        参数:
+            kline: 刚收盘的15分钟K线
+        
+        返回:
+            是否进入监听K3状态
+        """
+        self.recent_15m.append(kline)
+        self.last_closed_15m_ts = kline.timestamp
+        
+        # K3收盘，本轮监听结束
+        if self.state == "monitoring_k3":
+            print(f"\n✗ [{datetime.now().strftime('%H:%M:%S')}] K3周期已结束，重新寻找K1...")
+            self.reset_monitoring()
+        
+        if self.state == "waiting_k2":
+            k1, k2 = self.recent_15m
+            if k1.timestamp != self.k1_15m.timestamp:
+                # K1已经不是上一根了(中间有K线缺失)，重新寻找
                 print(f"\n✗ [{datetime.now().strftime('%H:%M:%S')}] K1已过期，重新寻找...")
-                self.state = "waiting_k1"
-                self.k1_15m = None
-                self.k2_15m = None
-                return False
-            
-            # 检查倒数第二根（k_minus1）是否被K1包含
-            if k_minus1.is_contained_by(self.k1_15m):
-                self.k2_15m = k_minus1
-                self.current_15m_start_time = k_current.timestamp
+                self.reset_monitoring()
+            elif k2.is_contained_by(k1):
+                self.reset_monitoring()
+                self.k1_15m = k1
+                self.k2_15m = k2
+                self.current_15m_start_time = k2.close_time + 1
                 self.state = "monitoring_k3"
-                
-                # 清空突破状态
-                self.alerted_signals.clear()
-                self.breakout_high = False
-                self.breakout_low = False
-                self.breakout_high_price = 0.0
-                self.breakout_low_price = 0.0
-                self.pending_signal = None
-                self.popup_notified = False
+                self._k1_high = k1.high
+                self._k1_low = k1.low
+                self._k1_range_str = f"[{k1.low:.2f} - {k1.high:.2f}]"
                 
                 print(f"\n✓ [{datetime.now().strftime('%H:%M:%S')}] 找到包含关系!")
-                print(f"   K1区间: [{self.k1_15m.low:.2f} - {self.k1_15m.high:.2f}]")
-                print(f"   K2区间: [{k_minus1.low:.2f} - {k_minus1.high:.2f}] (被K1包含)")
+                print(f"   K1区间: [{k1.low:.2f} - {k1.high:.2f}]")
+                print(f"   K2区间: [{k2.low:.2f} - {k2.high:.2f}] (被K1包含)")
                 print(f"   开始监听K3的1分钟K线...")
                 return True
             else:
                 # K2没有被K1包含，重新寻找K1
                 print(f"\n✗ [{datetime.now().strftime('%H:%M:%S')}] K2不满足包含关系，重新寻找K1...")
-                print(f"   K1区间: [{self.k1_15m.low:.2f} - {self.k1_15m.high:.2f}]")
-                print(f"   K2区间: [{k_minus1.low:.2f} - {k_minus1.high:.2f}] (超出K1范围)")
-                self.state = "waiting_k1"
-                self.k1_15m = None
-                self.k2_15m = None
-                
-        elif self.state == "monitoring_k3":
-            # 监听K3中，检查K3是否还是当前K线
-            if k_current.timestamp != self.current_15m_start_time:
-                # K3已经结束，重新开始
-                print(f"\n✗ [{datetime.now().strftime('%H:%M:%S')}] K3周期已结束，重新寻找K1...")
-                self.state = "waiting_k1"
-                self.k1_15m = None
-                self.k2_15m = None
-                self.current_15m_start_time = 0
-                self.alerted_signals.clear()
-                self.breakout_high = False
-                self.breakout_low = False
-                self.breakout_high_price = 0.0
-                self.breakout_low_price = 0.0
-                self.pending_signal = None
-                self.popup_notified = False
+                print(f"   K1区间: [{k1.low:.2f} - {k1.high:.2f}]")
+                print(f"   K2区间: [{k2.low:.2f} - {k2.high:.2f}] (超出K1范围)")
+                self.reset_monitoring()
+        
+        # 等待K1：刚收盘的K线符合涨跌幅条件
+        if self.state == "waiting_k1" and self.check_k1_qualification(kline):
+            self.k1_15m = kline
+            self.state = "waiting_k2"
+            print(f"\n✓ [{datetime.now().strftime('%H:%M:%S')}] 找到K1! 涨跌幅:{kline.get_body_range()*100:.3f}%")
+            print(f"   K1区间: [{kline.low:.2f} - {kline.high:.2f}]")
+            print(f"   等待K2（检查包含关系）...")
         
         return False
     
-    def check_1m_klines(self):
-        """检查1分钟K线（仅在monitoring_k3状态下）"""
+    def on_15m_current(self, start_time: int):
+        """
+        当前(未收盘)15分钟K线的推送，只用来确认K3仍在进行
+        
+        参数:
+            start_time: 当前15分钟K线的开始时间
+        """
+        if self.state == "monitoring_k3" and start_time > self.current_15m_start_time:
+            # 错过了K3的收盘事件(例如断线重连)，K3已经结束
+            print(f"\n✗ [{datetime.now().strftime('%H:%M:%S')}] K3周期已结束，重新寻找K1...")
+            self.reset_monitoring()
+    
+    def check_1m_klines(self, klines_1m: List[List] = None):
+        """
+        检查1分钟K线（仅在monitoring_k3状态下）
+        
+        参数:
+            klines_1m: 已获取的最近1分钟K线，按时间顺序(为None时自动请求最新一根)
+        """
         if self.state != "monitoring_k3" or self.k1_15m is None:
             return
 
         # 获取最新的1分钟K线
-        klines_1m = self.api.get_latest_klines(symbol="ETHUSDT", interval="1m", limit=1)
+        if klines_1m is None:
+            klines_1m = self.api.get_latest_klines(symbol="ETHUSDT", interval="1m", limit=1)
         if not klines_1m:
             print(f"[{datetime.now().strftime('%H:%M:%S')}] ⚠️ 获取1分钟K线失败，跳过本次检查", end='\r')
             return
 
-        k1m = SimpleKLine(klines_1m[0])
-
+        # 按时间顺序处理(可能包含刚收盘的一根和当前未完成的一根)
+        for kline_data in klines_1m:
+            self.process_1m_kline(SimpleKLine(kline_data))
+    
+    def process_1m_kline(self, k1m: SimpleKLine):
+        """
+        处理一根K3内的1分钟K线
+        
+        参数:
+            k1m: 当前1分钟K线
+        """
+        # 与上次处理的K线完全相同(同一根且价格没有变化)，不会产生新的突破或信号
+        key = (k1m.timestamp, k1m.high, k1m.low, k1m.close, k1m.is_closed)
+        if key == self._last_1m_key:
+            return
+        self._last_1m_key = key
+        
         # 计算当前1分钟K线在15分钟周期中的位置
         time_since_15m_start = (k1m.timestamp - self.current_15m_start_time) / 60000  # 转换为分钟
         minutes_in_period = int(time_since_15m_start)
@@ -526,23 +872,21 @@ class LiveMonitorContain:
         if k1m.timestamp < self.current_15m_start_time or minutes_in_period >= 15:
             if minutes_in_period >= 15:
                 print(f"\n[{datetime.now().strftime('%H:%M:%S')}] K3周期已结束，等待下一个K1...")
-                self.state = "waiting_k1"
-                self.k1_15m = None
-                self.k2_15m = None
-                self.current_15m_start_time = 0
+                self.reset_monitoring()
             return
 
         # 打印每分钟K线
-        status = ""
-        if self.breakout_high:
-            status = " [已突破K1上方]"
-        elif self.breakout_low:
-            status = " [已突破K1下方]"
+        if self.status_due():
+            status = ""
+            if self.breakout_high:
+                status = " [已突破K1上方]"
+            elif self.breakout_low:
+                status = " [已突破K1下方]"
 
-        if self.pending_signal and not self.popup_notified:
-            status += f" [有信号-等待第13分钟弹窗]"
+            if self.pending_signal and not self.popup_notified:
+                status += f" [有信号-等待第13分钟弹窗]"
 
-        print(f"[{datetime.now().strftime('%H:%M:%S')}] K3-1分钟({minutes_in_period+1}/15): O:{k1m.open:.2f} H:{k1m.high:.2f} L:{k1m.low:.2f} C:{k1m.close:.2f}{status}", end='\r')
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] K3-1分钟({minutes_in_period+1}/15): O:{k1m.open:.2f} H:{k1m.high:.2f} L:{k1m.low:.2f} C:{k1m.close:.2f}{status}", end='\r')
 
         # 检查是否满足信号条件（相对于K1）
         signal = self.check_signal(self.k1_15m, k1m)
@@ -553,21 +897,11 @@ class LiveMonitorContain:
                 print(f"\n{'='*80}")
                 print(f"⚠️ 吞噬形态导致策略失效,重新寻找K1")
                 print(f"{'='*80}\n")
-                self.state = "waiting_k1"
-                self.k1_15m = None
-                self.k2_15m = None
-                self.current_15m_start_time = 0
-                self.alerted_signals.clear()
-                self.breakout_high = False
-                self.breakout_low = False
-                self.breakout_high_price = 0.0
-                self.breakout_low_price = 0.0
-                self.pending_signal = None
-                self.popup_notified = False
+                self.reset_monitoring()
                 return
             
             # 生成唯一标识
-            signal_key = f"{signal['type']}_{k1m.timestamp}"
+            signal_key = (SIGNAL_TYPE_CODES[signal['type']], k1m.timestamp)
 
             if signal_key not in self.alerted_signals:
                 print(f"\n>>> 检测到包含策略信号! 类型:{signal['type']} 价格:{signal['current_price']:.2f}")
@@ -577,19 +911,22 @@ class LiveMonitorContain:
                     self.pending_signal = signal
 
         # 检查是否到了倒数第二根1分钟K线
-        if minutes_in_period == 12 and self.pending_signal and not self.popup_notified:
-            klines_1m_last3 = self.api.get_latest_klines(symbol="ETHUSDT", interval="1m", limit=3)
-            if len(klines_1m_last3) == 3:
+        # websocket模式下在第13根收盘时检查，此时最近3根已收盘K线都在本地，无需网络请求
+        if minutes_in_period == 12 and k1m.is_closed and self.pending_signal and not self.popup_notified:
+            if len(self.recent_1m_closed) == 3 and self.recent_1m_closed[-1].timestamp == k1m.timestamp:
+                last3 = list(self.recent_1m_closed)
+            else:
+                last3 = [SimpleKLine(k) for k in self.api.get_latest_klines(symbol="ETHUSDT", interval="1m", limit=3)]
+            if len(last3) == 3:
                 any_in_range = False
                 in_range_count = 0
                 
                 print(f"\n\n{'='*80}")
-                print(f"📊 检查后三根1分钟K线 (K1区间: [{self.k1_15m.low:.2f} - {self.k1_15m.high:.2f}])")
+                print(f"📊 检查后三根1分钟K线 (K1区间: {self._k1_range_str})")
                 print(f"{'-'*80}")
                 
-                for i, kline_data in enumerate(klines_1m_last3, 1):
-                    k = SimpleKLine(kline_data)
-                    is_in_range = self.k1_15m.low <= k.close <= self.k1_15m.high
+                for i, k in enumerate(last3, 1):
+                    is_in_range = self._k1_low <= k.close <= self._k1_high
                     status = "✓ 在K1区间内" if is_in_range else "✗ 不在K1区间内"
                     time_str = datetime.fromtimestamp(k.timestamp/1000).strftime('%H:%M')
                     print(f"  第{i}根 [{time_str}]: 收盘价 {k.close:.2f} {status}")
@@ -615,15 +952,94 @@ class LiveMonitorContain:
                 print(f"⚠️ 获取后三根1分钟K线失败(网络问题)，不发送微信通知!")
                 print(f"{'='*80}\n")
     
-    def run(self, check_interval: int = 10):
+    @staticmethod
+    def kline_from_ws(k: Dict) -> SimpleKLine:
+        """把websocket推送的K线字典转换为SimpleKLine"""
+        kline = SimpleKLine([k['t'], k['o'], k['h'], k['l'], k['c'], k['v'], k['T']])
+        kline.is_closed = k['x']
+        return kline
+    
+    def update_15m_klines_from_ws(self, k: Dict):
+        """处理websocket推送的15分钟K线: 收盘事件推进状态机，其余只更新当前K线"""
+        if k['x']:
+            if k['t'] > self.last_closed_15m_ts:
+                self.on_15m_closed(self.kline_from_ws(k))
+        else:
+            self.on_15m_current(k['t'])
+    
+    def check_1m_klines_from_ws(self, k: Dict):
+        """处理websocket推送的1分钟K线（仅在monitoring_k3状态下检查信号）"""
+        monitoring = self.state == "monitoring_k3" and self.k1_15m is not None
+        
+        # 按需解析: 未收盘且不在监听K3时，这条推送用不到
+        if not k['x'] and not monitoring:
+            return
+        
+        kline = self.kline_from_ws(k)
+        if kline.is_closed:
+            self.recent_1m_closed.append(kline)
+        
+        if monitoring:
+            self.process_1m_kline(kline)
+    
+    async def run_ws(self):
+        """
+        运行监听器(websocket)
+        
+        订阅ETH的1分钟和15分钟K线推送，每次连接前用REST获取最近3根15分钟K线作为预热，
+        稳定运行时不再请求REST；连接断开后按指数退避+随机抖动重连
+        """
+        print("="*80)
+        print(f"包含关系策略监听器启动 | 交易对:ETHUSDT | K1涨跌幅>={self.min_k1_range*100:.2f}% | websocket实时推送")
+        print("="*80)
+        print("策略说明:")
+        print("  1. 寻找K1（涨跌幅>=0.21%）")
+        print("  2. 检查K2是否被K1包含")
+        print("  3. 监听K3突破K1的最高/最低价并回到区间")
+        print("="*80)
+        
+        backoff = self.RECONNECT_DELAY_MIN
+        while True:
+            # 预热/补齐: 用REST获取最近3根15分钟K线，补上断线期间收盘的K线
+            self.update_15m_klines(await self.api.get_latest_klines_async(symbol="ETHUSDT", interval="15m", limit=3))
+            try:
+                async with websockets.connect(self.WS_URL, ping_interval=20) as ws:
+                    # 连接成功，退避从头开始
+                    backoff = self.RECONNECT_DELAY_MIN
+                    print(f"\n✓ [{datetime.now().strftime('%H:%M:%S')}] websocket已连接")
+                    async for msg in ws:
+                        # 订阅确认等非K线帧直接忽略，单条推送格式异常时跳过该条，不影响连接
+                        try:
+                            payload = fast_json.loads(msg).get('data')
+                            if not payload or payload.get('e') != 'kline':
+                                continue
+                            k = payload['k']
+                            if k['i'] == '15m':
+                                self.update_15m_klines_from_ws(k)
+                            else:
+                                self.check_1m_klines_from_ws(k)
+                        except (ValueError, KeyError, TypeError, AttributeError) as e:
+                            print(f"\n⚠️ [{datetime.now().strftime('%H:%M:%S')}] 跳过无法解析的推送: {e!r}")
+            except (websockets.WebSocketException, OSError, asyncio.TimeoutError) as e:
+                # 断线、握手被拒(如HTTP 429/5xx)、连接超时等都按退避重连
+                delay = backoff + random.uniform(0, backoff / 2)
+                print(f"\n⚠️ [{datetime.now().strftime('%H:%M:%S')}] websocket断开/连接失败: {e}，{delay:.1f}秒后重连...")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, self.RECONNECT_DELAY_MAX)
+    
+    async def run(self, check_interval: int = 10):
         """
-        运行监听器
+        运行监听器(REST轮询)
+        
+        按K线收盘时间对齐唤醒：等待K1/K2时只在15分钟K线收盘后请求，
+        监听K3时在每根1分钟K线收盘后请求(两次收盘之间最多间隔check_interval秒再查一次，
+        以便及时发现盘中突破)。15分钟和1分钟K线并发请求，拿到结果后再依次交给状态机处理
         
         参数:
-            check_interval: 检查间隔(秒)
+            check_interval: 监听K3时的最长检查间隔(秒)
         """
         print("="*80)
-        print(f"包含关系策略监听器启动 | 交易对:ETHUSDT | K1涨跌幅>={self.min_k1_range*100:.2f}% | 间隔:{check_interval}秒")
+        print(f"包含关系策略监听器启动 | 交易对:ETHUSDT | K1涨跌幅>={self.min_k1_range*100:.2f}% | K3最长间隔:{check_interval}秒")
         print("="*80)
         print("策略说明:")
         print("  1. 寻找K1（涨跌幅>=0.21%）")
@@ -631,32 +1047,62 @@ class LiveMonitorContain:
         print("  3. 监听K3突破K1的最高/最低价并回到区间")
         print("="*80)
         
-        last_15m_check = 0
+        need_15m = True  # 启动时立即同步一次15分钟K线
+        boundary_1m = False  # 本次唤醒是否刚好在1分钟K线收盘后
+        refresh_15m = False  # 上次未取到刚收盘的15分钟K线，本次重试需跳过缓存
         
-        try:
-            while True:
-                current_time = time.time()
-                
-                # 每分钟检查一次15分钟K线
-                if current_time - last_15m_check >= 60 or last_15m_check == 0:
-                    self.update_15m_klines()
-                    last_15m_check = current_time
-                
-                # 如果正在监听K3，检查1分钟K线
-                if self.state == "monitoring_k3":
-                    self.check_1m_klines()
-                else:
-                    status_msg = {
-                        "waiting_k1": "等待符合条件的K1（涨跌幅>=0.21%）...",
-                        "waiting_k2": "等待K2（检查包含关系）..."
-                    }
-                    print(f"[{datetime.now().strftime('%H:%M:%S')}] {status_msg.get(self.state, '未知状态')}", end='\r')
-                
-                time.sleep(check_interval)
-                
-        except KeyboardInterrupt:
-            print("\n\n监听器已停止")
-            print("="*80)
+        while True:
+            need_1m = need_15m or self.state == "monitoring_k3"
+            
+            # 刚收盘时多取一根，让刚收盘的1分钟K线以最终价格处理一次
+            limit_1m = 2 if boundary_1m else 1
+            fetches = []
+            if need_15m:
+                fetches.append(self.api.get_latest_klines_async(symbol="ETHUSDT", interval="15m", limit=3,
+                                                                refresh=refresh_15m))
+            if need_1m:
+                fetches.append(self.api.get_latest_klines_async(symbol="ETHUSDT", interval="1m", limit=limit_1m))
+            results = await asyncio.gather(*fetches)
+            
+            # 交易所偶尔在收盘后稍晚才生成新K线，此时1秒后重试
+            retry_15m = False
+            if need_15m:
+                klines_15m = results[0]
+                self.update_15m_klines(klines_15m)
+                period_start = int(time.time() * 1000) // 900000 * 900000
+                retry_15m = not klines_15m or int(klines_15m[-1][0]) < period_start
+            
+            # 如果正在监听K3，检查1分钟K线
+            if self.state == "monitoring_k3":
+                self.check_1m_klines(results[-1])
+            elif self.status_due():
+                status_msg = {
+                    "waiting_k1": "等待符合条件的K1（涨跌幅>=0.21%）...",
+                    "waiting_k2": "等待K2（检查包含关系）..."
+                }
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] {status_msg.get(self.state, '未知状态')}", end='\r')
+            
+            # 计算下一次唤醒时间：下一根K线收盘后留200ms让交易所完成收盘。
+            # 收盘时刻只能按交易所时间(系统时钟)对齐，换算成距今的秒数后，
+            # 等待与是否越过收盘的判断都用monotonic时间(不受系统时钟调整影响)
+            now_ms = int(time.time() * 1000)
+            now_mono = time.monotonic()
+            to_1m_close = ((now_ms // 60000 + 1) * 60000 - now_ms) / 1000
+            to_15m_close = ((now_ms // 900000 + 1) * 900000 - now_ms) / 1000
+            if retry_15m:
+                wait = 1.0
+            elif self.state == "monitoring_k3":
+                wait = min(to_1m_close + 0.2, check_interval)
+            else:
+                wait = to_15m_close + 0.2
+            
+            await asyncio.sleep(wait)
+            
+            # 根据越过的收盘时间决定本次要处理的K线
+            elapsed = time.monotonic() - now_mono
+            need_15m = retry_15m or elapsed >= to_15m_close
+            refresh_15m = retry_15m
+            boundary_1m = elapsed >= to_1m_close
 
 
 def test_wechat_notification(sendkey: str):
@@ -674,41 +1120,17 @@ def test_wechat_notification(sendkey: str):
     
     try:
         title = "🧪 ETH包含策略测试通知"
-        content = f"""
-## 测试通知
-
-这是一条来自 **ETH包含关系策略监听器** 的测试通知。
-
----
-
-**发送时间:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}  
-**状态:** ✅ 微信通知功能正常  
-
-> 💡 如果你收到这条消息，说明微信通知配置成功！
-
----
-
-### 策略说明:
-- 监听三根15分钟K线的包含关系
-- K2被K1包含，K3突破K1
-"""
+        content = TEST_NOTIFY_TEMPLATE.substitute(
+            signal_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
         
-        url = f"https://sctapi.ftqq.com/{sendkey}.send"
-        data = {'title': title, 'desp': content}
+        result = post_serverchan(sendkey, title, content)
         
-        import urllib.parse
-        post_data = urllib.parse.urlencode(data).encode('utf-8')
-        
-        req = urllib.request.Request(url, data=post_data, method='POST')
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            result = json.loads(resp.read().decode('utf-8'))
-            
-            if result.get('code') == 0:
-                print("\n✅ 测试成功! 请检查你的微信是否收到通知")
-                return True
-            else:
-                print(f"\n✗ 测试失败: {result.get('message', '未知错误')}")
-                return False
+        if result.get('code') == 0:
+            print("\n✅ 测试成功! 请检查你的微信是否收到通知")
+            return True
+        else:
+            print(f"\n✗ 测试失败: {result.get('message', '未知错误')}")
+            return False
                 
     except Exception as e:
         print(f"\n✗ 测试异常: {e}")
@@ -720,7 +1142,8 @@ def main():
     # ========== 配置参数 ==========
     SERVERCHAN_SENDKEY = 'SCT301567TtEeQSvoSSyo0240Rbe4OUkSO'
     min_k1_range_percent = 0.21  # 15分钟K线最小涨跌幅要求(%)
-    check_interval = 30  # 检查间隔(秒)
+    check_interval = 30  # 检查间隔(秒)，仅REST轮询模式使用
+    use_websocket = True  # True: websocket实时推送; False: REST轮询
     # ==============================
     
     if SERVERCHAN_SENDKEY:
@@ -741,12 +1164,17 @@ def main():
         min_k1_range_percent=min_k1_range_percent,
         serverchan_sendkey=SERVERCHAN_SENDKEY
     )
-    monitor.run(check_interval=check_interval)
+    try:
+        if use_websocket:
+            asyncio.run(monitor.run_ws())
+        else:
+            asyncio.run(monitor.run(check_interval=check_interval))
+    except KeyboardInterrupt:
+        print("\n\n监听器已停止")
+        print("="*80)
 
 
 if __name__ == '__main__':
-    import sys
-    
     if len(sys.argv) > 1 and sys.argv[1] == 'test':
         SENDKEY = 'SCT301567TtEeQSvoSSyo0240Rbe4OUkSO'
         test_wechat_notification(SENDKEY)
@@ -0,0 +1,203 @@
+"""
+参数优化公共模块 - 供各个参数遍历脚本共用
+
+包含工作进程间共享K线数据、多进程并行回测、粗到细搜索和CSV导出，
+各脚本只需提供单个K1涨跌幅下的回测函数(evaluate)和任务参数构造函数(make_task)
+"""
+
+import os
+import sys
+import csv
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from three_kline_strategy import load_kline_arrays
+
+
+# 工作进程中按列存储的K线数组: Linux下fork时直接继承主进程的数组，
+# 其他平台指向主进程创建的共享内存(由init_worker在每个进程启动时创建一次)
+_arrays = None
+_shm = None
+
+# Linux下用fork启动工作进程，子进程以写时复制方式继承已读取的K线数组
+USE_FORK = sys.platform.startswith('linux')
+
+# 回测只用到价格列，放入共享内存供所有工作进程零拷贝读取
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+
+# 每批任务大约包含的参数组合数
+BATCH_COMBINATIONS = 1000
+
+PERCENT = 0.01  # 百分数 -> 小数
+
+PROGRESS_INTERVAL = 1.0  # 进度刷新间隔(秒)
+
+
+def result_to_dict(row):
+    """把结果数组的一行转换成字典(只用于打印和写LOG)"""
+    return dict(zip(row.dtype.names, row.tolist()))
+
+
+def load_arrays(cache_file):
+    """
+    读取K线数据缓存
+
+    返回:
+        按列存储的K线数组，找不到缓存文件时返回None
+    """
+    if not os.path.exists(cache_file):
+        print("错误: 找不到K线数据缓存文件!")
+        print("请先运行 three_kline_strategy.py 生成数据缓存")
+        return None
+
+    print("\n正在读取K线数据...")
+    arrays = load_kline_arrays(cache_file)
+    print(f"✓ 成功读取 {len(arrays['ts'])} 根K线数据")
+    return arrays
+
+
+def share_arrays(arr):
+    """
+    把K线价格列复制到共享内存
+
+    返回:
+        (共享内存对象, 价格矩阵形状)，用完后需close()并unlink()
+    """
+    matrix = np.stack([arr[name] for name in PRICE_COLUMNS])
+    shm = shared_memory.SharedMemory(create=True, size=matrix.nbytes)
+    np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)[:] = matrix
+    return shm, matrix.shape
+
+
+def init_worker(shm_name, shape):
+    """工作进程初始化: 连接主进程的共享内存，不复制也不重新读取K线数据"""
+    global _arrays, _shm
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=np.float64, buffer=_shm.buf)
+    _arrays = dict(zip(PRICE_COLUMNS, matrix))
+
+
+def worker_arrays():
+    """工作进程中的K线价格数组(evaluate函数内使用)"""
+    return _arrays
+
+
+def grid_search(arrays, axes, result_dtype, evaluate, make_task,
+                coarse_to_fine=False, coarse_steps=(1, 1, 1), refine_top_n=20):
+    """
+    在 参数A × 参数B × K1涨跌幅 三维网格上并行回测
+
+    参数:
+        arrays: 按列存储的K线数组
+        axes: (参数A取值, 参数B取值, K1涨跌幅取值)
+        result_dtype: 结果数组的dtype
+        evaluate: 工作进程中回测一个任务的函数，返回按(A, B)排列的(结果数组, 有效标记)，需定义在模块顶层
+        make_task: make_task(A取值列表, B取值列表, K1涨跌幅) -> evaluate的参数
+        coarse_to_fine: 为True时先按粗网格(每个参数每隔coarse_steps个取一个值)遍历，
+                        再在胜率最高的refine_top_n个组合附近逐个细化
+
+    返回:
+        (all_results, valid_mask)，按(A, B, K1)的遍历顺序存放
+    """
+    # 所有结果预先分配在一个结构化数组中
+    all_results = np.zeros(tuple(len(values) for values in axes), dtype=result_dtype)
+    valid_mask = np.zeros(all_results.shape, dtype=bool)
+    tested_mask = np.zeros(all_results.shape, dtype=bool)
+    best_winrate = 0
+    a_values, b_values, k1_values = axes
+
+    def run_sweep(executor, stage, a_ids, b_ids, k1_ids):
+        """回测 A×B×K1 下标组合，结果写入all_results"""
+        nonlocal best_winrate
+        a_ids, b_ids = sorted(a_ids), sorted(b_ids)
+        a_list = [a_values[i] for i in a_ids]
+        b_list = [b_values[i] for i in b_ids]
+
+        # 以K1涨跌幅为最外层，每个K1值一个任务，分发到所有CPU核心并行回测
+        k1_ids = sorted(k1_ids)
+        param_list = [make_task(a_list, b_list, k1_values[ki]) for ki in k1_ids]
+
+        count = 0
+        last_print = 0.0
+        stage_total = len(a_list) * len(b_list) * len(k1_ids)
+        box = np.ix_(a_ids, b_ids)
+        # 多个K1任务合成一批发给工作进程(每批约BATCH_COMBINATIONS个组合)，减少进程间通信次数
+        batch_size = max(1, BATCH_COMBINATIONS // (len(a_list) * len(b_list)))
+        for ki, (block, valid) in zip(k1_ids, executor.map(evaluate, param_list, chunksize=batch_size)):
+            count += block.size
+            all_results[:, :, ki][box] = block
+            valid_mask[:, :, ki][box] = valid
+            tested_mask[:, :, ki][box] = True
+            if valid.any():
+                best_winrate = max(best_winrate, block['win_rate'][valid].max())
+
+            # 显示进度(每PROGRESS_INTERVAL秒最多刷新一次，最后一批必定显示)
+            now = time.monotonic()
+            if now - last_print >= PROGRESS_INTERVAL or count == stage_total:
+                last_print = now
+                print(f"{stage}进度: {count}/{stage_total} ({count/stage_total*100:.1f}%) - 当前最高胜率: {best_winrate:.2f}%", end='\r')
+        print()
+
+    # 遍历所有参数组合
+    print("\n开始参数优化...")
+    print("-"*80)
+
+    all_ids = [range(n) for n in all_results.shape]
+    global _arrays
+    shm = None
+    if USE_FORK:
+        # 在创建工作进程之前设置好，fork出的子进程直接使用，不复制也不传递
+        _arrays = {name: arrays[name] for name in PRICE_COLUMNS}
+        executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context('fork'))
+    else:
+        shm, shape = share_arrays(arrays)
+        executor = ProcessPoolExecutor(initializer=init_worker, initargs=(shm.name, shape))
+    try:
+        with executor:
+            if not coarse_to_fine:
+                run_sweep(executor, "", *all_ids)
+            else:
+                run_sweep(executor, "粗搜索", *(ids[::step] for ids, step in zip(all_ids, coarse_steps)))
+
+                # 胜率最高的粗搜索组合附近，每个参数前后各(步长-1)个值
+                coarse = np.argwhere(valid_mask)
+                top = coarse[np.argsort(-all_results[valid_mask]['win_rate'], kind='stable')[:refine_top_n]]
+
+                # 按K1分组，同一K1下合并所有需要细化的A/B值
+                refine = {}
+                for center in top:
+                    near = [range(max(0, c - step + 1), min(n, c + step)) for c, n, step in zip(center, all_results.shape, coarse_steps)]
+                    for ki in near[2]:
+                        a_ids, b_ids = refine.setdefault(ki, (set(), set()))
+                        a_ids.update(near[0])
+                        b_ids.update(near[1])
+
+                # K1相同且A/B集合相同的合并成一批
+                batches = {}
+                for ki, (a_ids, b_ids) in refine.items():
+                    batches.setdefault((tuple(sorted(a_ids)), tuple(sorted(b_ids))), []).append(ki)
+                for (a_ids, b_ids), k1_ids in batches.items():
+                    run_sweep(executor, "细化", a_ids, b_ids, k1_ids)
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        _arrays = None
+
+    print(f"实际测试: {int(tested_mask.sum())}/{all_results.size} 种参数组合")
+    return all_results, valid_mask
+
+
+def sort_by_winrate(results):
+    """按胜率从高到低排序(稳定排序，胜率相同时保持遍历顺序)"""
+    return results[np.argsort(-results['win_rate'], kind='stable')]
+
+
+def write_csv(filename, header, rows):
+    """导出CSV，rows可以是生成器(逐行写入，不在内存中构造全部行)"""
+    with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 脚本都放在仓库根目录和 量化实行/ 下（不是包），测试时直接加入导入路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "量化实行"))
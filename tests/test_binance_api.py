@@ -0,0 +1,65 @@
+import threading
+
+import pytest
+
+import three_kline_strategy as tks
+from three_kline_strategy import BinanceAPI
+
+
+INTERVAL_MS = 15 * 60 * 1000
+
+
+def fake_fetch_range(fail_starts):
+    """按窗口生成对齐到K线周期的假数据；窗口起点在 fail_starts 中时抛出异常"""
+    def _fetch(symbol, interval, start_time, end_time, retries=5):
+        if start_time in fail_starts:
+            raise RuntimeError("mock failure")
+        first = -(-start_time // INTERVAL_MS) * INTERVAL_MS
+        return [[t, "1", "1", "1", "1", "1"] for t in range(first, end_time + 1, INTERVAL_MS)]
+    return _fetch
+
+
+def windows(monkeypatch, n_batches, now_ms=1_700_000_000_000):
+    monkeypatch.setattr(tks.time, "time", lambda: now_ms / 1000)
+    batch_ms = BinanceAPI.BATCH_SIZE * INTERVAL_MS
+    return [(now_ms - (i + 1) * batch_ms + 1, now_ms - i * batch_ms) for i in range(n_batches)]
+
+
+def assert_contiguous(klines):
+    ts = [k[0] for k in klines]
+    assert all(b - a == INTERVAL_MS for a, b in zip(ts, ts[1:]))
+
+
+def test_get_klines_all_windows_ok(monkeypatch):
+    windows(monkeypatch, 10)
+    monkeypatch.setattr(BinanceAPI, "_fetch_range", staticmethod(fake_fetch_range(set())))
+    klines = BinanceAPI.get_klines("BTCUSDT", "15m", limit=10000)
+    assert len(klines) == 10000
+    assert_contiguous(klines)
+
+
+@pytest.mark.parametrize("failed", [0, 2, 9])
+def test_get_klines_failed_window_leaves_no_gap(monkeypatch, failed):
+    wins = windows(monkeypatch, 10)
+    monkeypatch.setattr(BinanceAPI, "_fetch_range",
+                        staticmethod(fake_fetch_range({wins[failed][0]})))
+    klines = BinanceAPI.get_klines("BTCUSDT", "15m", limit=10000)
+    # 只保留失败窗口之后(更新)的连续批次
+    assert len(klines) == failed * BinanceAPI.BATCH_SIZE
+    assert_contiguous(klines)
+    if klines:
+        assert klines[-1][0] <= wins[0][1]
+        assert klines[0][0] >= wins[failed][1]
+
+
+def test_sessions_are_per_thread_and_share_adapter():
+    if not tks.REQUESTS_AVAILABLE:
+        pytest.skip("requests 未安装")
+    sessions = []
+    t = threading.Thread(target=lambda: sessions.append(BinanceAPI._session()))
+    t.start()
+    t.join()
+    main_session = BinanceAPI._session()
+    assert main_session is BinanceAPI._session()
+    assert sessions[0] is not main_session
+    assert sessions[0].get_adapter("https://x") is main_session.get_adapter("https://x") is BinanceAPI.ADAPTER
@@ -0,0 +1,145 @@
+import json
+import threading
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+pytest.importorskip("requests")
+
+import 下单模块
+from 下单模块 import BinanceTrader
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self._data = data
+        self.text = json.dumps(data)
+
+    def json(self):
+        return self._data
+
+
+class FakeSession:
+    """记录请求的假会话：第 fail_on 次 batchOrders 请求返回 HTTP 400"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.batches = []
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        if url.endswith("/fapi/v1/time"):
+            return FakeResponse(200, {"serverTime": 0})
+        if url.endswith("/fapi/v2/balance"):
+            return FakeResponse(200, [{"asset": "USDT", "balance": "12.5", "availableBalance": "7.25"}])
+        raise AssertionError(url)
+
+    def post(self, url, headers=None, timeout=None):
+        query = parse_qs(urlparse(url).query)
+        chunk = json.loads(query["batchOrders"][0])
+        self.batches.append(chunk)
+        if len(self.batches) == self.fail_on:
+            return FakeResponse(400, {"code": -1102, "msg": "mock failure"})
+        return FakeResponse(200, [{"orderId": order["quantity"]} for order in chunk])
+
+
+def make_trader(monkeypatch, session):
+    monkeypatch.setattr(下单模块.requests, "Session", lambda: session)
+    return BinanceTrader("key", "secret")
+
+
+def legs(n):
+    return [{"symbol": "ETHUSDT", "side": "SELL", "type": "MARKET",
+             "quantity": f"0.{i:03d}", "positionSide": "BOTH"} for i in range(n)]
+
+
+def test_batch_orders_chunks_by_limit(monkeypatch):
+    session = FakeSession()
+    trader = make_trader(monkeypatch, session)
+    trader._balances = {}
+    results = trader.batch_orders(legs(12))
+    assert [len(chunk) for chunk in session.batches] == [5, 5, 2]
+    assert [r["orderId"] for r in results] == [leg["quantity"] for leg in legs(12)]
+    assert trader._balances is None
+
+
+def test_batch_orders_partial_failure_keeps_placed_results(monkeypatch):
+    session = FakeSession(fail_on=2)
+    trader = make_trader(monkeypatch, session)
+    trader._balances = {}
+    with pytest.raises(RuntimeError) as excinfo:
+        trader.batch_orders(legs(12))
+    # 第一组已提交，第二组失败后不再继续
+    assert len(session.batches) == 2
+    assert [r["orderId"] for r in excinfo.value.partial_results] == [leg["quantity"] for leg in legs(5)]
+    assert trader._balances is None
+
+
+def test_get_balance_reads_wallet_balance_and_defaults_missing_asset(monkeypatch):
+    trader = make_trader(monkeypatch, FakeSession())
+    assert trader.get_balance(refresh=True) == 12.5
+    assert trader.get_balance(asset="BTC") == 0.0
+
+
+class OrderSession(FakeSession):
+    """单笔下单的假会话：行情/交易对信息正常返回，下单或追加保证金按 fail 指定的接口返回 HTTP 400"""
+
+    def __init__(self, fail=None):
+        super().__init__()
+        self.fail = fail
+        self.posts = []
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        if "/fapi/v1/ticker/price" in url:
+            return FakeResponse(200, {"symbol": "ETHUSDT", "price": "2000"})
+        if url.endswith("/fapi/v1/exchangeInfo"):
+            return FakeResponse(200, {"symbols": [{"symbol": "ETHUSDT", "filters": [
+                {"filterType": "LOT_SIZE", "minQty": "0.001", "stepSize": "0.001"}]}]})
+        return super().get(url, headers, params, timeout)
+
+    def post(self, url, headers=None, timeout=None):
+        endpoint = urlparse(url).path
+        self.posts.append(endpoint)
+        if endpoint == self.fail:
+            return FakeResponse(400, {"code": -2019, "msg": "mock failure"})
+        return FakeResponse(200, {"orderId": 1})
+
+
+@pytest.mark.parametrize("fail", ["/fapi/v1/order", "/fapi/v2/positionMargin"])
+def test_buy_invalidates_balance_cache_on_failure(monkeypatch, fail):
+    session = OrderSession(fail=fail)
+    trader = make_trader(monkeypatch, session)
+    trader._balances = {}
+    with pytest.raises(RuntimeError):
+        trader.buy(usdt_amount=100, extra_margin=5)
+    assert session.posts[-1] == fail
+    assert trader._balances is None
+
+
+def test_buy_uses_one_session_per_thread(monkeypatch):
+    sessions = []
+
+    class RecordingSession(OrderSession):
+        def __init__(self):
+            super().__init__()
+            self.gets = []
+            self.threads = set()
+            sessions.append(self)
+
+        def get(self, url, headers=None, params=None, timeout=None):
+            self.gets.append(urlparse(url).path)
+            self.threads.add(threading.get_ident())
+            return super().get(url, headers, params, timeout)
+
+    monkeypatch.setattr(下单模块.requests, "Session", RecordingSession)
+    trader = BinanceTrader("key", "secret")
+    trader.buy(usdt_amount=100)
+    # 首次下单：价格与交易对信息并发查询，会话不跨线程共用
+    assert all(len(s.threads) == 1 for s in sessions)
+    assert sum(s.gets.count("/fapi/v1/ticker/price") for s in sessions) == 1
+
+    # 交易对信息已缓存：只查价格，且不再新建会话
+    count = len(sessions)
+    trader.buy(usdt_amount=100)
+    assert len(sessions) == count
+    assert sum(s.gets.count("/fapi/v1/exchangeInfo") for s in sessions) == 1
@@ -0,0 +1,55 @@
+import importlib
+
+import pytest
+
+
+sell = importlib.import_module("websocket监听模块-卖出")
+
+HEADER = "时间,仓位ID,方向,入场价,是否平仓\n"
+
+
+@pytest.fixture(autouse=True)
+def reset_cache(monkeypatch):
+    monkeypatch.setattr(sell, "_open_positions_cache", {'key': None, 'positions': {}})
+
+
+def test_cached_until_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / "signals.csv"
+    path.write_text(HEADER + "t1,A,多,100,未平仓\n", encoding="utf-8")
+    calls = []
+    real = sell._read_open_positions
+    monkeypatch.setattr(sell, "_read_open_positions", lambda p: calls.append(p) or real(p))
+
+    assert list(sell.load_open_positions_cached(str(path))) == ["A"]
+    assert list(sell.load_open_positions_cached(str(path))) == ["A"]
+    assert len(calls) == 1
+
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("t2,B,空,101,未平仓\n")
+    assert list(sell.load_open_positions_cached(str(path))) == ["A", "B"]
+    assert len(calls) == 2
+
+
+def test_partial_row_not_cached(tmp_path):
+    # 买入端正在追加时，最后一行只写了一半
+    path = tmp_path / "signals.csv"
+    path.write_text(HEADER + "t1,A,多,100,未平仓\nt2,B,空", encoding="utf-8")
+
+    assert list(sell.load_open_positions_cached(str(path))) == ["A"]
+    assert sell._open_positions_cache['key'] is None
+
+
+def test_file_changed_during_read_not_cached(tmp_path, monkeypatch):
+    path = tmp_path / "signals.csv"
+    path.write_text(HEADER + "t1,A,多,100,未平仓\n", encoding="utf-8")
+    real = sell._read_open_positions
+
+    def read_then_append(p):
+        result = real(p)
+        with open(p, "a", encoding="utf-8") as f:
+            f.write("t2,B,空,101,未平仓\n")
+        return result
+    monkeypatch.setattr(sell, "_read_open_positions", read_then_append)
+
+    assert list(sell.load_open_positions_cached(str(path))) == ["A"]
+    assert sell._open_positions_cache['key'] is None
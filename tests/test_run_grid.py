@@ -0,0 +1,39 @@
+import json
+import os
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import three_kline_strategy as tks
+
+
+GRID = [{'min_k1_range': 0.003, 'profit_target': 0.006, 'stop_loss_delay_bars': 5},
+        {'min_k1_range': 0.005, 'profit_target': 0.01, 'stop_loss_delay_bars': 10}]
+
+
+def write_cache(path, n=400, seed=1):
+    rng = random.Random(seed)
+    price, klines = 2000.0, []
+    for i in range(n):
+        o = price
+        c = o * (1 + rng.uniform(-0.008, 0.008))
+        klines.append([i * 900000, o, max(o, c) * (1 + rng.uniform(0, 0.004)),
+                       min(o, c) * (1 - rng.uniform(0, 0.004)), c, 1.0])
+        price = c
+    path.write_text(json.dumps(klines), encoding="utf-8")
+    return str(path)
+
+
+def test_run_grid_falls_back_in_process_when_npy_save_fails(tmp_path, monkeypatch):
+    cache_file = write_cache(tmp_path / "klines.json")
+    expected = tks.run_grid(cache_file, GRID, max_workers=2)
+    os.remove(tks.kline_npy_path(cache_file))
+
+    def fail_save(*args, **kwargs):
+        raise OSError("disk full")
+    monkeypatch.setattr(tks.np, "save", fail_save)
+
+    assert tks.run_grid(cache_file, GRID, max_workers=2) == expected
+    assert not os.path.exists(tks.kline_npy_path(cache_file))
@@ -23,23 +23,149 @@
 """
 
 import urllib.request
+import urllib.error
 import json
+import gzip
 import time
-import csv
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain
 from typing import List, Dict, Optional
+import numpy as np
+
+# Numba可选: 安装后出场模拟编译为机器码，未安装时使用NumPy分块查找
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# orjson可选: 安装后直接从字节解析JSON，比标准库json快数倍，未安装时使用json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# requests可选: 安装后用长连接会话下载K线(复用TCP+TLS连接，gzip压缩传输)，未安装时使用urllib
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    REQUESTS_AVAILABLE = False
+
+# pandas可选: 安装后(另需pyarrow或fastparquet)可额外导出Parquet列式交易日志
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+
+
+def read_json_file(path: str):
+    """读取JSON文件(优先使用orjson)"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_json_file(path: str, obj) -> None:
+    """写入JSON文件(优先使用orjson)"""
+    if ORJSON_AVAILABLE:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(obj))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f)
+
+
+def parse_json_bytes(data: bytes):
+    """解析JSON字节串(优先使用orjson，无需先解码)"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
+
+@lru_cache(maxsize=None)
+def format_time(timestamp_ms: int) -> str:
+    """毫秒时间戳 -> 本地时间字符串(同一时间戳只格式化一次)"""
+    return datetime.fromtimestamp(timestamp_ms / 1000).strftime('%Y-%m-%d %H:%M')
 
 
 class BinanceAPI:
     """币安API接口封装"""
     BASE_URL = "https://api.binance.com"
+    BATCH_SIZE = 1000  # 单次请求最多返回的K线数
+    MAX_WORKERS = 5  # 并发请求数(币安按IP每分钟计权重，5个并发是安全的)
+    INTERVAL_MS = {'m': 60 * 1000, 'h': 60 * 60 * 1000, 'd': 24 * 60 * 60 * 1000, 'w': 7 * 24 * 60 * 60 * 1000}
+    HEADERS = {'Accept-Encoding': 'gzip'}  # K线JSON压缩后约为原来的1/4
+    
+    # 共享的长连接池：连接池大小与并发数一致，每个下载线程各占一条长连接。
+    # requests.Session 本身不保证线程安全，因此每个线程各用一个会话(见 _session)，
+    # 只有挂载的 HTTPAdapter(底层 urllib3 连接池是线程安全的)在线程间共享
+    if REQUESTS_AVAILABLE:
+        ADAPTER = HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS, max_retries=0)
+    else:
+        ADAPTER = None
+    _local = threading.local()
+    
+    @staticmethod
+    def _session():
+        """返回当前线程的HTTP会话(首次调用时创建，并挂载共享的连接池)"""
+        session = getattr(BinanceAPI._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount("https://", BinanceAPI.ADAPTER)
+            session.headers.update(BinanceAPI.HEADERS)
+            BinanceAPI._local.session = session
+        return session
+    
+    @staticmethod
+    def _get(url: str) -> bytes:
+        """GET请求，返回解压后的响应内容；HTTP 429时抛出urllib.error.HTTPError以便统一重试"""
+        if BinanceAPI.ADAPTER is not None:
+            resp = BinanceAPI._session().get(url, timeout=10)
+            if resp.status_code == 429:
+                raise urllib.error.HTTPError(url, 429, resp.reason, resp.headers, None)
+            resp.raise_for_status()
+            return resp.content
+        
+        request = urllib.request.Request(url, headers=BinanceAPI.HEADERS)
+        with urllib.request.urlopen(request, timeout=10) as resp:
+            data = resp.read()
+            if resp.headers.get('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+            return data
+    
+    @staticmethod
+    def _fetch_range(symbol: str, interval: str, start_time: int, end_time: int, retries: int = 5) -> List[List]:
+        """获取[start_time, end_time]时间窗口内的K线，遇到HTTP 429时指数退避重试"""
+        url = (f"{BinanceAPI.BASE_URL}/api/v3/klines?symbol={symbol}&interval={interval}"
+               f"&startTime={start_time}&endTime={end_time}&limit={BinanceAPI.BATCH_SIZE}")
+        delay = 0.5
+        for attempt in range(retries):
+            try:
+                return parse_json_bytes(BinanceAPI._get(url))
+            except urllib.error.HTTPError as e:
+                if e.code != 429 or attempt == retries - 1:
+                    raise
+                time.sleep(delay)
+                delay *= 2
+        return []
     
     @staticmethod
     def get_klines(symbol: str = "BTCUSDT", interval: str = "15m", limit: int = 1000) -> List[List]:
         """
         获取K线数据（支持获取超过1000根）
         
+        先按K线周期算出每批的时间窗口，再并发请求各窗口，按时间顺序拼接
+        
         参数:
             symbol: 交易对，默认BTCUSDT
             interval: K线周期，默认15m
@@ -48,45 +174,34 @@ class BinanceAPI:
         返回:
             K线数据列表
         """
-        all_klines = []
-        remaining = limit
-        end_time = None
+        interval_ms = int(interval[:-1]) * BinanceAPI.INTERVAL_MS[interval[-1]]
+        batch_ms = BinanceAPI.BATCH_SIZE * interval_ms
+        n_batches = (limit + BinanceAPI.BATCH_SIZE - 1) // BinanceAPI.BATCH_SIZE
+        now = int(time.time() * 1000)
+        windows = [(now - (i + 1) * batch_ms + 1, now - i * batch_ms) for i in range(n_batches)]
         
-        while remaining > 0:
-            # 每次最多获取1000根
-            batch_limit = min(remaining, 1000)
-            
-            url = f"{BinanceAPI.BASE_URL}/api/v3/klines?symbol={symbol}&interval={interval}&limit={batch_limit}"
-            if end_time:
-                url += f"&endTime={end_time}"
-            
-            try:
-                print(f"  正在获取K线数据... (已获取 {len(all_klines)}/{limit})", end='\r')
-                with urllib.request.urlopen(url, timeout=10) as resp:
-                    data = json.loads(resp.read().decode('utf-8'))
-                    
-                    if not data:
-                        break
-                    
-                    # 添加到结果中（倒序添加以保持时间顺序）
-                    all_klines = data + all_klines
-                    
-                    # 更新end_time为最早K线的时间戳
-                    end_time = data[0][0] - 1
-                    
-                    remaining -= len(data)
-                    
-                    # 如果返回的数据少于请求的数量，说明没有更多历史数据了
-                    if len(data) < batch_limit:
-                        break
-                    
-                    # 避免请求过快
-                    time.sleep(0.2)
-                    
-            except Exception as e:
-                print(f"\n获取K线数据失败: {e}")
-                break
+        # 各窗口互不重叠，返回后直接放进自己的位置，最后按时间顺序拼接一次(不需要合并排序)
+        # 失败的窗口保持为None，拼接时从该窗口处截断
+        batches = [None] * n_batches
+        print(f"  正在并发获取K线数据... ({n_batches} 批)", end='\r')
+        with ThreadPoolExecutor(max_workers=BinanceAPI.MAX_WORKERS) as pool:
+            futures = {pool.submit(BinanceAPI._fetch_range, symbol, interval, start, end): i
+                       for i, (start, end) in enumerate(windows)}
+            for future in as_completed(futures):
+                try:
+                    batches[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"\n获取K线数据失败: {e}")
+        
+        # 只保留从最新窗口起连续成功(且有数据)的部分：中间某一批失败时丢弃它及更早的批次，
+        # 保证返回的K线在时间上连续，不会在序列中间留下缺口
+        n_ok = 0
+        while n_ok < n_batches and batches[n_ok]:
+            n_ok += 1
+        if n_ok < n_batches:
+            print(f"\n⚠ 第 {n_ok + 1}/{n_batches} 批(由新到旧)获取失败或无数据，仅保留之后的 {n_ok} 批连续K线")
         
+        all_klines = list(chain.from_iterable(reversed(batches[:n_ok])))[-limit:]
         print(f"  成功获取 {len(all_klines)} 根K线数据" + " " * 20)
         return all_klines
 
@@ -112,9 +227,48 @@ class KLine:
         self.body_high = max(self.open, self.close)
         self.body_low = min(self.open, self.close)
         
+    @classmethod
+    def from_arrays(cls, arr: Dict[str, np.ndarray], i: int) -> 'KLine':
+        """从klines_to_arrays格式的数组中取出第i根K线(只在输出信号时构造)"""
+        return cls([arr['ts'][i], arr['open'][i], arr['high'][i], arr['low'][i], arr['close'][i], arr['volume'][i]])
+    
     def __repr__(self):
-        dt = datetime.fromtimestamp(self.timestamp / 1000)
-        return f"KLine({dt.strftime('%Y-%m-%d %H:%M')}, O:{self.open:.2f}, H:{self.high:.2f}, L:{self.low:.2f}, C:{self.close:.2f})"
+        return f"KLine({format_time(self.timestamp)}, O:{self.open:.2f}, H:{self.high:.2f}, L:{self.low:.2f}, C:{self.close:.2f})"
+
+
+class Signal:
+    """
+    交易信号(入场 + 出场)
+    
+    用__slots__代替字典: 每个信号占用内存更小、构造更快，属性访问也比字典查找快。
+    K1/K2/K3只对少量信号构造KLine对象；法则1的信号没有K3(为None)，未平仓前出场字段为None
+    """
+    __slots__ = ('type', 'direction', 'k1', 'k2', 'k3', 'entry_price', 'entry_time', 'entry_index',
+                 'exit_type', 'exit_price', 'exit_time', 'exit_index', 'holding_bars', 'ret',
+                 'stop_loss_hit_count')
+    
+    def __init__(self, type: str, direction: str, k1: KLine, k2: KLine, k3: Optional[KLine],
+                 entry_price: float, entry_time: int, entry_index: int):
+        self.type = type
+        self.direction = direction
+        self.k1 = k1
+        self.k2 = k2
+        self.k3 = k3
+        self.entry_price = entry_price
+        self.entry_time = entry_time
+        self.entry_index = entry_index
+        self.exit_type = None
+        self.exit_price = None
+        self.exit_time = None
+        self.exit_index = None
+        self.holding_bars = None
+        self.ret = None
+        self.stop_loss_hit_count = 0
+    
+    def entry_copy(self) -> 'Signal':
+        """复制入场部分(出场字段为空)"""
+        return Signal(self.type, self.direction, self.k1, self.k2, self.k3,
+                      self.entry_price, self.entry_time, self.entry_index)
 
 
 class ThreeKlineStrategy:
@@ -195,7 +349,7 @@ class ThreeKlineStrategy:
         
         return (False, None)
     
-    def find_signals(self, klines: List[KLine], 
+    def find_signals(self, klines: Dict[str, np.ndarray], 
                     profit_target: float = 0.008, 
                     stop_loss: float = 1.0,  # 止损100%
                     min_k1_range: float = 0.005,
@@ -203,12 +357,12 @@ class ThreeKlineStrategy:
                     max_holding_bars_sl: int = None,
                     allow_stop_loss_retry: bool = True,
                     stop_loss_delay_bars: int = 10,  # 前10根K线不止损
-                    leverage: int = 50) -> List[Dict]:
+                    leverage: int = 50) -> List[Signal]:
         """
         查找所有交易信号并模拟持仓直到触发止盈/止损/爆仓
         
         参数:
-            klines: K线列表
+            klines: klines_to_arrays格式的K线数组
             profit_target: 止盈百分比 (现货价格变动)
             stop_loss: 止损百分比 (现货价格变动)
             min_k1_range: K1最小涨跌幅要求 (小数形式，如0.005表示0.5%)
@@ -221,142 +375,119 @@ class ThreeKlineStrategy:
         返回:
             信号列表(仅包含已触发止盈/止损/爆仓的交易)
         """
-        signals = []
-        i = 0
-        in_position = False  # 是否持仓中
+        entries = self.find_entries(klines, min_k1_range)
+        signals = self.resolve_exits(klines, entries,
+                                     profit_target=profit_target,
+                                     stop_loss_delay_bars=stop_loss_delay_bars,
+                                     leverage=leverage)
+        self.signals = signals
+        return signals
+    
+    def find_entries(self, klines: Dict[str, np.ndarray], min_k1_range: float = 0.005) -> List[Signal]:
+        """
+        查找所有入场信号(不含出场)
         
-        while i < len(klines) - 2:
-            # 如果已经持仓,跳过新信号检测
-            if in_position:
-                i += 1
-                continue
+        入场只取决于K线形态和K1涨跌幅要求，与止盈止损参数无关，
+        参数遍历时可对同一个min_k1_range只计算一次，再用resolve_exits套用不同的止盈止损
+        
+        参数:
+            klines: klines_to_arrays格式的K线数组
+            min_k1_range: K1最小涨跌幅要求 (小数形式，如0.005表示0.5%)
+        
+        返回:
+            入场信号列表(只填写入场字段，持仓从entry_index的下一根K线开始)
+        """
+        # 形态判断对所有位置整列计算一次，只对少量满足条件的位置构造信号和KLine对象
+        found = find_entries_arrays(klines, min_k1_range)
+        entries = []
+        
+        for i, entry_index, d in zip(found['k1_index'].tolist(), found['entry_index'].tolist(),
+                                     found['direction'].tolist()):
+            k1 = KLine.from_arrays(klines, i)
+            k2 = KLine.from_arrays(klines, i + 1)
+            direction = 'long' if d == 1 else 'short'
+            
+            if entry_index == i + 2:
+                # 法则2: k2被k1包含，由k3入场
+                k3 = KLine.from_arrays(klines, i + 2)
+                entries.append(Signal('rule2', direction, k1, k2, k3, k3.close, k3.timestamp, i + 2))
+            else:
+                entries.append(Signal('rule1', direction, k1, k2, None, k2.close, k2.timestamp, i + 1))
 
-            k1 = klines[i]
-            k2 = klines[i + 1]
-            signal = None
-            entry_index = None
-
-            # 检查法则2: k2被k1包含
-            if i < len(klines) - 2 and self.is_contained(k1, k2):
-                k3 = klines[i + 2]
-                is_valid, direction = self.check_rule1(k1, k3, min_k1_range)
-                if is_valid:
-                    signal = {
-                        'type': 'rule2',
-                        'direction': direction,
-                        'k1': k1,
-                        'k2': k2,
-                        'k3': k3,
-                        'entry_price': k3.close,
-                        'entry_time': k3.timestamp,
-                        'entry_index': i + 2
-                    }
-                    entry_index = i + 3
-                    in_position = True
-                    i += 2
+        return entries
+    
+    def resolve_exits(self, klines: Dict[str, np.ndarray], entries: List[Signal],
+                      profit_target: float = 0.008,
+                      stop_loss_delay_bars: int = 10,
+                      leverage: int = 50) -> List[Signal]:
+        """
+        为入场信号模拟持仓，直到触发止盈/止损/爆仓
+        
+        参数:
+            klines: klines_to_arrays格式的K线数组
+            entries: find_entries返回的入场信号(不会被修改)
+            profit_target: 止盈百分比 (现货价格变动)
+            stop_loss_delay_bars: 前N根K线只在止盈或爆仓时平仓，之后有盈利就平仓
+            leverage: 杠杆倍数，用于计算爆仓点
+        
+        返回:
+            信号列表(仅包含已触发止盈/止损/爆仓的交易)
+        """
+        liquidation_threshold = -1.0 / leverage  # 止损阈值（合约亏损100%）
+        
+        # 逐根扫描出场交给数组版(安装Numba时为编译后的机器码)，这里只为已平仓的交易构造信号
+        # 法则1的K1在入场前1根，法则2在入场前2根
+        entry_index = np.array([e.entry_index for e in entries], dtype=np.int64)
+        k1_index = entry_index - np.array([2 if e.type == 'rule2' else 1 for e in entries], dtype=np.int64)
+        direction = np.array([1 if e.direction == 'long' else -1 for e in entries], dtype=np.int64)
+        exit_index, exit_type, returns, holding = scan_exits(
+            klines, {'k1_index': k1_index, 'entry_index': entry_index, 'direction': direction},
+            profit_target=profit_target, stop_loss_delay_bars=stop_loss_delay_bars, leverage=leverage)
+        
+        ts, c = klines['ts'].tolist(), klines['close'].tolist()
+        signals = []
+        for entry, j, code, ret, bars in zip(entries, exit_index.tolist(), exit_type.tolist(),
+                                              returns.tolist(), holding.tolist()):
+            if j < 0:
+                continue
+            signal = entry.entry_copy()
+            entry_price = signal.entry_price
+            is_long = signal.direction == 'long'
+            
+            if code == EXIT_STOP_LOSS:
+                # 止损（合约亏损100%）
+                signal.exit_type = 'stop_loss'
+                signal.exit_price = entry_price * (1 + liquidation_threshold) if is_long else entry_price * (1 - liquidation_threshold)
+            elif code == EXIT_TAKE_PROFIT:
+                # 止盈: 在K1的最高点(做多)/最低点(做空)出场
+                signal.exit_type = 'take_profit'
+                signal.exit_price = signal.k1.high if is_long else signal.k1.low
             else:
-                is_valid, direction = self.check_rule1(k1, k2, min_k1_range)
-                if is_valid:
-                    signal = {
-                        'type': 'rule1',
-                        'direction': direction,
-                        'k1': k1,
-                        'k2': k2,
-                        'entry_price': k2.close,
-                        'entry_time': k2.timestamp,
-                        'entry_index': i + 1
-                    }
-                    entry_index = i + 2
-                    in_position = True
-                    i += 1
-
-            if signal and entry_index:
-                entry_price = signal['entry_price']
-                direction = signal['direction']
-                stop_loss_hit_count = 0
-                k1 = signal['k1']
-                if direction == 'long':
-                    target_price = k1.high
-                    profit_target_dynamic = (target_price - entry_price) / entry_price
-                else:
-                    target_price = k1.low
-                    profit_target_dynamic = (entry_price - target_price) / entry_price
-                if profit_target_dynamic < profit_target:
-                    profit_target_dynamic = profit_target
-
-                for j in range(entry_index, len(klines)):
-                    current_kline = klines[j]
-                    holding_bars = j - entry_index + 1
-                    if direction == 'long':
-                        high_return = (current_kline.high - entry_price) / entry_price
-                        low_return = (current_kline.low - entry_price) / entry_price
-                        current_return = (current_kline.close - entry_price) / entry_price
-                    else:
-                        high_return = (entry_price - current_kline.low) / entry_price
-                        low_return = (entry_price - current_kline.high) / entry_price
-                        current_return = (entry_price - current_kline.close) / entry_price
-
-                    liquidation_threshold = -1.0 / leverage  # 止损阈值（合约亏损100%）
-                    
-                    # 1. 检查止损（合约亏损100%）- 所有K线都检查
-                    if low_return <= liquidation_threshold:
-                        signal['exit_type'] = 'stop_loss'
-                        signal['exit_price'] = entry_price * (1 + liquidation_threshold) if direction == 'long' else entry_price * (1 - liquidation_threshold)
-                        signal['exit_time'] = current_kline.timestamp
-                        signal['exit_index'] = j
-                        signal['holding_bars'] = holding_bars
-                        signal['return'] = liquidation_threshold
-                        signal['stop_loss_hit_count'] = stop_loss_hit_count
-                        signals.append(signal)
-                        in_position = False
-                        break
-                    # 2. 检查止盈（达到40%）- 所有K线都检查
-                    elif high_return >= profit_target_dynamic:
-                        signal['exit_type'] = 'take_profit'
-                        signal['exit_price'] = target_price
-                        signal['exit_time'] = current_kline.timestamp
-                        signal['exit_index'] = j
-                        signal['holding_bars'] = holding_bars
-                        signal['return'] = profit_target_dynamic
-                        signal['stop_loss_hit_count'] = stop_loss_hit_count
-                        signals.append(signal)
-                        in_position = False
-                        break
-                    # 3. 10根K线后，只要有盈利就平仓
-                    elif holding_bars > stop_loss_delay_bars and high_return > 0:
-                        # 计算能盈利的价格点
-                        if direction == 'long':
-                            exit_price = max(entry_price * 1.0001, current_kline.close)  # 至少0.01%盈利
-                        else:
-                            exit_price = min(entry_price * 0.9999, current_kline.close)
-                        # 重新计算实际收益
-                        if direction == 'long':
-                            actual_return = (exit_price - entry_price) / entry_price
-                        else:
-                            actual_return = (entry_price - exit_price) / entry_price
-                        
-                        signal['exit_type'] = 'partial_profit'
-                        signal['exit_price'] = exit_price
-                        signal['exit_time'] = current_kline.timestamp
-                        signal['exit_index'] = j
-                        signal['holding_bars'] = holding_bars
-                        signal['return'] = actual_return
-                        signal['stop_loss_hit_count'] = stop_loss_hit_count
-                        signals.append(signal)
-                        in_position = False
-                        break
-
-                if in_position:
-                    in_position = False
-
-            i += 1
+                # 10根K线后有盈利就平仓，至少0.01%盈利
+                signal.exit_type = 'partial_profit'
+                signal.exit_price = max(entry_price * 1.0001, c[j]) if is_long else min(entry_price * 0.9999, c[j])
+            signal.exit_time = ts[j]
+            signal.exit_index = j
+            signal.holding_bars = bars
+            signal.ret = ret
+            signals.append(signal)
 
-        self.signals = signals
         return signals
     
-    def calculate_win_rate(self, signals: List[Dict], 
+    # 出场类型 -> (是否盈利, 交易结果说明)
+    EXIT_RESULTS = {
+        'take_profit': (True, '止盈'),
+        'partial_profit': (True, '部分止盈'),
+        'timeout_profit': (True, '超时止盈'),
+        'liquidation': (False, '爆仓'),
+        'stop_loss': (False, '止损'),
+        'timeout_loss': (False, '超时止损'),
+    }
+    
+    def calculate_win_rate(self, signals: List[Signal], 
                           leverage: int = 50,
-                          initial_capital: float = 1.0) -> Dict:  # 杠杆倍数和每次投入资金
+                          initial_capital: float = 1.0,  # 杠杆倍数和每次投入资金
+                          with_details: bool = True) -> Dict:
         """
         计算胜率(信号已经包含止盈/止损信息)
         
@@ -364,6 +495,7 @@ class ThreeKlineStrategy:
             signals: 信号列表(已触发止盈/止损)
             leverage: 杠杆倍数
             initial_capital: 每次交易投入的本金(USDT)
+            with_details: 是否生成逐笔交易详情(只在导出CSV/TXT时需要，参数遍历时可关闭)
         
         返回:
             统计结果字典
@@ -385,106 +517,69 @@ class ThreeKlineStrategy:
                 'trade_details': []
             }
         
-        wins = 0
-        losses = 0
-        take_profit_count = 0  # 完全止盈次数
-        partial_profit_count = 0  # 部分止盈次数
-        stop_loss_count = 0  # 止损次数
-        liquidations = 0  # 爆仓次数
-        profits = []
-        losses_list = []
-        holding_bars_list = []
-        trade_details = []  # 存储每笔交易详情
+        # 逐笔数值一次性转成数组，统计全部用NumPy归约
+        n = len(signals)
+        exit_types = [signal.exit_type for signal in signals]
+        returns = np.fromiter((signal.ret for signal in signals), dtype=np.float64, count=n)
+        holding_bars = np.fromiter((signal.holding_bars for signal in signals), dtype=np.int64, count=n)
+        is_win = np.fromiter((self.EXIT_RESULTS.get(t, (False,))[0] for t in exit_types), dtype=bool, count=n)
+        exit_counts = {t: exit_types.count(t) for t in self.EXIT_RESULTS}
         
-        total_capital = 0.0  # 累计资金
+        # 计算每笔交易盈亏(USDT)，cumsum按顺序累加，与逐笔相加结果完全相同
+        pnl = initial_capital * returns * leverage
+        cumulative = np.cumsum(pnl)
+        total_capital = float(cumulative[-1])
         
-        for idx, signal in enumerate(signals, 1):
-            entry_price = signal['entry_price']
-            exit_price = signal['exit_price']
-            direction = signal['direction']
-            exit_type = signal['exit_type']
-            return_pct = signal['return']
-            holding_bars = signal['holding_bars']
-            
-            holding_bars_list.append(holding_bars)
-            
-            # 计算本次交易盈亏(USDT)
-            pnl = initial_capital * return_pct * leverage
-            total_capital += pnl
-            
-            # 判断盈亏
-            if exit_type == 'take_profit':
-                wins += 1
-                take_profit_count += 1
-                profits.append(return_pct)
-                result = '止盈'
-            elif exit_type == 'partial_profit':
-                wins += 1
-                partial_profit_count += 1
-                profits.append(return_pct)
-                result = '部分止盈'
-            elif exit_type == 'timeout_profit':
-                wins += 1
-                profits.append(return_pct)
-                result = '超时止盈'
-            elif exit_type == 'liquidation':
-                losses += 1
-                liquidations += 1
-                stop_loss_count += 1
-                losses_list.append(return_pct)
-                result = '爆仓'
-            elif exit_type == 'stop_loss':
-                losses += 1
-                stop_loss_count += 1
-                losses_list.append(return_pct)
-                result = '止损'
-            else:  # timeout_loss
-                losses += 1
-                losses_list.append(return_pct)
-                result = '超时止损'
-            
-            # 计算百分比
-            price_change_percent = return_pct * 100
-            contract_return = return_pct * leverage * 100
-            
-            # 记录交易详情
-            trade_detail = {
-                'trade_id': idx,
-                'signal_type': signal['type'],
-                'direction': '做多' if direction == 'long' else '做空',
-                'entry_time': datetime.fromtimestamp(signal['entry_time']/1000).strftime('%Y-%m-%d %H:%M'),
-                'entry_price': entry_price,
-                'exit_time': datetime.fromtimestamp(signal['exit_time']/1000).strftime('%Y-%m-%d %H:%M'),
-                'exit_price': exit_price,
-                'holding_bars': holding_bars,
-                'holding_time': f"{holding_bars * 15}分钟",
-                'price_change_percent': price_change_percent,
-                'contract_return': contract_return,
-                'pnl': pnl,
-                'cumulative_capital': total_capital,
-                'result': result,
-                'k1_high': signal['k1'].high,
-                'k1_low': signal['k1'].low,
-                'k2_high': signal['k2'].high,
-                'k2_low': signal['k2'].low,
-            }
-            trade_details.append(trade_detail)
+        wins = int(is_win.sum())
+        losses = n - wins
+        profit_sum = float(np.cumsum(returns[is_win])[-1]) if wins else 0
+        loss_sum = float(np.cumsum(returns[~is_win])[-1]) if losses else 0
         
         total_trades = wins + losses
         win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
-        avg_profit = sum(profits) / len(profits) if profits else 0
-        avg_loss = sum(losses_list) / len(losses_list) if losses_list else 0
-        avg_holding_bars = sum(holding_bars_list) / len(holding_bars_list) if holding_bars_list else 0
+        avg_profit = profit_sum / wins if wins else 0
+        avg_loss = loss_sum / losses if losses else 0
+        avg_holding_bars = int(holding_bars.sum()) / n
+        
+        trade_details = []  # 存储每笔交易详情
+        if with_details:
+            # 计算百分比
+            price_change_percent = (returns * 100).tolist()
+            contract_return = (returns * leverage * 100).tolist()
+            for idx, (signal, exit_type, pnl_i, cum_i, change_i, contract_i) in enumerate(
+                    zip(signals, exit_types, pnl.tolist(), cumulative.tolist(),
+                        price_change_percent, contract_return), 1):
+                # 记录交易详情
+                trade_details.append({
+                    'trade_id': idx,
+                    'signal_type': signal.type,
+                    'direction': '做多' if signal.direction == 'long' else '做空',
+                    'entry_time': format_time(signal.entry_time),
+                    'entry_price': signal.entry_price,
+                    'exit_time': format_time(signal.exit_time),
+                    'exit_price': signal.exit_price,
+                    'holding_bars': signal.holding_bars,
+                    'holding_time': f"{signal.holding_bars * 15}分钟",
+                    'price_change_percent': change_i,
+                    'contract_return': contract_i,
+                    'pnl': pnl_i,
+                    'cumulative_capital': cum_i,
+                    'result': self.EXIT_RESULTS.get(exit_type, (False, '超时止损'))[1],
+                    'k1_high': signal.k1.high,
+                    'k1_low': signal.k1.low,
+                    'k2_high': signal.k2.high,
+                    'k2_low': signal.k2.low,
+                })
         
         return {
-            'total_signals': len(signals),
+            'total_signals': n,
             'total_trades': total_trades,
             'wins': wins,
             'losses': losses,
-            'take_profit_count': take_profit_count,
-            'partial_profit_count': partial_profit_count,
-            'stop_loss_count': stop_loss_count,
-            'liquidations': liquidations,
+            'take_profit_count': exit_counts['take_profit'],
+            'partial_profit_count': exit_counts['partial_profit'],
+            'stop_loss_count': exit_counts['stop_loss'] + exit_counts['liquidation'],
+            'liquidations': exit_counts['liquidation'],
             'win_rate': win_rate,
             'avg_profit': avg_profit * 100,  # 转换为百分比
             'avg_loss': avg_loss * 100,  # 转换为百分比
@@ -494,11 +589,474 @@ class ThreeKlineStrategy:
             'total_capital': total_capital,
             'total_pnl': total_capital,
             'final_capital': total_trades * initial_capital + total_capital,
-            'profit_factor': abs(sum(profits) / sum(losses_list)) if losses_list and sum(losses_list) != 0 else float('inf'),
+            'profit_factor': abs(profit_sum / loss_sum) if losses and loss_sum != 0 else float('inf'),
             'trade_details': trade_details
         }
 
 
+# ====== 数组版回测(参数遍历用) ======
+# 把K线按列存成NumPy数组，入场形态用整列比较一次算出，出场按块向量化查找，
+# 规则与ThreeKlineStrategy.find_entries/resolve_exits完全一致，但只输出统计需要的数值
+
+EXIT_STOP_LOSS = 0
+EXIT_TAKE_PROFIT = 1
+EXIT_PARTIAL_PROFIT = 2
+
+
+KLINE_COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+
+
+def klines_to_matrix(raw_klines: List[List]) -> np.ndarray:
+    """
+    把币安原始K线转换成(6, N)的float64矩阵，每行是一列K线数据(顺序见KLINE_COLUMNS)
+    """
+    # 直接把每根K线的前6列流式写入float64缓冲区，不构造逐行的中间列表
+    data = np.fromiter(chain.from_iterable(k[:6] for k in raw_klines), dtype=np.float64,
+                       count=6 * len(raw_klines)).reshape(-1, 6)
+    return np.ascontiguousarray(data.T)
+
+
+def matrix_to_kline_arrays(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    把klines_to_matrix格式的矩阵拆成按列存储的数组(价格列直接引用矩阵的行，不复制)
+    """
+    arr = {name: np.asarray(row) for name, row in zip(KLINE_COLUMNS, matrix)}
+    arr['ts'] = arr['ts'].astype(np.int64)
+    return arr
+
+
+def klines_to_arrays(raw_klines: List[List]) -> Dict[str, np.ndarray]:
+    """
+    把币安原始K线转换成按列存储的数组
+    
+    参数:
+        raw_klines: 币安K线数据 [[时间, 开, 高, 低, 收, 成交量, ...], ...]
+    
+    返回:
+        {'ts', 'open', 'high', 'low', 'close', 'volume'} -> np.ndarray
+    """
+    return matrix_to_kline_arrays(klines_to_matrix(raw_klines))
+
+
+def kline_npy_path(cache_file: str) -> str:
+    """JSON K线缓存旁边的.npy二进制缓存路径"""
+    return os.path.splitext(cache_file)[0] + '.npy'
+
+
+def save_kline_cache(cache_file: str, raw_klines: List[List], matrix: np.ndarray) -> None:
+    """
+    保存K线缓存: JSON(其他分析脚本直接读取)和旁边的.npy二进制缓存
+    
+    .npy在JSON之后写入，修改时间不早于JSON，下次load_kline_arrays直接内存映射，不再解析JSON
+    """
+    write_json_file(cache_file, raw_klines)
+    np.save(kline_npy_path(cache_file), matrix)
+
+
+def load_kline_arrays(cache_file: str) -> Dict[str, np.ndarray]:
+    """
+    读取K线缓存并转换成数组，同时在旁边保存一份.npy二进制缓存
+    
+    .npy比JSON缓存新时直接内存映射读取，跳过JSON解析和逐根转换；JSON缓存更新后自动重建
+    
+    参数:
+        cache_file: JSON格式的K线缓存文件
+    
+    返回:
+        klines_to_arrays格式的数组字典
+    """
+    npy_file = kline_npy_path(cache_file)
+    if os.path.exists(npy_file) and os.path.getmtime(npy_file) >= os.path.getmtime(cache_file):
+        return matrix_to_kline_arrays(np.load(npy_file, mmap_mode='r'))
+    
+    matrix = klines_to_matrix(read_json_file(cache_file))
+    try:
+        np.save(npy_file, matrix)
+    except OSError as e:
+        print(f"保存K线二进制缓存失败: {e}")
+    return matrix_to_kline_arrays(matrix)
+
+
+def add_derived_columns(arr: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    在数组字典中补上与参数无关的派生列(已存在时直接复用)
+    
+    同一份K线反复扫描不同参数时，实体高低点、实体长度和K1涨跌幅只计算一次，
+    K1涨跌幅要求只剩一次 k1_range >= 阈值 的比较
+    
+    返回:
+        传入的字典本身，新增 'body_high', 'body_low', 'body_length', 'k1_range'
+    """
+    if 'k1_range' not in arr:
+        o, c = arr['open'], arr['close']
+        arr['body_high'] = np.maximum(o, c)
+        arr['body_low'] = np.minimum(o, c)
+        arr['body_length'] = np.abs(c - o)
+        arr['k1_range'] = arr['body_length'] / o
+    return arr
+
+
+def _rule1_directions(arr: Dict[str, np.ndarray], k2_offset: int, min_k1_range: float) -> np.ndarray:
+    """
+    对所有位置i同时检查法则1(K1=i, K2=i+k2_offset)
+    
+    返回:
+        方向数组: 1做多, -1做空, 0不满足
+    """
+    add_derived_columns(arr)
+    h, l = arr['high'], arr['low']
+    n = len(h) - 2
+    k1 = slice(0, n)
+    k2 = slice(k2_offset, k2_offset + n)
+    
+    # K1涨跌幅(开盘价和收盘价)
+    k1_ok = ~(arr['k1_range'][k1] < min_k1_range)
+    
+    # K2实体在K1范围内
+    body_high = arr['body_high'][k2]
+    body_low = arr['body_low'][k2]
+    body_in_range = (body_high <= h[k1]) & (body_low >= l[k1])
+    
+    # K2影线总长度不大于实体，实体率>=30%，十字线(无波动)直接过滤
+    body_length = arr['body_length'][k2]
+    total_shadow = (h[k2] - body_high) + (body_low - l[k2])
+    total_range = h[k2] - l[k2]
+    has_range = total_range > 0
+    body_ratio = np.divide(body_length, total_range, out=np.zeros(n), where=has_range)
+    shape_ok = ~(total_shadow > body_length) & has_range & ~(body_ratio < 0.30)
+    
+    valid = k1_ok & body_in_range & shape_ok
+    long_ = valid & (l[k2] < l[k1])
+    short = valid & ~long_ & (h[k2] > h[k1])
+    return long_.astype(np.int8) - short.astype(np.int8)
+
+
+def find_entries_arrays(arr: Dict[str, np.ndarray], min_k1_range: float = 0.005) -> Dict[str, np.ndarray]:
+    """
+    数组版find_entries: 查找所有入场信号
+    
+    参数:
+        arr: klines_to_arrays的返回值
+        min_k1_range: K1最小涨跌幅要求 (小数形式)
+    
+    返回:
+        {'k1_index', 'entry_index', 'direction'(1做多/-1做空)} -> np.ndarray
+    """
+    h, l = arr['high'], arr['low']
+    n = len(h) - 2
+    if n <= 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return {'k1_index': empty, 'entry_index': empty, 'direction': empty}
+    
+    # 法则2: K2被K1包含时用K3检查，否则用K2检查
+    contained = (h[1:n + 1] <= h[:n]) & (l[1:n + 1] >= l[:n])
+    direction = np.where(contained,
+                         _rule1_directions(arr, 2, min_k1_range),
+                         _rule1_directions(arr, 1, min_k1_range))
+    
+    # 入场后跳过入场K线之前的位置(与逐根遍历时的i跳转一致)
+    # 满足条件的位置及其偏移/方向一次性取成Python列表，循环内不再逐个索引NumPy数组
+    hits = np.flatnonzero(direction)
+    offsets = np.where(contained[hits], 2, 1).tolist()
+    k1_index, entry_index, directions = [], [], []
+    next_i = 0
+    for i, off, d in zip(hits.tolist(), offsets, direction[hits].tolist()):
+        if i < next_i:
+            continue
+        k1_index.append(i)
+        entry_index.append(i + off)
+        directions.append(d)
+        next_i = i + off + 1
+    
+    return {
+        'k1_index': np.array(k1_index, dtype=np.int64),
+        'entry_index': np.array(entry_index, dtype=np.int64),
+        'direction': np.array(directions, dtype=np.int64),
+    }
+
+
+def _price_thresholds(entry_price, sign, take_return, stop_return):
+    """
+    把止盈/爆仓的收益率阈值换算成价格阈值(乘以方向符号)，逐根判断只需比较一次价格
+    
+    收益率 sign * (价格 - 入场价) / 入场价 随价格单调变化，先用入场价估算阈值，
+    再按浮点数逐个微调到边界，保证与逐根计算收益率再比较的结果完全一致
+    
+    返回:
+        (take_key, stop_key): sign*价格 >= take_key 即止盈，sign*价格 <= stop_key 即爆仓
+    """
+    take_key = sign * entry_price + entry_price * take_return
+    while sign * (sign * take_key - entry_price) / entry_price >= take_return:
+        take_key = np.nextafter(take_key, -np.inf)
+    while sign * (sign * take_key - entry_price) / entry_price < take_return:
+        take_key = np.nextafter(take_key, np.inf)
+    
+    stop_key = sign * entry_price + entry_price * stop_return
+    while sign * (sign * stop_key - entry_price) / entry_price <= stop_return:
+        stop_key = np.nextafter(stop_key, np.inf)
+    while sign * (sign * stop_key - entry_price) / entry_price > stop_return:
+        stop_key = np.nextafter(stop_key, -np.inf)
+    return take_key, stop_key
+
+
+if NUMBA_AVAILABLE:
+    _price_thresholds_numba = njit(cache=True)(_price_thresholds)
+    
+    @njit(cache=True)
+    def _scan_exits_numba(h, l, c, k1_index, entry_index, direction,
+                          profit_target, stop_loss_delay_bars, leverage):
+        """逐根扫描出场(编译版)，未平仓的交易exit_index为-1"""
+        n = len(h)
+        m = len(entry_index)
+        exit_index = np.full(m, -1, dtype=np.int64)
+        exit_type = np.zeros(m, dtype=np.int64)
+        returns = np.zeros(m, dtype=np.float64)
+        holding = np.zeros(m, dtype=np.int64)
+        liquidation_threshold = -1.0 / leverage
+        
+        for e in range(m):
+            k1_i = k1_index[e]
+            entry_i = entry_index[e]
+            d = direction[e]
+            entry_price = c[entry_i]
+            start = entry_i + 1
+            # 按方向选出有利/不利价格列并换成符号乘数，循环内不再按方向分支
+            sign = 1.0 if d == 1 else -1.0
+            favorable = h if d == 1 else l
+            adverse = l if d == 1 else h
+            profit_target_dynamic = sign * (favorable[k1_i] - entry_price) / entry_price
+            if profit_target_dynamic < profit_target:
+                profit_target_dynamic = profit_target
+            # 止盈/爆仓/保本价格在入场时算好，逐根只比较价格
+            take_key, stop_key = _price_thresholds_numba(entry_price, sign, profit_target_dynamic,
+                                                         liquidation_threshold)
+            entry_key = sign * entry_price
+            
+            for j in range(start, n):
+                holding_bars = j - start + 1
+                
+                if sign * adverse[j] <= stop_key:
+                    exit_type[e] = 0  # EXIT_STOP_LOSS
+                    returns[e] = liquidation_threshold
+                elif sign * favorable[j] >= take_key:
+                    exit_type[e] = 1  # EXIT_TAKE_PROFIT
+                    returns[e] = profit_target_dynamic
+                elif holding_bars > stop_loss_delay_bars and sign * favorable[j] > entry_key:
+                    exit_type[e] = 2  # EXIT_PARTIAL_PROFIT
+                    if d == 1:
+                        exit_price = max(entry_price * 1.0001, c[j])
+                        returns[e] = (exit_price - entry_price) / entry_price
+                    else:
+                        exit_price = min(entry_price * 0.9999, c[j])
+                        returns[e] = (entry_price - exit_price) / entry_price
+                else:
+                    continue
+                exit_index[e] = j
+                holding[e] = holding_bars
+                break
+        
+        return exit_index, exit_type, returns, holding
+
+
+def scan_exits(arr: Dict[str, np.ndarray], entries: Dict[str, np.ndarray],
+               profit_target: float = 0.008,
+               stop_loss_delay_bars: int = 10,
+               leverage: int = 50):
+    """
+    为每个入场信号逐根扫描出场(安装Numba时使用编译版，否则按块向量化查找)
+    
+    参数:
+        arr: klines_to_arrays的返回值
+        entries: find_entries_arrays格式的入场信号
+        profit_target: 止盈百分比 (现货价格变动)
+        stop_loss_delay_bars: 前N根K线只在止盈或爆仓时平仓，之后有盈利就平仓
+        leverage: 杠杆倍数
+    
+    返回:
+        (exit_index, exit_type, return, holding_bars)，与入场一一对应，未平仓的exit_index为-1
+    """
+    h, l, c = arr['high'], arr['low'], arr['close']
+    
+    if NUMBA_AVAILABLE:
+        return _scan_exits_numba(
+            h, l, c, entries['k1_index'], entries['entry_index'], entries['direction'],
+            float(profit_target), int(stop_loss_delay_bars), float(leverage))
+    
+    n = len(h)
+    m = len(entries['entry_index'])
+    liquidation_threshold = -1.0 / leverage
+    exit_index = np.full(m, -1, dtype=np.int64)
+    exit_type = np.zeros(m, dtype=np.int64)
+    returns = np.zeros(m, dtype=np.float64)
+    holding = np.zeros(m, dtype=np.int64)
+    for e, (k1_i, entry_i, d) in enumerate(zip(entries['k1_index'].tolist(), entries['entry_index'].tolist(),
+                                               entries['direction'].tolist())):
+        entry_price = c[entry_i]
+        start = entry_i + 1
+        sign = 1.0 if d == 1 else -1.0
+        favorable = h if d == 1 else l
+        adverse = l if d == 1 else h
+        profit_target_dynamic = sign * (favorable[k1_i] - entry_price) / entry_price
+        if profit_target_dynamic < profit_target:
+            profit_target_dynamic = profit_target
+        take_key, stop_key = _price_thresholds(entry_price, sign, profit_target_dynamic, liquidation_threshold)
+        entry_key = sign * entry_price
+        
+        # 按块查找第一根满足出场条件的K线，止损延迟过后通常很快出场
+        block = max(stop_loss_delay_bars + 1, 32)
+        lo = start
+        while lo < n:
+            hi = min(lo + block, n)
+            favorable_key = sign * favorable[lo:hi]
+            stop = sign * adverse[lo:hi] <= stop_key
+            take = favorable_key >= take_key
+            holding_bars = np.arange(lo - start + 1, hi - start + 1)
+            partial = (holding_bars > stop_loss_delay_bars) & (favorable_key > entry_key)
+            hit = np.flatnonzero(stop | take | partial)
+            if len(hit):
+                k = hit[0]
+                j = lo + k
+                if stop[k]:
+                    exit_type[e] = EXIT_STOP_LOSS
+                    returns[e] = liquidation_threshold
+                elif take[k]:
+                    exit_type[e] = EXIT_TAKE_PROFIT
+                    returns[e] = profit_target_dynamic
+                else:
+                    # 至少0.01%盈利
+                    if d == 1:
+                        exit_price = max(entry_price * 1.0001, c[j])
+                        returns[e] = (exit_price - entry_price) / entry_price
+                    else:
+                        exit_price = min(entry_price * 0.9999, c[j])
+                        returns[e] = (entry_price - exit_price) / entry_price
+                    exit_type[e] = EXIT_PARTIAL_PROFIT
+                exit_index[e] = j
+                holding[e] = j - start + 1
+                break
+            lo = hi
+            block *= 2
+    
+    return exit_index, exit_type, returns, holding
+
+
+def resolve_exits_arrays(arr: Dict[str, np.ndarray], entries: Dict[str, np.ndarray],
+                         profit_target: float = 0.008,
+                         stop_loss_delay_bars: int = 10,
+                         leverage: int = 50) -> Dict[str, np.ndarray]:
+    """
+    数组版resolve_exits: 为入场信号模拟持仓，直到触发止盈/止损/爆仓
+    
+    参数:
+        arr: klines_to_arrays的返回值
+        entries: find_entries_arrays的返回值
+        profit_target: 止盈百分比 (现货价格变动)
+        stop_loss_delay_bars: 前N根K线只在止盈或爆仓时平仓，之后有盈利就平仓
+        leverage: 杠杆倍数
+    
+    返回:
+        {'exit_index', 'exit_type', 'return', 'holding_bars'} -> np.ndarray，
+        只包含已平仓的交易，顺序与入场一致
+    """
+    exit_index, exit_type, returns, holding = scan_exits(
+        arr, entries, profit_target, stop_loss_delay_bars, leverage)
+    closed = exit_index >= 0
+    return {
+        'exit_index': exit_index[closed],
+        'exit_type': exit_type[closed],
+        'return': returns[closed],
+        'holding_bars': holding[closed],
+    }
+
+
+def summarize_exits(exits: Dict[str, np.ndarray], leverage: int = 50,
+                    initial_capital: float = 1.0) -> Dict:
+    """
+    由resolve_exits_arrays的结果计算汇总统计，数值与calculate_win_rate一致(不含逐笔明细)
+    
+    返回:
+        统计结果字典
+    """
+    returns = exits['return']
+    total_trades = len(returns)
+    if total_trades == 0:
+        return {'total_trades': 0, 'wins': 0, 'losses': 0, 'win_rate': 0.0,
+                'total_pnl': 0.0, 'final_capital': 0.0, 'profit_factor': float('inf'),
+                'avg_holding_bars': 0.0}
+    
+    is_win = exits['exit_type'] != EXIT_STOP_LOSS
+    wins = int(is_win.sum())
+    losses = total_trades - wins
+    # cumsum按顺序累加，结果与逐笔相加完全相同
+    total_pnl = float(np.cumsum(initial_capital * returns * leverage)[-1])
+    profit_sum = float(np.cumsum(returns[is_win])[-1]) if wins else 0
+    loss_sum = float(np.cumsum(returns[~is_win])[-1]) if losses else 0
+    
+    return {
+        'total_trades': total_trades,
+        'wins': wins,
+        'losses': losses,
+        'win_rate': wins / total_trades * 100,
+        'total_pnl': total_pnl,
+        'final_capital': total_trades * initial_capital + total_pnl,
+        'profit_factor': abs(profit_sum / loss_sum) if losses and loss_sum != 0 else float('inf'),
+        'avg_holding_bars': int(exits['holding_bars'].sum()) / total_trades,
+    }
+
+
+# 工作进程中按.npy路径缓存的K线数组(每个进程只内存映射一次，派生列也只计算一次)
+_grid_arrays = {}
+
+
+def _run_grid_point(npy_file: str, params: Dict) -> Dict:
+    """工作进程: 回测一组参数，返回summarize_exits的统计结果"""
+    arr = _grid_arrays.get(npy_file)
+    if arr is None:
+        arr = _grid_arrays[npy_file] = matrix_to_kline_arrays(np.load(npy_file, mmap_mode='r'))
+    return _backtest_grid_point(arr, params)
+
+
+def _backtest_grid_point(arr: Dict[str, np.ndarray], params: Dict) -> Dict:
+    """用已加载的K线数组回测一组参数"""
+    leverage = params.get('leverage', 50)
+    entries = find_entries_arrays(arr, params.get('min_k1_range', 0.005))
+    exits = resolve_exits_arrays(arr, entries,
+                                 profit_target=params.get('profit_target', 0.008),
+                                 stop_loss_delay_bars=params.get('stop_loss_delay_bars', 10),
+                                 leverage=leverage)
+    return summarize_exits(exits, leverage=leverage, initial_capital=params.get('initial_capital', 1.0))
+
+
+def run_grid(cache_file: str, grid: List[Dict], max_workers: Optional[int] = None) -> List[Dict]:
+    """
+    多进程并行回测参数网格
+    
+    工作进程各自内存映射cache_file旁边的.npy缓存，K线数据不经过进程间传递
+    
+    参数:
+        cache_file: JSON格式的K线缓存文件(.npy缓存不存在或过期时先在主进程重建)
+        grid: 参数字典列表，可包含 min_k1_range, profit_target, stop_loss_delay_bars,
+              leverage, initial_capital (小数形式，缺省时使用find_signals的默认值)
+        max_workers: 工作进程数，默认为CPU核心数
+    
+    返回:
+        与grid一一对应的统计结果列表
+    """
+    arr = load_kline_arrays(cache_file)
+    npy_file = kline_npy_path(cache_file)
+    if not os.path.exists(npy_file) or os.path.getmtime(npy_file) < os.path.getmtime(cache_file):
+        # .npy缓存写入失败(如磁盘满/目录只读)时工作进程无法读取，退回主进程逐组回测
+        print("K线二进制缓存不可用，在主进程中逐组回测")
+        return [_backtest_grid_point(arr, params) for params in grid]
+    
+    results = [None] * len(grid)
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as ex:
+        futures = {ex.submit(_run_grid_point, npy_file, params): k for k, params in enumerate(grid)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
 def export_to_csv(trade_details: List[Dict], filename: str = "trade_log.csv"):
     """导出交易详情到CSV文件"""
     if not trade_details:
@@ -511,32 +1069,21 @@ def export_to_csv(trade_details: List[Dict], filename: str = "trade_log.csv"):
         '盈亏USDT', '累计资金USDT', '结果', 'K1最高', 'K1最低', 'K2最高', 'K2最低'
     ]
     
+    # 各列都是数字/日期/不含逗号的文字，无需引号转义，直接格式化成行再一次性写入
+    lines = [','.join(fieldnames)]
+    lines.extend(
+        f"{t['trade_id']},{t['signal_type']},{t['direction']},{t['entry_time']},{t['entry_price']:.2f},"
+        f"{t['exit_time']},{t['exit_price']:.2f},{t['holding_bars']},{t['holding_time']},"
+        f"{t['price_change_percent']:.3f}%,{t['contract_return']:.2f}%,{t['pnl']:.4f},{t['cumulative_capital']:.4f},"
+        f"{t['result']},{t['k1_high']:.2f},{t['k1_low']:.2f},{t['k2_high']:.2f},{t['k2_low']:.2f}"
+        for t in trade_details
+    )
+    lines.append('')
+    
     try:
-        with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for trade in trade_details:
-                writer.writerow({
-                    '交易编号': trade['trade_id'],
-                    '策略类型': trade['signal_type'],
-                    '方向': trade['direction'],
-                    '入场时间': trade['entry_time'],
-                    '入场价格': f"{trade['entry_price']:.2f}",
-                    '出场时间': trade['exit_time'],
-                    '出场价格': f"{trade['exit_price']:.2f}",
-                    '持仓K线数': trade['holding_bars'],
-                    '持仓时长': trade['holding_time'],
-                    '价格变动%': f"{trade['price_change_percent']:.3f}%",
-                    '合约收益%': f"{trade['contract_return']:.2f}%",
-                    '盈亏USDT': f"{trade['pnl']:.4f}",
-                    '累计资金USDT': f"{trade['cumulative_capital']:.4f}",
-                    '结果': trade['result'],
-                    'K1最高': f"{trade['k1_high']:.2f}",
-                    'K1最低': f"{trade['k1_low']:.2f}",
-                    'K2最高': f"{trade['k2_high']:.2f}",
-                    'K2最低': f"{trade['k2_low']:.2f}",
-                })
+        # 与csv模块一致: UTF-8 BOM + \r\n换行
+        with open(filename, 'w', newline='', encoding='utf-8-sig', buffering=1 << 20) as csvfile:
+            csvfile.write('\r\n'.join(lines))
         
         print(f"\n✓ 交易日志已导出到: {filename}")
         return filename
@@ -545,6 +1092,24 @@ def export_to_csv(trade_details: List[Dict], filename: str = "trade_log.csv"):
         return None
 
 
+def export_to_parquet(trade_details: List[Dict], filename: str = "trade_log.parquet"):
+    """导出交易详情到Parquet列式文件(体积小、读取快，适合后续用pandas分析)"""
+    if not trade_details:
+        print("没有交易数据可导出")
+        return
+    if not PANDAS_AVAILABLE:
+        print("\n✗ 导出Parquet失败: 未安装pandas")
+        return None
+    
+    try:
+        pd.DataFrame.from_records(trade_details).to_parquet(filename, index=False)
+        print(f"✓ 列式日志已导出到: {filename}")
+        return filename
+    except Exception as e:
+        print(f"\n✗ 导出Parquet失败: {e}")
+        return None
+
+
 def export_to_txt(trade_details: List[Dict], stats: Dict, filename: str = "trade_log.txt"):
     """导出详细交易日志到TXT文件"""
     if not trade_details:
@@ -622,20 +1187,20 @@ def export_to_txt(trade_details: List[Dict], stats: Dict, filename: str = "trade
         return None
 
 
-def print_signal_details(signals: List[Dict], limit: int = 10):
+def print_signal_details(signals: List[Signal], limit: int = 10):
     """打印信号详情"""
     print(f"\n{'='*80}")
     print(f"交易信号详情 (显示前{min(limit, len(signals))}个)")
     print(f"{'='*80}")
     
     for i, signal in enumerate(signals[:limit]):
-        print(f"\n信号 #{i+1} - 类型: {signal['type']} - {signal['exit_type']}")
-        print(f"  入场时间: {datetime.fromtimestamp(signal['entry_time']/1000).strftime('%Y-%m-%d %H:%M')}")
-        print(f"  出场时间: {datetime.fromtimestamp(signal['exit_time']/1000).strftime('%Y-%m-%d %H:%M')}")
-        print(f"  持仓: {signal['holding_bars']}根K线 ({signal['holding_bars'] * 15}分钟)")
-        print(f"  入场价格: {signal['entry_price']:.2f}")
-        print(f"  出场价格: {signal['exit_price']:.2f}")
-        print(f"  收益率: {signal['return']*100:.3f}%")
+        print(f"\n信号 #{i+1} - 类型: {signal.type} - {signal.exit_type}")
+        print(f"  入场时间: {format_time(signal.entry_time)}")
+        print(f"  出场时间: {format_time(signal.exit_time)}")
+        print(f"  持仓: {signal.holding_bars}根K线 ({signal.holding_bars * 15}分钟)")
+        print(f"  入场价格: {signal.entry_price:.2f}")
+        print(f"  出场价格: {signal.exit_price:.2f}")
+        print(f"  收益率: {signal.ret*100:.3f}%")
 
 
 def main():
@@ -647,6 +1212,7 @@ def main():
     initial_capital = 1.0       # 每次投入资金（USDT）
     min_k1_range_percent = 0.46  # 第一根K线开收涨跌幅要求（%）
     stop_loss_delay_bars = 10    # 前10根K线不设止损
+    export_parquet = False       # 是否额外导出Parquet列式日志（需要pandas和pyarrow）
     # ==============================
     
     # 计算现货价格需要变动的百分比
@@ -667,23 +1233,22 @@ def main():
     # K线数据缓存文件
     cache_file = "btcusdt_15m_klines.json"
     
-    # 获取K线数据
+    # 获取K线数据(按列存储的数组，信号输出时才构造KLine对象)
+    klines = None
     if os.path.exists(cache_file):
         print(f"\n发现本地缓存文件: {cache_file}")
         print("正在读取本地数据...")
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                raw_klines = json.load(f)
-            print(f"✓ 成功从缓存读取 {len(raw_klines)} 根K线数据")
+            # 优先内存映射旁边的.npy二进制缓存，不存在或过期时解析JSON并重建
+            klines = load_kline_arrays(cache_file)
+            print(f"✓ 成功从缓存读取 {len(klines['ts'])} 根K线数据")
         except Exception as e:
             print(f"✗ 读取缓存失败: {e}")
             print("将重新从币安获取数据...")
-            raw_klines = None
-    else:
-        raw_klines = None
+            klines = None
     
     # 如果没有缓存或读取失败,则从API获取
-    if raw_klines is None:
+    if klines is None:
         print("\n正在从币安API获取K线数据...")
         api = BinanceAPI()
         raw_klines = api.get_klines(symbol="BTCUSDT", interval="15m", limit=10000)
@@ -692,21 +1257,22 @@ def main():
             print("获取K线数据失败！")
             return
         
-        # 保存到本地缓存
+        # 下载结果一次性转换成float64矩阵，同时写入JSON缓存和.npy二进制缓存
+        matrix = klines_to_matrix(raw_klines)
         try:
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(raw_klines, f)
+            save_kline_cache(cache_file, raw_klines, matrix)
             print(f"✓ K线数据已缓存到: {cache_file}")
             print(f"  (如需重新获取最新数据,请删除此文件)")
         except Exception as e:
             print(f"✗ 保存缓存失败: {e}")
-    
-    # 转换为KLine对象
-    klines = [KLine(k) for k in raw_klines]
+        del raw_klines
+        
+        klines = matrix_to_kline_arrays(matrix)
+    ts = klines['ts']
     print(f"\n数据统计:")
-    print(f"  K线数量: {len(klines)} 根")
-    print(f"  时间范围: {datetime.fromtimestamp(klines[0].timestamp/1000).strftime('%Y-%m-%d %H:%M')} 至 {datetime.fromtimestamp(klines[-1].timestamp/1000).strftime('%Y-%m-%d %H:%M')}")
-    print(f"  时间跨度: {(klines[-1].timestamp - klines[0].timestamp) / 1000 / 86400:.1f} 天")
+    print(f"  K线数量: {len(ts)} 根")
+    print(f"  时间范围: {format_time(int(ts[0]))} 至 {format_time(int(ts[-1]))}")
+    print(f"  时间跨度: {(ts[-1] - ts[0]) / 1000 / 86400:.1f} 天")
     
     # 创建策略实例
     strategy = ThreeKlineStrategy()
@@ -795,6 +1361,10 @@ def main():
     # 导出TXT格式（适合阅读）
     txt_file = export_to_txt(stats['trade_details'], stats)
     
+    # 导出Parquet格式（适合后续程序分析）
+    if export_parquet:
+        export_to_parquet(stats['trade_details'])
+    
     print(f"\n日志文件已保存在当前目录下")
 
 
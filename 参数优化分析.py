@@ -12,25 +12,200 @@
 - min_k1_range_percent: 0.21-0.5 (步进0.01)
 """
 
-import json
+import io
 import os
+from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Dict
 import csv
+import numpy as np
 
+from three_kline_strategy import read_json_file
 
-class KLine:
-    """K线数据类"""
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def klines_to_matrix(raw_klines: List) -> np.ndarray:
+    """
+    把原始K线列表转换成(5, N)矩阵
+    
+    各行依次为时间戳、开盘价、最高价、最低价、收盘价，每行在内存中连续
+    """
+    return np.ascontiguousarray(np.array([k[:5] for k in raw_klines], dtype=np.float64).T)
+
+
+def matrix_to_arrays(data: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    把klines_to_matrix格式的矩阵转换成按列存储的数组
+    
+    返回:
+        {'timestamp', 'open', 'high', 'low', 'close', 'body_high', 'body_low', 'range_pct'} -> np.ndarray
+        range_pct为每根K线的涨跌幅(开盘价和收盘价)，与参数无关，只算一次
+    """
+    o, h, l, c = data[1], data[2], data[3], data[4]
+    return {
+        'timestamp': data[0].astype(np.int64),
+        'open': o,
+        'high': h,
+        'low': l,
+        'close': c,
+        'body_high': np.maximum(o, c),
+        'body_low': np.minimum(o, c),
+        'range_pct': np.abs(c - o) / o,
+    }
+
+
+def klines_to_arrays(raw_klines: List) -> Dict[str, np.ndarray]:
+    """把原始K线列表一次性转换成按列存储的数组"""
+    return matrix_to_arrays(klines_to_matrix(raw_klines))
+
+
+def _find_entries(contained, rule1_dirs, rule2_dirs):
+    """
+    逐根扫描入场信号
+    
+    出场不会阻止后续入场(每个信号之后都从入场K线的下一根继续找)，
+    所以入场只取决于K1涨跌幅，与止盈止损无关
+    
+    参数:
+        contained: 第i+1根是否被第i根包含
+        rule1_dirs / rule2_dirs: 以第i根为K1时法则1/法则2的方向(1做多, -1做空, 0无信号)
+    
+    返回:
+        (入场下标, 信号类型(1/2), 方向(1/-1))
+    """
+    # 每个信号之后至少跳过2根K线，信号数不超过n//2，按这个上限预先分配
+    # 下标用int32、类型和方向用int8，出场扫描读取的数据量只有int64的1/2到1/8
+    n = len(contained) + 1
+    max_entries = n // 2
+    entry_ids = np.empty(max_entries, dtype=np.int32)
+    signal_types = np.empty(max_entries, dtype=np.int8)
+    directions = np.empty(max_entries, dtype=np.int8)
+    count = 0
+    
+    i = 0
+    while i < n - 2:
+        if contained[i]:
+            # 法则2: K2被K1包含，由K3按法则1判断
+            direction = rule2_dirs[i]
+            signal_type = 2
+            entry_index = i + 2
+        else:
+            direction = rule1_dirs[i]
+            signal_type = 1
+            entry_index = i + 1
+        
+        if direction != 0:
+            entry_ids[count] = entry_index
+            signal_types[count] = signal_type
+            directions[count] = direction
+            count += 1
+            i = entry_index
+        i += 1
+    
+    return entry_ids[:count], signal_types[:count], directions[:count]
+
+
+def _find_exits(entry_ids, directions, h, l, c, profit_target, stop_loss):
+    """
+    找出每个入场信号的出场
     
-    def __init__(self, kline_data: List):
-        self.timestamp = int(kline_data[0])
-        self.open = float(kline_data[1])
-        self.high = float(kline_data[2])
-        self.low = float(kline_data[3])
-        self.close = float(kline_data[4])
-        self.volume = float(kline_data[5])
-        self.body_high = max(self.open, self.close)
-        self.body_low = min(self.open, self.close)
+    返回:
+        出场类型数组: 1止盈, -1止损(第二次触及止损), 0到数据结尾仍未出场
+    """
+    exit_kinds = np.zeros(len(entry_ids), dtype=np.int8)
+    n = len(c)
+    
+    for k in range(len(entry_ids)):
+        entry_index = entry_ids[k]
+        direction = directions[k]
+        entry_price = c[entry_index]
+        stop_loss_hit_count = 0
+        # 做多时有利方向看最高价、不利方向看最低价，做空相反；价格变动乘以方向即为收益
+        favorable, adverse = (h, l) if direction > 0 else (l, h)
+        
+        for j in range(entry_index + 1, n):
+            high_return = direction * (favorable[j] - entry_price) / entry_price
+            low_return = direction * (adverse[j] - entry_price) / entry_price
+            
+            if high_return >= profit_target:
+                exit_kinds[k] = 1
+                break
+            elif low_return <= -stop_loss:
+                # 第一次触及止损不出场，第二次才止损
+                stop_loss_hit_count += 1
+                if stop_loss_hit_count == 2:
+                    exit_kinds[k] = -1
+                    break
+    
+    return exit_kinds
+
+
+if NUMBA_AVAILABLE:
+    _find_entries_numba = njit(cache=True)(_find_entries)
+    _find_exits_numba = njit(cache=True)(_find_exits)
+    
+    # 每个线程一次处理PAIR_TILE组止盈止损: 逐个入场信号依次回测这一组参数，
+    # 同一入场之后的K线被连续读取多次，一直留在CPU缓存中
+    PAIR_TILE = 64
+    
+    @njit(cache=True, parallel=True)
+    def _sweep_exits_numba(entry_ids, directions, h, l, c, profit_targets, stop_losses):
+        """同一组入场信号下，多组止盈止损分块分到所有CPU核心并行回测"""
+        n = len(c)
+        n_pairs = len(profit_targets)
+        trades = np.zeros(n_pairs, dtype=np.int64)
+        wins = np.zeros(n_pairs, dtype=np.int64)
+        n_tiles = (n_pairs + PAIR_TILE - 1) // PAIR_TILE
+        
+        for t in prange(n_tiles):
+            tile_start = t * PAIR_TILE
+            tile_stop = min(tile_start + PAIR_TILE, n_pairs)
+            for k in range(len(entry_ids)):
+                entry_index = entry_ids[k]
+                direction = directions[k]
+                entry_price = c[entry_index]
+                favorable, adverse = (h, l) if direction > 0 else (l, h)
+                
+                for p in range(tile_start, tile_stop):
+                    profit_target = profit_targets[p]
+                    stop_loss = stop_losses[p]
+                    stop_loss_hit_count = 0
+                    
+                    for j in range(entry_index + 1, n):
+                        high_return = direction * (favorable[j] - entry_price) / entry_price
+                        low_return = direction * (adverse[j] - entry_price) / entry_price
+                        
+                        if high_return >= profit_target:
+                            trades[p] += 1
+                            wins[p] += 1
+                            break
+                        elif low_return <= -stop_loss:
+                            # 第一次触及止损不出场，第二次才止损
+                            stop_loss_hit_count += 1
+                            if stop_loss_hit_count == 2:
+                                trades[p] += 1
+                                break
+        
+        return trades, wins
+
+
+@dataclass
+class Signals:
+    """按列存储的已出场交易，每个字段一个数组，第k项对应第k笔交易"""
+    entry_index: np.ndarray  # 入场K线下标
+    signal_type: np.ndarray  # 信号类型: 1法则1, 2法则2
+    direction: np.ndarray    # 方向: 1做多, -1做空
+    exit_type: np.ndarray    # 出场类型: 1止盈, -1止损
+    returns: np.ndarray      # 收益率(现货价格变动比例)
+    
+    def __len__(self):
+        return len(self.returns)
 
 
 class ThreeKlineStrategy:
@@ -39,130 +214,149 @@ class ThreeKlineStrategy:
     def __init__(self):
         self.signals = []
         
-    def is_contained(self, k1: KLine, k2: KLine) -> bool:
-        return k2.high <= k1.high and k2.low >= k1.low
+    def is_contained(self, klines: Dict[str, np.ndarray]) -> np.ndarray:
+        """
+        所有位置同时检查包含关系
+        
+        返回:
+            布尔数组，第i项表示第i+1根K线的最高最低点都在第i根K线内
+        """
+        h, l = klines['high'], klines['low']
+        return (h[1:] <= h[:-1]) & (l[1:] >= l[:-1])
     
-    def check_rule1(self, k1: KLine, k2: KLine, min_range_percent: float) -> tuple:
-        k1_range = abs(k1.close - k1.open) / k1.open
-        if k1_range < min_range_percent:
-            return (False, None)
+    def check_rule1(self, klines: Dict[str, np.ndarray], k2_offset: int, range_ok: np.ndarray) -> np.ndarray:
+        """
+        所有位置同时检查法则1(K1=第i根, K2=第i+k2_offset根)
+        
+        参数:
+            range_ok: 每根K线的涨跌幅是否达标(法则1和法则2共用)
+        
+        返回:
+            方向数组: 1做多, -1做空, 0不满足
+        """
+        h, l = klines['high'], klines['low']
+        n = len(h) - k2_offset
+        k1 = slice(0, n)
+        k2 = slice(k2_offset, k2_offset + n)
         
-        body_in_range = (k2.body_high <= k1.high and k2.body_low >= k1.low)
-        if not body_in_range:
-            return (False, None)
+        # K1涨跌幅达标，且K2实体在K1范围内
+        valid = range_ok[k1] & (klines['body_high'][k2] <= h[k1]) & (klines['body_low'][k2] >= l[k1])
+        
+        # K2下破K1低点做多，否则上破K1高点做空
+        is_long = valid & (l[k2] < l[k1])
+        is_short = valid & ~is_long & (h[k2] > h[k1])
+        return is_long.astype(np.int8) - is_short.astype(np.int8)
+    
+    def precompute_candidates(self, klines: Dict[str, np.ndarray], min_k1_range: float):
+        """
+        找出所有入场信号(与止盈止损无关，同一K1涨跌幅下只需算一次)
         
-        if k2.low < k1.low:
-            return (True, 'long')
-        elif k2.high > k1.high:
-            return (True, 'short')
+        返回:
+            (入场下标, 信号类型(1/2), 方向(1/-1))
+        """
+        # 包含关系和法则1对所有位置一次算完，逐根扫描时只需查表
+        contained = self.is_contained(klines)
+        range_ok = ~(klines['range_pct'] < min_k1_range)
+        rule1_dirs = self.check_rule1(klines, 1, range_ok)
+        rule2_dirs = self.check_rule1(klines, 2, range_ok)
         
-        return (False, None)
+        if NUMBA_AVAILABLE:
+            return _find_entries_numba(contained, rule1_dirs, rule2_dirs)
+        return _find_entries(contained.tolist(), rule1_dirs.tolist(), rule2_dirs.tolist())
     
-    def find_signals(self, klines: List[KLine], 
+    def find_signals(self, klines: Dict[str, np.ndarray], 
                     profit_target: float,
                     stop_loss: float,
-                    min_k1_range: float) -> List[Dict]:
-        signals = []
-        i = 0
-        in_position = False
+                    min_k1_range: float,
+                    candidates=None) -> Signals:
+        """
+        参数:
+            candidates: precompute_candidates的结果，不传时按min_k1_range重新计算
+        """
+        if candidates is None:
+            candidates = self.precompute_candidates(klines, min_k1_range)
+        entry_ids, signal_types, directions = candidates
         
-        while i < len(klines) - 2:
-            if in_position:
-                i += 1
-                continue
-                
-            k1 = klines[i]
-            k2 = klines[i + 1]
-            signal = None
-            entry_index = None
-            
-            if i < len(klines) - 2 and self.is_contained(k1, k2):
-                k3 = klines[i + 2]
-                is_valid, direction = self.check_rule1(k1, k3, min_k1_range)
-                if is_valid:
-                    signal = {
-                        'type': 'rule2',
-                        'direction': direction,
-                        'entry_price': k3.close,
-                        'entry_time': k3.timestamp,
-                        'entry_index': i + 2
-                    }
-                    entry_index = i + 3
-                    in_position = True
-                    i += 2
-            else:
-                is_valid, direction = self.check_rule1(k1, k2, min_k1_range)
-                if is_valid:
-                    signal = {
-                        'type': 'rule1',
-                        'direction': direction,
-                        'entry_price': k2.close,
-                        'entry_time': k2.timestamp,
-                        'entry_index': i + 1
-                    }
-                    entry_index = i + 2
-                    in_position = True
-                    i += 1
-            
-            if signal and entry_index:
-                entry_price = signal['entry_price']
-                direction = signal['direction']
-                stop_loss_hit_count = 0
-                
-                for j in range(entry_index, len(klines)):
-                    current_kline = klines[j]
-                    holding_bars = j - entry_index + 1
-                    
-                    if direction == 'long':
-                        high_return = (current_kline.high - entry_price) / entry_price
-                        low_return = (current_kline.low - entry_price) / entry_price
-                    else:
-                        high_return = (entry_price - current_kline.low) / entry_price
-                        low_return = (entry_price - current_kline.high) / entry_price
-                    
-                    if high_return >= profit_target:
-                        signal['exit_type'] = 'take_profit'
-                        signal['return'] = profit_target
-                        signals.append(signal)
-                        in_position = False
-                        break
-                    elif low_return <= -stop_loss:
-                        stop_loss_hit_count += 1
-                        if stop_loss_hit_count == 1:
-                            continue
-                        signal['exit_type'] = 'stop_loss'
-                        signal['return'] = -stop_loss
-                        signals.append(signal)
-                        in_position = False
-                        break
-                
-                if in_position:
-                    in_position = False
-                    
-            i += 1
+        if NUMBA_AVAILABLE:
+            exit_kinds = _find_exits_numba(entry_ids, directions,
+                                           klines['high'], klines['low'], klines['close'],
+                                           profit_target, stop_loss)
+        else:
+            # 纯Python扫描时按列转成Python列表，按下标取值比numpy标量快
+            exit_kinds = _find_exits(entry_ids.tolist(), directions.tolist(),
+                                     *(klines[name].tolist() for name in ('high', 'low', 'close')),
+                                     profit_target, stop_loss)
+        
+        # 只保留已出场的交易
+        closed = exit_kinds != 0
+        exit_type = exit_kinds[closed]
+        return Signals(
+            entry_index=entry_ids[closed],
+            signal_type=signal_types[closed],
+            direction=directions[closed],
+            exit_type=exit_type,
+            returns=np.where(exit_type > 0, profit_target, -stop_loss)
+        )
+    
+    def sweep_stats(self, klines: Dict[str, np.ndarray], candidates,
+                    profit_targets: np.ndarray, stop_losses: np.ndarray):
+        """
+        同一组入场信号下批量回测多组止盈止损
+        
+        返回:
+            (总交易数数组, 盈利数数组)，第p项对应(profit_targets[p], stop_losses[p])
+        """
+        if NUMBA_AVAILABLE:
+            entry_ids, _, directions = candidates
+            return _sweep_exits_numba(entry_ids, directions,
+                                      klines['high'], klines['low'], klines['close'],
+                                      profit_targets, stop_losses)
         
-        return signals
-    
-    def calculate_stats(self, signals: List[Dict]) -> Dict:
-        if not signals:
-            return {
-                'total_trades': 0,
-                'wins': 0,
-                'losses': 0,
-                'win_rate': 0.0
-            }
+        # 各列只转换一次Python列表，每组止盈止损直接对出场类型数组计数，不构造Signals
+        entry_ids, _, directions = candidates
+        entry_ids, directions = entry_ids.tolist(), directions.tolist()
+        h, l, c = (klines[name].tolist() for name in ('high', 'low', 'close'))
         
-        wins = sum(1 for s in signals if s['exit_type'] == 'take_profit')
-        losses = len(signals) - wins
+        trades = np.zeros(len(profit_targets), dtype=np.int64)
+        wins = np.zeros(len(profit_targets), dtype=np.int64)
+        for p, (profit_target, stop_loss) in enumerate(zip(profit_targets.tolist(), stop_losses.tolist())):
+            exit_kinds = _find_exits(entry_ids, directions, h, l, c, profit_target, stop_loss)
+            trades[p] = np.count_nonzero(exit_kinds)
+            wins[p] = np.count_nonzero(exit_kinds > 0)
+        return trades, wins
+    
+    def calculate_stats(self, signals: Signals) -> Dict:
+        total_trades = len(signals)
+        wins = int(np.count_nonzero(signals.exit_type > 0))
+        losses = total_trades - wins
         
         return {
-            'total_trades': len(signals),
+            'total_trades': total_trades,
             'wins': wins,
             'losses': losses,
-            'win_rate': (wins / len(signals) * 100) if signals else 0
+            'win_rate': (wins / total_trades * 100) if total_trades else 0.0
         }
 
 
+# 参数组合回测结果(每个解一行)
+SOLUTION_DTYPE = np.dtype([
+    ('leverage', np.int64),
+    ('profit_target_percent', np.int64),
+    ('stop_loss_percent', np.int64),
+    ('min_k1_range_percent', np.float64),
+    ('total_trades', np.int64),
+    ('wins', np.int64),
+    ('losses', np.int64),
+    ('win_rate', np.float64),
+])
+
+
+@lru_cache(maxsize=None)
+def format_date(timestamp_ms: int) -> str:
+    """毫秒时间戳 -> 本地日期字符串(同一时间戳只格式化一次)"""
+    return datetime.fromtimestamp(timestamp_ms / 1000).strftime('%Y-%m-%d')
+
+
 def load_klines():
     """加载K线数据"""
     cache_file = "ethusdt_15m_klines.json"
@@ -172,23 +366,33 @@ def load_klines():
         print("请先运行主策略脚本生成缓存文件")
         return None
     
+    # JSON旁边保存一份.npy二进制缓存，比JSON新时直接内存映射读取，跳过JSON解析
+    npy_file = os.path.splitext(cache_file)[0] + '_ohlc.npy'
+    
     try:
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            raw_klines = json.load(f)
-        print(f"✓ 成功加载 {len(raw_klines)} 根K线数据")
-        return [KLine(k) for k in raw_klines]
+        if os.path.exists(npy_file) and os.path.getmtime(npy_file) >= os.path.getmtime(cache_file):
+            data = np.load(npy_file, mmap_mode='r')
+        else:
+            data = klines_to_matrix(read_json_file(cache_file))
+            try:
+                np.save(npy_file, data)
+            except OSError as e:
+                print(f"保存K线二进制缓存失败: {e}")
+        print(f"✓ 成功加载 {data.shape[1]} 根K线数据")
+        return matrix_to_arrays(data)
     except Exception as e:
         print(f"✗ 加载K线数据失败: {e}")
         return None
 
 
-def optimize_parameters(klines: List[KLine]):
+def optimize_parameters(klines: Dict[str, np.ndarray]):
     """参数优化"""
+    timestamps = klines['timestamp']
     print("\n" + "="*80)
     print("参数优化分析")
     print("="*80)
-    print(f"数据量: {len(klines)} 根K线")
-    print(f"时间范围: {datetime.fromtimestamp(klines[0].timestamp/1000).strftime('%Y-%m-%d')} 至 {datetime.fromtimestamp(klines[-1].timestamp/1000).strftime('%Y-%m-%d')}")
+    print(f"数据量: {len(timestamps)} 根K线")
+    print(f"时间范围: {format_date(int(timestamps[0]))} 至 {format_date(int(timestamps[-1]))}")
     
     # 参数范围
     leverage_range = range(20, 81, 5)  # 步进改为5
@@ -204,62 +408,50 @@ def optimize_parameters(klines: List[KLine]):
     
     strategy = ThreeKlineStrategy()
     
-    # 存储结果
-    perfect_solutions = []  # 符合目标的完美解
-    good_solutions = []     # 接近目标的优质解
+    # 所有(杠杆, 止盈%, 止损%)组合对应的现货价格变动比例，按遍历顺序展开
+    price_profit_targets = np.array([
+        profit_target_percent / leverage / 100
+        for leverage in leverage_range for profit_target_percent in profit_range for _ in stop_loss_range
+    ])
+    price_stop_losses = np.array([
+        stop_loss_percent / leverage / 100
+        for leverage in leverage_range for _ in profit_range for stop_loss_percent in stop_loss_range
+    ])
     
-    count = 0
-    last_print_time = datetime.now()
+    # 入场信号只取决于K1涨跌幅: 每个K1涨跌幅算一次入场，再并行回测所有止盈止损组合
+    total_trades = np.zeros((len(price_profit_targets), len(min_k1_range)), dtype=np.int64)
+    total_wins = np.zeros_like(total_trades)
+    for ki, min_k1_pct in enumerate(min_k1_range):
+        candidates = strategy.precompute_candidates(klines, min_k1_pct / 100)
+        total_trades[:, ki], total_wins[:, ki] = strategy.sweep_stats(
+            klines, candidates, price_profit_targets, price_stop_losses)
+        
+        count = (ki + 1) * len(price_profit_targets)
+        print(f"进度: {count / total_combinations * 100:.2f}% ({count:,}/{total_combinations:,})", end='\r')
     
-    for leverage in leverage_range:
-        for profit_target_percent in profit_range:
-            for stop_loss_percent in stop_loss_range:
-                for min_k1_pct in min_k1_range:
-                    count += 1
-                    
-                    # 每10秒打印一次进度
-                    now = datetime.now()
-                    if (now - last_print_time).seconds >= 10:
-                        progress = count / total_combinations * 100
-                        print(f"进度: {progress:.2f}% ({count:,}/{total_combinations:,}) | 找到: 完美解={len(perfect_solutions)}, 优质解={len(good_solutions)}", end='\r')
-                        last_print_time = now
-                    
-                    # 计算现货价格变动百分比
-                    price_profit_target = profit_target_percent / leverage / 100
-                    price_stop_loss = stop_loss_percent / leverage / 100
-                    min_k1_range_val = min_k1_pct / 100
-                    
-                    # 运行策略
-                    signals = strategy.find_signals(
-                        klines,
-                        profit_target=price_profit_target,
-                        stop_loss=price_stop_loss,
-                        min_k1_range=min_k1_range_val
-                    )
-                    
-                    stats = strategy.calculate_stats(signals)
-                    
-                    # 至少100笔交易
-                    if stats['total_trades'] < 100:
-                        continue
-                    
-                    result = {
-                        'leverage': leverage,
-                        'profit_target_percent': profit_target_percent,
-                        'stop_loss_percent': stop_loss_percent,
-                        'min_k1_range_percent': min_k1_pct,
-                        'total_trades': stats['total_trades'],
-                        'wins': stats['wins'],
-                        'losses': stats['losses'],
-                        'win_rate': stats['win_rate']
-                    }
-                    
-                    # 目标解：亏损<10 或 胜率>=95% (OR关系)
-                    if stats['losses'] < 10 or stats['win_rate'] >= 95.0:
-                        perfect_solutions.append(result)
-                    # 次优解：亏损<15 或 胜率>=90% (备选)
-                    elif stats['losses'] < 15 or stats['win_rate'] >= 90.0:
-                        good_solutions.append(result)
+    # 所有结果放在一个结构化数组中，形状为(杠杆, 止盈%, 止损%, K1涨跌幅)
+    shape = (len(leverage_range), len(profit_range), len(stop_loss_range), len(min_k1_range))
+    results = np.zeros(shape, dtype=SOLUTION_DTYPE)
+    grids = np.meshgrid(leverage_range, profit_range, stop_loss_range, min_k1_range, indexing='ij')
+    for name, grid in zip(SOLUTION_DTYPE.names[:4], grids):
+        results[name] = grid
+    results['total_trades'] = total_trades.reshape(shape)
+    results['wins'] = total_wins.reshape(shape)
+    results['losses'] = results['total_trades'] - results['wins']
+    np.divide(results['wins'], results['total_trades'], out=results['win_rate'], where=results['total_trades'] > 0)
+    results['win_rate'] *= 100
+    count = results.size
+    
+    # 至少100笔交易
+    enough = results['total_trades'] >= 100
+    # 目标解：亏损<10 或 胜率>=95% (OR关系)
+    is_perfect = enough & ((results['losses'] < 10) | (results['win_rate'] >= 95.0))
+    # 次优解：亏损<15 或 胜率>=90% (备选)
+    is_good = enough & ~is_perfect & ((results['losses'] < 15) | (results['win_rate'] >= 90.0))
+    
+    # 布尔索引按 杠杆 -> 止盈 -> 止损 -> K1涨跌幅 的遍历顺序取出
+    perfect_solutions = results[is_perfect]  # 符合目标的完美解
+    good_solutions = results[is_good]        # 接近目标的优质解
     
     print("\n" + "-"*80)
     print(f"✓ 优化完成！共测试 {count:,} 组参数")
@@ -272,37 +464,17 @@ def export_results(perfect_solutions, good_solutions):
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f"参数优化结果_{timestamp}.csv"
     
+    # 先在内存中生成整个CSV，再一次性写入文件
+    buffer = io.StringIO(newline='')
+    writer = csv.writer(buffer)
+    writer.writerow(['类型', '杠杆', '止盈%', '止损%', 'K1涨跌幅%', '总交易数', '盈利数', '亏损数', '胜率%'])
+    for label, solutions in (('目标解', perfect_solutions), ('次优解', good_solutions)):
+        # tolist()按字段顺序得到Python数值元组，胜率在最后一列
+        writer.writerows([label, *row[:-1], f"{row[-1]:.2f}"] for row in solutions.tolist())
+    
     try:
         with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            fieldnames = ['类型', '杠杆', '止盈%', '止损%', 'K1涨跌幅%', '总交易数', '盈利数', '亏损数', '胜率%']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for sol in perfect_solutions:
-                writer.writerow({
-                    '类型': '目标解',
-                    '杠杆': sol['leverage'],
-                    '止盈%': sol['profit_target_percent'],
-                    '止损%': sol['stop_loss_percent'],
-                    'K1涨跌幅%': sol['min_k1_range_percent'],
-                    '总交易数': sol['total_trades'],
-                    '盈利数': sol['wins'],
-                    '亏损数': sol['losses'],
-                    '胜率%': f"{sol['win_rate']:.2f}"
-                })
-            
-            for sol in good_solutions:
-                writer.writerow({
-                    '类型': '次优解',
-                    '杠杆': sol['leverage'],
-                    '止盈%': sol['profit_target_percent'],
-                    '止损%': sol['stop_loss_percent'],
-                    'K1涨跌幅%': sol['min_k1_range_percent'],
-                    '总交易数': sol['total_trades'],
-                    '盈利数': sol['wins'],
-                    '亏损数': sol['losses'],
-                    '胜率%': f"{sol['win_rate']:.2f}"
-                })
+            csvfile.write(buffer.getvalue())
         
         print(f"\n✓ 结果已导出到: {filename}")
         return filename
@@ -311,31 +483,48 @@ def export_results(perfect_solutions, good_solutions):
         return None
 
 
+def solution_to_dict(sol) -> Dict:
+    """把结果数组的一行转换成字典(只用于打印)"""
+    return dict(zip(sol.dtype.names, sol.tolist()))
+
+
+def sort_solutions(solutions: np.ndarray) -> np.ndarray:
+    """按胜率降序、亏损升序排序(稳定排序，两者都相同时保持遍历顺序)"""
+    return solutions[np.lexsort((solutions['losses'], -solutions['win_rate']))]
+
+
+def format_solution_rows(solutions: np.ndarray) -> str:
+    """把一组解格式化成表格行(拼成一个字符串，一次打印)"""
+    return "\n".join(
+        f"{sol['leverage']:<6} {sol['profit_target_percent']:<6} {sol['stop_loss_percent']:<6} "
+        f"{sol['min_k1_range_percent']:<6.2f} {sol['total_trades']:<8} {sol['wins']:<6} "
+        f"{sol['losses']:<6} {sol['win_rate']:<8.2f}"
+        for sol in map(solution_to_dict, solutions)
+    )
+
+
 def print_summary(perfect_solutions, good_solutions):
     """打印摘要"""
     print("\n" + "="*80)
     print("优化结果摘要")
     print("="*80)
     
-    if perfect_solutions:
+    if len(perfect_solutions):
         print(f"\n✓ 找到 {len(perfect_solutions)} 个目标解（亏损<10 或 胜率≥95%）:")
         print("-"*80)
         print(f"{'杠杆':<6} {'止盈%':<6} {'止损%':<6} {'K1%':<6} {'交易数':<8} {'盈利':<6} {'亏损':<6} {'胜率%':<8}")
         print("-"*80)
         
         # 按胜率降序，然后按亏损升序
-        sorted_perfect = sorted(perfect_solutions, key=lambda x: (-x['win_rate'], x['losses']))
+        sorted_perfect = sort_solutions(perfect_solutions)
         
-        for i, sol in enumerate(sorted_perfect[:20], 1):  # 显示前20个
-            print(f"{sol['leverage']:<6} {sol['profit_target_percent']:<6} {sol['stop_loss_percent']:<6} "
-                  f"{sol['min_k1_range_percent']:<6.2f} {sol['total_trades']:<8} {sol['wins']:<6} "
-                  f"{sol['losses']:<6} {sol['win_rate']:<8.2f}")
+        print(format_solution_rows(sorted_perfect[:20]))  # 显示前20个
         
         if len(sorted_perfect) > 20:
             print(f"... 还有 {len(sorted_perfect) - 20} 个目标解（已导出到CSV）")
         
         print("\n推荐配置（最优目标解）:")
-        best = sorted_perfect[0]
+        best = solution_to_dict(sorted_perfect[0])
         print(f"  杠杆倍数: {best['leverage']}")
         print(f"  止盈百分比: {best['profit_target_percent']}% (合约)")
         print(f"  止损百分比: {best['stop_loss_percent']}% (合约)")
@@ -345,25 +534,22 @@ def print_summary(perfect_solutions, good_solutions):
     else:
         print("\n✗ 未找到目标解（亏损<10 或 胜率≥95%）")
         
-        if good_solutions:
+        if len(good_solutions):
             print(f"\n○ 找到 {len(good_solutions)} 个次优解（亏损<15 或 胜率≥90%）:")
             print("-"*80)
             print(f"{'杠杆':<6} {'止盈%':<6} {'止损%':<6} {'K1%':<6} {'交易数':<8} {'盈利':<6} {'亏损':<6} {'胜率%':<8}")
             print("-"*80)
             
             # 按胜率降序，然后按亏损升序
-            sorted_good = sorted(good_solutions, key=lambda x: (-x['win_rate'], x['losses']))
+            sorted_good = sort_solutions(good_solutions)
             
-            for i, sol in enumerate(sorted_good[:20], 1):
-                print(f"{sol['leverage']:<6} {sol['profit_target_percent']:<6} {sol['stop_loss_percent']:<6} "
-                      f"{sol['min_k1_range_percent']:<6.2f} {sol['total_trades']:<8} {sol['wins']:<6} "
-                      f"{sol['losses']:<6} {sol['win_rate']:<8.2f}")
+            print(format_solution_rows(sorted_good[:20]))
             
             if len(sorted_good) > 20:
                 print(f"... 还有 {len(sorted_good) - 20} 个次优解（已导出到CSV）")
             
             print("\n推荐配置（最优次优解）:")
-            best = sorted_good[0]
+            best = solution_to_dict(sorted_good[0])
             print(f"  杠杆倍数: {best['leverage']}")
             print(f"  止盈百分比: {best['profit_target_percent']}% (合约)")
             print(f"  止损百分比: {best['stop_loss_percent']}% (合约)")
@@ -391,7 +577,7 @@ def main():
     
     # 加载K线数据
     klines = load_klines()
-    if not klines:
+    if klines is None:
         return
     
     # 参数优化
@@ -401,7 +587,7 @@ def main():
     print_summary(perfect_solutions, good_solutions)
     
     # 导出结果
-    if perfect_solutions or good_solutions:
+    if len(perfect_solutions) or len(good_solutions):
         export_results(perfect_solutions, good_solutions)
     
     print("\n分析完成！")
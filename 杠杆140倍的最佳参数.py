@@ -27,7 +27,7 @@ class BinanceAPI:
         返回:
             K线数据列表
         """
-        all_klines = []
+        batches = []  # 每批数据按获取顺序(从新到旧)保存，循环结束后一次性拼接
         remaining = limit
         end_time = None
         
@@ -40,15 +40,15 @@ class BinanceAPI:
                 url += f"&endTime={end_time}"
             
             try:
-                print(f"  正在获取K线数据... (已获取 {len(all_klines)}/{limit})", end='\r')
+                print(f"  正在获取K线数据... (已获取 {limit - remaining}/{limit})", end='\r')
                 with urllib.request.urlopen(url, timeout=10) as resp:
                     data = json.loads(resp.read().decode('utf-8'))
                     
                     if not data:
                         break
                     
-                    # 添加到结果中（倒序添加以保持时间顺序）
-                    all_klines = data + all_klines
+                    # 添加到结果中（最后倒序拼接以保持时间顺序）
+                    batches.append(data)
                     
                     # 更新end_time为最早K线的时间戳
                     end_time = data[0][0] - 1
@@ -66,6 +66,7 @@ class BinanceAPI:
                 print(f"\n获取K线数据失败: {e}")
                 break
         
+        all_klines = [kline for batch in reversed(batches) for kline in batch]
         print(f"  成功获取 {len(all_klines)} 根K线数据" + " " * 20)
         return all_klines
 
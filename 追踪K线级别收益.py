@@ -3,16 +3,20 @@
 找出10根K线后未止盈交易的最佳平仓时机
 """
 
-import json
 import os
 from datetime import datetime
 from typing import List, Dict
 import statistics
 
+from three_kline_strategy import read_json_file
+
 
 class KLine:
     """K线数据类"""
     
+    # 固定属性，省去每个实例的__dict__
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume', 'body_high', 'body_low')
+    
     def __init__(self, kline_data: List):
         self.timestamp = int(kline_data[0])
         self.open = float(kline_data[1])
@@ -51,122 +55,127 @@ class ThreeKlineStrategy:
         
         return (False, None)
     
-    def analyze_signals_detailed(self, klines: List[KLine], 
-                                 profit_target: float = 0.008,
-                                 min_k1_range: float = 0.002,
-                                 max_k1_range: float = 0.0051,
-                                 leverage: int = 50) -> List[Dict]:
-        """分析信号，记录每根K线的收益情况"""
+    def find_entries(self, klines: List[KLine],
+                     min_k1_range: float = 0.002,
+                     max_k1_range: float = 0.0051) -> List[Dict]:
+        """
+        找出所有入场信号
         
-        signals = []
+        出场不会阻止后续入场(每个信号之后都从入场K线的下一根继续找)，
+        所以入场可以先全部找出，再逐个追踪收益
+        """
+        entries = []
         i = 0
-        in_position = False
+        limit = len(klines) - 2
         
-        while i < len(klines) - 2:
-            if in_position:
-                i += 1
-                continue
-
+        while i < limit:
             k1 = klines[i]
             k2 = klines[i + 1]
-            signal = None
-            entry_index = None
 
-            if i < len(klines) - 2 and self.is_contained(k1, k2):
+            if self.is_contained(k1, k2):
                 k3 = klines[i + 2]
                 is_valid, direction = self.check_rule1(k1, k3, min_k1_range, max_k1_range)
                 if is_valid:
-                    signal = {
+                    entries.append({
                         'type': 'rule2',
                         'direction': direction,
                         'k1': k1,
                         'entry_price': k3.close,
                         'entry_time': k3.timestamp,
                         'entry_index': i + 2
-                    }
-                    entry_index = i + 3
-                    in_position = True
+                    })
                     i += 2
             else:
                 is_valid, direction = self.check_rule1(k1, k2, min_k1_range, max_k1_range)
                 if is_valid:
-                    signal = {
+                    entries.append({
                         'type': 'rule1',
                         'direction': direction,
                         'k1': k1,
                         'entry_price': k2.close,
                         'entry_time': k2.timestamp,
                         'entry_index': i + 1
-                    }
-                    entry_index = i + 2
-                    in_position = True
+                    })
                     i += 1
 
-            if signal and entry_index:
-                entry_price = signal['entry_price']
-                direction = signal['direction']
-                k1 = signal['k1']
+            i += 1
+
+        return entries
+    
+    def track_returns(self, entries: List[Dict], klines: List[KLine],
+                      profit_target: float = 0.008,
+                      leverage: int = 50) -> List[Dict]:
+        """逐个入场信号记录之后每根K线的收益情况(只遍历入场后的最多50根K线)"""
+        liquidation_threshold = -1.0 / leverage
+        
+        for signal in entries:
+            entry_price = signal['entry_price']
+            direction = signal['direction']
+            entry_index = signal['entry_index'] + 1
+            
+            # 记录每根K线的收益情况
+            bar_returns = []
+            max_return_ever = -999
+            max_return_bar = 0
+            reached_40 = False
+            reached_40_bar = 0
+            
+            # 分析最多50根K线
+            for j in range(entry_index, min(entry_index + 50, len(klines))):
+                current_kline = klines[j]
+                holding_bars = j - entry_index + 1
                 
-                # 记录每根K线的收益情况
-                bar_returns = []
-                max_return_ever = -999
-                max_return_bar = 0
-                reached_40 = False
-                reached_40_bar = 0
+                if direction == 'long':
+                    high_return = (current_kline.high - entry_price) / entry_price
+                    low_return = (current_kline.low - entry_price) / entry_price
+                    close_return = (current_kline.close - entry_price) / entry_price
+                else:
+                    high_return = (entry_price - current_kline.low) / entry_price
+                    low_return = (entry_price - current_kline.high) / entry_price
+                    close_return = (entry_price - current_kline.close) / entry_price
                 
-                # 分析最多50根K线
-                for j in range(entry_index, min(entry_index + 50, len(klines))):
-                    current_kline = klines[j]
-                    holding_bars = j - entry_index + 1
-                    
-                    if direction == 'long':
-                        high_return = (current_kline.high - entry_price) / entry_price
-                        low_return = (current_kline.low - entry_price) / entry_price
-                        close_return = (current_kline.close - entry_price) / entry_price
-                    else:
-                        high_return = (entry_price - current_kline.low) / entry_price
-                        low_return = (entry_price - current_kline.high) / entry_price
-                        close_return = (entry_price - current_kline.close) / entry_price
-                    
-                    # 记录本根K线的表现
-                    bar_info = {
-                        'bar': holding_bars,
-                        'high_return': high_return * leverage * 100,  # 转换为合约收益%
-                        'low_return': low_return * leverage * 100,
-                        'close_return': close_return * leverage * 100,
-                        'timestamp': current_kline.timestamp
-                    }
-                    bar_returns.append(bar_info)
-                    
-                    # 更新最高收益
-                    if high_return * leverage * 100 > max_return_ever:
-                        max_return_ever = high_return * leverage * 100
-                        max_return_bar = holding_bars
-                    
-                    # 检查是否达到40%止盈
-                    if not reached_40 and high_return >= profit_target:
-                        reached_40 = True
-                        reached_40_bar = holding_bars
-                    
-                    # 检查止损
-                    liquidation_threshold = -1.0 / leverage
-                    if low_return <= liquidation_threshold:
-                        signal['exit_type'] = 'stop_loss'
-                        signal['exit_bar'] = holding_bars
-                        break
+                # 记录本根K线的表现
+                bar_info = {
+                    'bar': holding_bars,
+                    'high_return': high_return * leverage * 100,  # 转换为合约收益%
+                    'low_return': low_return * leverage * 100,
+                    'close_return': close_return * leverage * 100,
+                    'timestamp': current_kline.timestamp
+                }
+                bar_returns.append(bar_info)
                 
-                signal['bar_returns'] = bar_returns
-                signal['max_return'] = max_return_ever
-                signal['max_return_bar'] = max_return_bar
-                signal['reached_40'] = reached_40
-                signal['reached_40_bar'] = reached_40_bar if reached_40 else None
+                # 更新最高收益
+                if high_return * leverage * 100 > max_return_ever:
+                    max_return_ever = high_return * leverage * 100
+                    max_return_bar = holding_bars
                 
-                signals.append(signal)
-                in_position = False
-
-            i += 1
-
-        return signals
+                # 检查是否达到40%止盈
+                if not reached_40 and high_return >= profit_target:
+                    reached_40 = True
+                    reached_40_bar = holding_bars
+                
+                # 检查止损
+                if low_return <= liquidation_threshold:
+                    signal['exit_type'] = 'stop_loss'
+                    signal['exit_bar'] = holding_bars
+                    break
+            
+            signal['bar_returns'] = bar_returns
+            signal['max_return'] = max_return_ever
+            signal['max_return_bar'] = max_return_bar
+            signal['reached_40'] = reached_40
+            signal['reached_40_bar'] = reached_40_bar if reached_40 else None
+        
+        return entries
+    
+    def analyze_signals_detailed(self, klines: List[KLine], 
+                                 profit_target: float = 0.008,
+                                 min_k1_range: float = 0.002,
+                                 max_k1_range: float = 0.0051,
+                                 leverage: int = 50) -> List[Dict]:
+        """分析信号，记录每根K线的收益情况"""
+        entries = self.find_entries(klines, min_k1_range, max_k1_range)
+        return self.track_returns(entries, klines, profit_target, leverage)
 
 
 def main():
@@ -183,9 +192,7 @@ def main():
         return
     
     print(f"\n正在加载K线数据...")
-    with open(cache_file, 'r', encoding='utf-8') as f:
-        raw_klines = json.load(f)
-    klines = [KLine(k) for k in raw_klines]
+    klines = [KLine(k) for k in read_json_file(cache_file)]
     print(f"✓ 已加载 {len(klines)} 根K线数据")
     
     # 创建策略实例
@@ -209,9 +216,18 @@ def main():
     
     print(f"✓ 找到 {len(signals)} 个交易信号")
     
-    # 分析达到40%止盈的交易
-    reached_40 = [s for s in signals if s['reached_40']]
-    not_reached_40 = [s for s in signals if not s['reached_40']]
+    # 一次遍历完成分类: 达到/未达到40%止盈，以及10根K线后仍未止盈的交易
+    reached_40 = []
+    not_reached_40 = []
+    delayed_signals = []
+    for s in signals:
+        if s['reached_40']:
+            reached_40.append(s)
+            if s['reached_40_bar'] > 10:
+                delayed_signals.append(s)
+        else:
+            not_reached_40.append(s)
+            delayed_signals.append(s)
     
     print(f"\n{'='*80}")
     print("交易分类统计")
@@ -228,11 +244,17 @@ def main():
         print(f"  最快: {min(bars_to_40)}根K线")
         print(f"  最慢: {max(bars_to_40)}根K线")
         
-        # 统计分布
-        within_5 = len([b for b in bars_to_40 if b <= 5])
-        within_10 = len([b for b in bars_to_40 if b <= 10])
-        within_15 = len([b for b in bars_to_40 if b <= 15])
-        within_20 = len([b for b in bars_to_40 if b <= 20])
+        # 统计分布(一次遍历累计各区间数量)
+        within_5 = within_10 = within_15 = within_20 = 0
+        for b in bars_to_40:
+            if b <= 20:
+                within_20 += 1
+                if b <= 15:
+                    within_15 += 1
+                    if b <= 10:
+                        within_10 += 1
+                        if b <= 5:
+                            within_5 += 1
         
         print(f"\n达到40%止盈的时间分布:")
         print(f"  5根K线内: {within_5} ({within_5/len(reached_40)*100:.1f}%)")
@@ -245,8 +267,6 @@ def main():
     print("10根K线后未达到40%的交易分析")
     print(f"{'='*80}")
     
-    delayed_signals = [s for s in signals if not s['reached_40'] or s['reached_40_bar'] > 10]
-    
     print(f"\n10根K线后仍未止盈的交易: {len(delayed_signals)}")
     
     if delayed_signals:
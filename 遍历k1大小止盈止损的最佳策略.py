@@ -2,11 +2,104 @@
 参数优化脚本 - 寻找最优的止盈、止损和K1涨跌幅参数
 """
 
-import json
-import os
 from datetime import datetime
-from three_kline_strategy import KLine, ThreeKlineStrategy
-import itertools
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from three_kline_strategy import find_entries_arrays, resolve_exits_arrays, summarize_exits
+from optimize_core import PERCENT, result_to_dict, load_arrays, worker_arrays, grid_search, sort_by_winrate, write_csv
+import numpy as np
+
+
+# 每个参数组合的结果(结构化数组的一行)
+RESULT_DTYPE = np.dtype([
+    ('profit_target_percent', 'i4'),
+    ('stop_loss_percent', 'i4'),
+    ('min_k1_range_percent', 'f8'),
+    ('total_trades', 'i4'),
+    ('win_rate', 'f8'),
+    ('total_pnl', 'f8'),
+    ('final_capital', 'f8'),
+    ('profit_factor', 'f8'),
+    ('avg_holding_bars', 'f8'),
+    ('return_rate', 'f8'),
+])
+
+
+@lru_cache(maxsize=None)
+def valid_profit_stops(profit_target_range, stop_loss_range):
+    """
+    预先筛选有效的止盈止损组合(止盈比止损大至少10个百分点)
+    
+    参数:
+        profit_target_range: 止盈%元组
+        stop_loss_range: 止损%元组
+    
+    返回:
+        [(止盈下标, 止盈%, [有效止损下标]), ...]，没有有效止损的止盈不列出
+    """
+    pairs = []
+    for pi, profit_pct in enumerate(profit_target_range):
+        stops = [si for si, stop_pct in enumerate(stop_loss_range) if profit_pct >= stop_pct + 10]
+        if stops:
+            pairs.append((pi, profit_pct, stops))
+    return pairs
+
+
+def evaluate_k1(params):
+    """
+    回测同一K1涨跌幅下的所有止盈止损组合(在工作进程中运行)
+    
+    入场信号只取决于K1涨跌幅，先计算一次，再对每个止盈套用出场规则；
+    出场模拟不使用止损参数，同一止盈下不同止损的统计结果相同，只需计算一次
+    
+    参数:
+        params: (K1涨跌幅%, 止盈%列表, 止损%列表, 有效止盈止损组合, 杠杆, 每次投入, 止盈超时, 止损超时, 合约%->现货价格系数)
+    
+    返回:
+        (结果数组, 有效标记)，均按(止盈, 止损)顺序排列，有效标记表示交易次数>=100
+    """
+    k1_pct, profit_target_range, stop_loss_range, profit_stops, leverage, initial_capital, max_holding_bars_tp, max_holding_bars_sl, price_scale = params
+    
+    arrays = worker_arrays()
+    entries = find_entries_arrays(arrays, k1_pct * PERCENT)
+    
+    block = np.zeros((len(profit_target_range), len(stop_loss_range)), dtype=RESULT_DTYPE)
+    valid = np.zeros(block.shape, dtype=bool)
+    block['profit_target_percent'] = np.asarray(profit_target_range)[:, None]
+    block['stop_loss_percent'] = np.asarray(stop_loss_range)[None, :]
+    block['min_k1_range_percent'] = k1_pct
+    
+    # 交易次数不会超过入场信号数: 不足100个时本K1下所有组合都达不到交易次数要求，无需回测
+    if len(entries['entry_index']) < 100:
+        return block, valid
+    
+    for pi, profit_pct, stops in profit_stops:
+        # 运行策略（前20根K线不设止损）
+        exits = resolve_exits_arrays(
+            arrays, entries,
+            profit_target=profit_pct * price_scale,
+            stop_loss_delay_bars=20,
+            leverage=leverage
+        )
+        
+        # 计算统计
+        stats = summarize_exits(exits, leverage=leverage, initial_capital=initial_capital)
+        
+        # 只记录交易次数>=100的结果
+        if stats['total_trades'] < 100:
+            continue
+        
+        row = block[pi]
+        row['total_trades'][stops] = stats['total_trades']
+        row['win_rate'][stops] = stats['win_rate']
+        row['total_pnl'][stops] = stats['total_pnl']
+        row['final_capital'][stops] = stats['final_capital']
+        row['profit_factor'][stops] = stats['profit_factor']
+        row['avg_holding_bars'][stops] = stats['avg_holding_bars']
+        row['return_rate'][stops] = stats['total_pnl'] / (stats['total_trades'] * initial_capital) * 100
+        valid[pi, stops] = True
+    
+    return block, valid
 
 
 def write_log_header(f, leverage, initial_capital, max_holding_bars_tp, max_holding_bars_sl, 
@@ -80,177 +173,14 @@ def write_log_footer(f):
     f.write("="*80 + "\n")
 
 
-def optimize_parameters():
-    """遍历参数组合，寻找最优参数"""
-    
-    # ====== 固定参数 ======
-    leverage = 50  # 固定杠杆倍数
-    initial_capital = 1.0  # 每次投入
-    max_holding_bars_tp = 41  # 止盈超时阈值
-    max_holding_bars_sl = 102  # 止损超时阈值
-    
-    # ====== 参数搜索范围 ======
-    profit_target_range = range(20, 61, 1)  # 止盈: 20%, 21%, 22%, ..., 60%
-    stop_loss_range = range(20, 61, 1)      # 止损: 20%, 21%, 22%, ..., 60%
-    min_k1_range_range = [round(i * 0.01, 2) for i in range(21, 201)]  # K1涨跌幅: 0.21%, 0.22%, 0.23%, ..., 2.00%
-    
-    print("="*80)
-    print("参数优化系统 - 寻找最优止盈止损参数")
-    print("="*80)
-    print(f"固定参数:")
-    print(f"  杠杆倍数: {leverage}x")
-    print(f"  每次投入: {initial_capital} USDT")
-    print(f"  超时平仓: 止盈>{max_holding_bars_tp}根K线, 止损>{max_holding_bars_sl}根K线")
-    print(f"  止损延迟: 前20根K线不设止损，之后在止损点等待回撤")
-    print(f"\n搜索范围:")
-    print(f"  止盈百分比: {min(profit_target_range)}% ~ {max(profit_target_range)}%")
-    print(f"  止损百分比: {min(stop_loss_range)}% ~ {max(stop_loss_range)}%")
-    print(f"  K1涨跌幅要求: {min(min_k1_range_range)}% ~ {max(min_k1_range_range)}%")
-    
-    # 计算总组合数
-    total_combinations = len(list(profit_target_range)) * len(list(stop_loss_range)) * len(min_k1_range_range)
-    print(f"\n总共需要测试: {total_combinations} 种参数组合")
-    print("="*80)
-    
-    # 加载K线数据
-    cache_file = "btcusdt_15m_klines.json"
-    if not os.path.exists(cache_file):
-        print("错误: 找不到K线数据缓存文件!")
-        print("请先运行 three_kline_strategy.py 生成数据缓存")
-        return
-    
-    print(f"\n正在读取K线数据...")
-    with open(cache_file, 'r', encoding='utf-8') as f:
-        raw_klines = json.load(f)
-    
-    klines = [KLine(k) for k in raw_klines]
-    print(f"✓ 成功读取 {len(klines)} 根K线数据")
+def export_log(timestamp, high_winrate_results, valid_results, total_combinations,
+               leverage, initial_capital, max_holding_bars_tp, max_holding_bars_sl):
+    """
+    导出所有胜率>=60%的策略到LOG文件（如果数量多则分文件）
     
-    # 存储所有结果
-    results = []
-    best_result = None
-    best_profit = float('-inf')
-    
-    # 遍历所有参数组合
-    print(f"\n开始参数优化...")
-    print("-"*80)
-    
-    count = 0
-    for profit_pct, stop_pct, k1_pct in itertools.product(profit_target_range, stop_loss_range, min_k1_range_range):
-        count += 1
-        
-        # 确保止盈比止损大至少10个百分点
-        if profit_pct < stop_pct + 10:
-            continue
-        
-        # 计算现货价格变动百分比
-        price_profit_target = profit_pct / leverage / 100
-        price_stop_loss = stop_pct / leverage / 100
-        min_k1_range = k1_pct / 100
-        
-        # 运行策略（允许第一次触及止损不平仓）
-        strategy = ThreeKlineStrategy()
-        signals = strategy.find_signals(
-            klines,
-            profit_target=price_profit_target,
-            stop_loss=price_stop_loss,
-            min_k1_range=min_k1_range,
-            max_holding_bars_tp=max_holding_bars_tp,
-            max_holding_bars_sl=max_holding_bars_sl,
-            allow_stop_loss_retry=True,  # 允许止损重试
-            stop_loss_delay_bars=20  # 前20根K线不设止损
-        )
-        
-        # 计算统计
-        stats = strategy.calculate_win_rate(signals, leverage=leverage, initial_capital=initial_capital)
-        
-        # 只记录交易次数>=100的结果
-        if stats['total_trades'] >= 100:
-            result = {
-                'profit_target_percent': profit_pct,
-                'stop_loss_percent': stop_pct,
-                'min_k1_range_percent': k1_pct,
-                'total_trades': stats['total_trades'],
-                'win_rate': stats['win_rate'],
-                'total_pnl': stats['total_pnl'],
-                'final_capital': stats['final_capital'],
-                'profit_factor': stats['profit_factor'],
-                'avg_holding_bars': stats['avg_holding_bars'],
-                'return_rate': (stats['total_pnl'] / (stats['total_trades'] * initial_capital) * 100) if stats['total_trades'] > 0 else 0
-            }
-            results.append(result)
-            
-            # 更新最佳结果（以胜率为标准）
-            if stats['win_rate'] > (best_result['win_rate'] if best_result else 0):
-                best_result = result
-        
-        # 显示进度
-        if count % 50 == 0 or count == total_combinations:
-            best_winrate = best_result['win_rate'] if best_result else 0
-            print(f"进度: {count}/{total_combinations} ({count/total_combinations*100:.1f}%) - 当前最高胜率: {best_winrate:.2f}%", end='\r')
-    
-    print("\n" + "-"*80)
-    print(f"✓ 优化完成! 共测试了 {len(results)} 个有效参数组合")
-    
-    # 按胜率排序
-    results.sort(key=lambda x: x['win_rate'], reverse=True)
-    
-    # 筛选胜率超过60%的策略
-    high_winrate_results = [r for r in results if r['win_rate'] >= 60.0]
-    print(f"✓ 找到 {len(high_winrate_results)} 个胜率>=60%的策略 (交易次数>=100)")
-    
-    # 显示TOP 10结果
-    print("\n" + "="*80)
-    print("TOP 10 最高胜率参数组合 (允许止损重试, 交易次数>=100)")
-    print("="*80)
-    print("策略说明: 第一次触及止损点时不平仓，第二次到达止损点才卖出")
-    print("="*80)
-    
-    for i, result in enumerate(results[:10], 1):
-        print(f"\n第 {i} 名:")
-        print(f"  止盈: {result['profit_target_percent']}% | 止损: {result['stop_loss_percent']}% | K1涨跌幅: {result['min_k1_range_percent']}%")
-        print(f"  总交易数: {result['total_trades']}")
-        print(f"  胜率: {result['win_rate']:.2f}% ★")
-        print(f"  总盈亏: {result['total_pnl']:+.4f} USDT")
-        print(f"  收益率: {result['return_rate']:+.2f}%")
-        print(f"  盈亏比: {result['profit_factor']:.2f}")
-        print(f"  平均持仓: {result['avg_holding_bars']:.1f}根K线")
-    
-    # 导出完整结果到CSV和LOG
-    print("\n" + "="*80)
-    print("导出优化结果")
-    print("="*80)
-    
-    import csv
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"optimization_results_{timestamp}.csv"
-    logfilename = f"optimization_winrate60plus_{timestamp}.log"
-    
-    with open(filename, 'w', newline='', encoding='utf-8-sig') as f:
-        fieldnames = [
-            '排名', '止盈%', '止损%', 'K1涨跌幅%', '总交易数', '胜率%', 
-            '总盈亏USDT', '收益率%', '盈亏比', '平均持仓K线数'
-        ]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        for i, result in enumerate(results, 1):
-            writer.writerow({
-                '排名': i,
-                '止盈%': result['profit_target_percent'],
-                '止损%': result['stop_loss_percent'],
-                'K1涨跌幅%': result['min_k1_range_percent'],
-                '总交易数': result['total_trades'],
-                '胜率%': f"{result['win_rate']:.2f}",
-                '总盈亏USDT': f"{result['total_pnl']:.4f}",
-                '收益率%': f"{result['return_rate']:.2f}",
-                '盈亏比': f"{result['profit_factor']:.2f}",
-                '平均持仓K线数': f"{result['avg_holding_bars']:.1f}"
-            })
-    
-    print(f"✓ 完整结果已导出到: {filename}")
-    
-    # 导出所有胜率>=60%的策略到LOG文件（如果数量多则分文件）
+    在后台线程中运行，不直接打印，返回需要显示的提示信息
+    """
+    messages = []
     max_strategies_per_file = 100  # 每个文件最多存储的策略数
     
     try:
@@ -265,19 +195,19 @@ def optimize_parameters():
                 f.write(f"固定参数: 杠杆={leverage}x, 每次投入={initial_capital} USDT\n")
                 f.write(f"超时平仓: 止盈>{max_holding_bars_tp}根K线, 止损>{max_holding_bars_sl}根K线\n")
                 f.write(f"测试组合数: {total_combinations} 种\n")
-                f.write(f"有效组合数: {len(results)} 种\n")
+                f.write(f"有效组合数: {valid_results} 种\n")
                 f.write(f"高胜率策略数: {len(high_winrate_results)} 种 (胜率>=60%)\n")
                 f.write("="*80 + "\n\n")
                 f.write("未找到胜率>=60%的策略组合。\n")
                 f.write("建议调整参数搜索范围或降低胜率要求。\n")
-            print(f"✓ 结果已导出到: {logfilename_single} (未找到高胜率策略)")
+            messages.append(f"✓ 结果已导出到: {logfilename_single} (未找到高胜率策略)")
         
         elif len(high_winrate_results) <= max_strategies_per_file:
             # 如果策略数量不多，存储在单个文件中
             logfilename_single = f"optimization_winrate60plus_{timestamp}.log"
             with open(logfilename_single, 'w', encoding='utf-8') as f:
                 write_log_header(f, leverage, initial_capital, max_holding_bars_tp, max_holding_bars_sl, 
-                               total_combinations, len(results), len(high_winrate_results))
+                               total_combinations, valid_results, len(high_winrate_results))
                 
                 for i, result in enumerate(high_winrate_results, 1):
                     write_strategy_detail(f, i, result, leverage, initial_capital, 
@@ -285,7 +215,7 @@ def optimize_parameters():
                 
                 write_log_footer(f)
             
-            print(f"✓ 胜率>=60%的策略已导出到: {logfilename_single} (共{len(high_winrate_results)}个)")
+            messages.append(f"✓ 胜率>=60%的策略已导出到: {logfilename_single} (共{len(high_winrate_results)}个)")
         
         else:
             # 如果策略数量很多，分成多个文件
@@ -299,7 +229,7 @@ def optimize_parameters():
                 
                 with open(logfilename_part, 'w', encoding='utf-8') as f:
                     write_log_header(f, leverage, initial_capital, max_holding_bars_tp, max_holding_bars_sl, 
-                                   total_combinations, len(results), len(high_winrate_results),
+                                   total_combinations, valid_results, len(high_winrate_results),
                                    part_info=f"第 {file_idx+1}/{num_files} 部分 (策略 {start_idx+1}-{end_idx})")
                     
                     for i, result in enumerate(high_winrate_results[start_idx:end_idx], start_idx + 1):
@@ -308,12 +238,134 @@ def optimize_parameters():
                     
                     write_log_footer(f)
                 
-                print(f"✓ 第{file_idx+1}/{num_files}部分已导出到: {logfilename_part}")
+                messages.append(f"✓ 第{file_idx+1}/{num_files}部分已导出到: {logfilename_part}")
             
-            print(f"✓ 所有胜率>=60%的策略已分{num_files}个文件导出 (共{len(high_winrate_results)}个)")
+            messages.append(f"✓ 所有胜率>=60%的策略已分{num_files}个文件导出 (共{len(high_winrate_results)}个)")
     
     except Exception as e:
-        print(f"✗ 导出LOG失败: {e}")
+        messages.append(f"✗ 导出LOG失败: {e}")
+    
+    return messages
+
+
+def optimize_parameters():
+    """遍历参数组合，寻找最优参数"""
+    
+    # ====== 固定参数 ======
+    leverage = 50  # 固定杠杆倍数
+    initial_capital = 1.0  # 每次投入
+    max_holding_bars_tp = 41  # 止盈超时阈值
+    max_holding_bars_sl = 102  # 止损超时阈值
+    
+    # ====== 参数搜索范围 ======
+    profit_target_range = range(20, 61, 1)  # 止盈: 20%, 21%, 22%, ..., 60%
+    stop_loss_range = range(20, 61, 1)      # 止损: 20%, 21%, 22%, ..., 60%
+    min_k1_range_range = (np.arange(21, 201) * 0.01).round(2)  # K1涨跌幅: 0.21%, 0.22%, 0.23%, ..., 2.00%
+    
+    # ====== 搜索方式 ======
+    # 为True时先按粗网格(每个参数每隔coarse_step取一个值)遍历，再在胜率最高的refine_top_n个组合附近逐个细化，
+    # 适合加大搜索范围或K线数量时使用；为False时遍历全部组合
+    coarse_to_fine = False
+    coarse_step = 5
+    refine_top_n = 20
+    
+    print("="*80)
+    print("参数优化系统 - 寻找最优止盈止损参数")
+    print("="*80)
+    print(f"固定参数:")
+    print(f"  杠杆倍数: {leverage}x")
+    print(f"  每次投入: {initial_capital} USDT")
+    print(f"  超时平仓: 止盈>{max_holding_bars_tp}根K线, 止损>{max_holding_bars_sl}根K线")
+    print(f"  止损延迟: 前20根K线不设止损，之后在止损点等待回撤")
+    print(f"\n搜索范围:")
+    print(f"  止盈百分比: {min(profit_target_range)}% ~ {max(profit_target_range)}%")
+    print(f"  止损百分比: {min(stop_loss_range)}% ~ {max(stop_loss_range)}%")
+    print(f"  K1涨跌幅要求: {min_k1_range_range.min()}% ~ {min_k1_range_range.max()}%")
+    
+    # 计算总组合数
+    total_combinations = len(profit_target_range) * len(stop_loss_range) * len(min_k1_range_range)
+    print(f"\n总共需要测试: {total_combinations} 种参数组合")
+    print("="*80)
+    
+    # 加载K线数据
+    arrays = load_arrays("btcusdt_15m_klines.json")
+    if arrays is None:
+        return
+    
+    # 合约收益% -> 现货价格变动的系数，只算一次
+    price_scale = 1.0 / leverage / 100
+    
+    def make_task(profits, stops, k1_pct):
+        # 有效止盈止损组合与K1无关，同一批止盈/止损只筛选一次
+        profit_stops = valid_profit_stops(tuple(profits), tuple(stops))
+        return (k1_pct, profits, stops, profit_stops, leverage, initial_capital, max_holding_bars_tp, max_holding_bars_sl, price_scale)
+    
+    # 按(止盈, 止损, K1)的遍历顺序存放
+    all_results, valid_mask = grid_search(
+        arrays, (profit_target_range, stop_loss_range, min_k1_range_range), RESULT_DTYPE,
+        evaluate_k1, make_task,
+        coarse_to_fine=coarse_to_fine, coarse_steps=(coarse_step,) * 3, refine_top_n=refine_top_n
+    )
+    results = all_results[valid_mask]
+    
+    print("\n" + "-"*80)
+    print(f"✓ 优化完成! 共测试了 {len(results)} 个有效参数组合")
+    
+    # 按胜率排序
+    results = sort_by_winrate(results)
+    best_result = result_to_dict(results[0]) if len(results) and results[0]['win_rate'] > 0 else None
+    
+    # 筛选胜率超过60%的策略
+    high_winrate_results = [result_to_dict(r) for r in results[results['win_rate'] >= 60.0]]
+    print(f"✓ 找到 {len(high_winrate_results)} 个胜率>=60%的策略 (交易次数>=100)")
+    
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"optimization_results_{timestamp}.csv"
+    
+    # CSV和LOG在后台线程写入(两者写不同文件，只读取结果)，同时在终端显示TOP 10
+    with ThreadPoolExecutor(max_workers=2) as io_pool:
+        # 逐行生成，不在内存中构造全部行
+        csv_future = io_pool.submit(
+            write_csv,
+            filename,
+            ['排名', '止盈%', '止损%', 'K1涨跌幅%', '总交易数', '胜率%',
+             '总盈亏USDT', '收益率%', '盈亏比', '平均持仓K线数'],
+            ((i, profit_pct, stop_pct, k1_pct, total_trades, f"{win_rate:.2f}", f"{total_pnl:.4f}",
+              f"{return_rate:.2f}", f"{profit_factor:.2f}", f"{avg_holding_bars:.1f}")
+             for i, (profit_pct, stop_pct, k1_pct, total_trades, win_rate, total_pnl, _,
+                     profit_factor, avg_holding_bars, return_rate) in enumerate((r.tolist() for r in results), 1))
+        )
+        log_future = io_pool.submit(
+            export_log, timestamp, high_winrate_results, len(results), total_combinations,
+            leverage, initial_capital, max_holding_bars_tp, max_holding_bars_sl
+        )
+        
+        # 显示TOP 10结果
+        print("\n" + "="*80)
+        print("TOP 10 最高胜率参数组合 (允许止损重试, 交易次数>=100)")
+        print("="*80)
+        print("策略说明: 第一次触及止损点时不平仓，第二次到达止损点才卖出")
+        print("="*80)
+        
+        for i, result in enumerate(map(result_to_dict, results[:10]), 1):
+            print(f"\n第 {i} 名:")
+            print(f"  止盈: {result['profit_target_percent']}% | 止损: {result['stop_loss_percent']}% | K1涨跌幅: {result['min_k1_range_percent']}%")
+            print(f"  总交易数: {result['total_trades']}")
+            print(f"  胜率: {result['win_rate']:.2f}% ★")
+            print(f"  总盈亏: {result['total_pnl']:+.4f} USDT")
+            print(f"  收益率: {result['return_rate']:+.2f}%")
+            print(f"  盈亏比: {result['profit_factor']:.2f}")
+            print(f"  平均持仓: {result['avg_holding_bars']:.1f}根K线")
+        
+        # 等待CSV和LOG导出完成
+        print("\n" + "="*80)
+        print("导出优化结果")
+        print("="*80)
+        
+        csv_future.result()
+        print(f"✓ 完整结果已导出到: {filename}")
+        for message in log_future.result():
+            print(message)
     
     # 显示最佳参数建议（胜率最高的）
     if best_result:
@@ -27,7 +27,7 @@ class BinanceAPI:
     @staticmethod
     def get_klines(symbol: str = "BTCUSDT", interval: str = "15m", limit: int = 1000) -> List[List]:
         """获取K线数据（支持获取超过1000根）"""
-        all_klines = []
+        batches = []  # 每批数据按获取顺序(从新到旧)保存，循环结束后一次性拼接
         remaining = limit
         end_time = None
         
@@ -42,7 +42,7 @@ class BinanceAPI:
                     data = json.loads(resp.read().decode('utf-8'))
                     if not data:
                         break
-                    all_klines = data + all_klines
+                    batches.append(data)
                     end_time = data[0][0] - 1
                     remaining -= len(data)
                     if len(data) < batch_limit:
@@ -52,6 +52,7 @@ class BinanceAPI:
                 print(f"\n获取K线数据失败: {e}")
                 break
         
+        all_klines = [kline for batch in reversed(batches) for kline in batch]
         return all_klines
 
 
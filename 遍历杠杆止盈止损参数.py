@@ -39,7 +39,7 @@ class BinanceAPI:
         返回:
             K线数据列表
         """
-        all_klines = []
+        batches = []  # 每批数据按获取顺序(从新到旧)保存，循环结束后一次性拼接
         remaining = limit
         end_time = None
         
@@ -58,7 +58,7 @@ class BinanceAPI:
                     if not data:
                         break
                     
-                    all_klines = data + all_klines
+                    batches.append(data)
                     end_time = data[0][0] - 1
                     remaining -= len(data)
                     
@@ -71,6 +71,7 @@ class BinanceAPI:
                 print(f"\n获取K线数据失败: {e}")
                 break
         
+        all_klines = [kline for batch in reversed(batches) for kline in batch]
         return all_klines
 
 
@@ -3,11 +3,83 @@
 专注于优化 stop_loss_delay_bars 和 min_k1_range_percent
 """
 
-import json
-import os
 from datetime import datetime
-from three_kline_strategy import KLine, ThreeKlineStrategy
+from concurrent.futures import ThreadPoolExecutor
+from three_kline_strategy import find_entries_arrays, resolve_exits_arrays, summarize_exits
+from optimize_core import PERCENT, result_to_dict, load_arrays, worker_arrays, grid_search, sort_by_winrate, write_csv
 import itertools
+import numpy as np
+
+
+# 每个参数组合的结果(结构化数组的一行)
+RESULT_DTYPE = np.dtype([
+    ('leverage', 'i4'),
+    ('stop_loss_delay_bars', 'i4'),
+    ('min_k1_range_percent', 'f8'),
+    ('total_trades', 'i4'),
+    ('win_rate', 'f8'),
+    ('total_pnl', 'f8'),
+    ('final_capital', 'f8'),
+    ('profit_factor', 'f8'),
+    ('avg_holding_bars', 'f8'),
+    ('return_rate', 'f8'),
+])
+
+
+def evaluate_k1(params):
+    """
+    回测同一K1涨跌幅下的所有杠杆和止损延迟组合(在工作进程中运行)
+    
+    入场信号只取决于K1涨跌幅，先计算一次，再对每个杠杆/止损延迟套用出场规则
+    
+    参数:
+        params: (K1涨跌幅%, 杠杆列表, 止损延迟列表, {杠杆: 止盈(现货)}, 每次投入)
+    
+    返回:
+        (结果数组, 有效标记)，均按(杠杆, 止损延迟)顺序排列，有效标记表示交易次数>=100
+    """
+    k1_pct, leverage_range, stop_loss_delay_bars_range, price_targets, initial_capital = params
+    
+    arrays = worker_arrays()
+    entries = find_entries_arrays(arrays, k1_pct * PERCENT)
+    
+    block = np.zeros((len(leverage_range), len(stop_loss_delay_bars_range)), dtype=RESULT_DTYPE)
+    valid = np.zeros(block.shape, dtype=bool)
+    block['leverage'] = np.asarray(leverage_range)[:, None]
+    block['stop_loss_delay_bars'] = np.asarray(stop_loss_delay_bars_range)[None, :]
+    block['min_k1_range_percent'] = k1_pct
+    
+    # 交易次数不会超过入场信号数: 不足100个时本K1下所有组合都达不到交易次数要求，无需回测
+    if len(entries['entry_index']) < 100:
+        return block, valid
+    
+    for (li, leverage), (di, delay_bars) in itertools.product(enumerate(leverage_range), enumerate(stop_loss_delay_bars_range)):
+        # 运行策略
+        exits = resolve_exits_arrays(
+            arrays, entries,
+            profit_target=price_targets[leverage],
+            stop_loss_delay_bars=delay_bars,
+            leverage=leverage  # 传入杠杆倍数用于爆仓检测
+        )
+        
+        # 计算统计
+        stats = summarize_exits(exits, leverage=leverage, initial_capital=initial_capital)
+        
+        # 只记录交易次数>=100的结果
+        if stats['total_trades'] < 100:
+            continue
+        
+        row = block[li, di]
+        row['total_trades'] = stats['total_trades']
+        row['win_rate'] = stats['win_rate']
+        row['total_pnl'] = stats['total_pnl']
+        row['final_capital'] = stats['final_capital']
+        row['profit_factor'] = stats['profit_factor']
+        row['avg_holding_bars'] = stats['avg_holding_bars']
+        row['return_rate'] = stats['total_pnl'] / (stats['total_trades'] * initial_capital) * 100
+        valid[li, di] = True
+    
+    return block, valid
 
 
 def write_log_header(f, profit_target_percent, stop_loss_percent, initial_capital,
@@ -81,6 +153,20 @@ def write_log_footer(f):
     f.write("="*80 + "\n")
 
 
+def export_log(log_filename, high_winrate_results, valid_results, total_combinations,
+               profit_target_percent, stop_loss_percent, initial_capital):
+    """导出胜率>=60%的策略到LOG文件(在后台线程中运行)"""
+    with open(log_filename, 'w', encoding='utf-8') as f:
+        write_log_header(f, profit_target_percent, stop_loss_percent, initial_capital,
+                       total_combinations, valid_results, len(high_winrate_results))
+        
+        for i, result in enumerate(high_winrate_results, 1):
+            write_strategy_detail(f, i, result, profit_target_percent, 
+                                stop_loss_percent, initial_capital)
+        
+        write_log_footer(f)
+
+
 def optimize_parameters():
     """遍历参数组合，寻找最优参数"""
     
@@ -92,7 +178,14 @@ def optimize_parameters():
     # ====== 参数搜索范围 ======
     leverage_range = range(20, 51, 5)  # 杠杆倍数: 20, 25, 30, 35, 40, 45, 50
     stop_loss_delay_bars_range = range(0, 11, 1)  # 止损延迟: 0, 1, 2, ..., 10根K线
-    min_k1_range_range = [round(i * 0.01, 2) for i in range(10, 201)]  # K1涨跌幅: 0.10%, 0.11%, ..., 2.00%
+    min_k1_range_range = (np.arange(10, 201) * 0.01).round(2)  # K1涨跌幅: 0.10%, 0.11%, ..., 2.00%
+    
+    # ====== 搜索方式 ======
+    # 为True时先按粗网格(杠杆、止损延迟、K1各每隔coarse_steps个取一个值)遍历，再在胜率最高的refine_top_n个组合附近逐个细化，
+    # 适合加大搜索范围或K线数量时使用；为False时遍历全部组合
+    coarse_to_fine = False
+    coarse_steps = (1, 1, 5)
+    refine_top_n = 20
     
     print("="*80)
     print("参数全面优化系统 (含爆仓保护)")
@@ -104,160 +197,96 @@ def optimize_parameters():
     print(f"\n搜索范围:")
     print(f"  杠杆倍数: {min(leverage_range)} ~ {max(leverage_range)}x (步进5)")
     print(f"  止损延迟: {min(stop_loss_delay_bars_range)} ~ {max(stop_loss_delay_bars_range)}根K线 (步进1根)")
-    print(f"  K1涨跌幅要求: {min(min_k1_range_range)}% ~ {max(min_k1_range_range)}% (步进0.01%)")
+    print(f"  K1涨跌幅要求: {min_k1_range_range.min()}% ~ {min_k1_range_range.max()}% (步进0.01%)")
     
     # 计算总组合数
-    total_combinations = len(list(leverage_range)) * len(list(stop_loss_delay_bars_range)) * len(min_k1_range_range)
+    total_combinations = len(leverage_range) * len(stop_loss_delay_bars_range) * len(min_k1_range_range)
     print(f"\n总共需要测试: {total_combinations} 种参数组合")
     print("="*80)
     
     # 加载K线数据
-    cache_file = "btcusdt_15m_klines.json"
-    if not os.path.exists(cache_file):
-        print("错误: 找不到K线数据缓存文件!")
-        print("请先运行 three_kline_strategy.py 生成数据缓存")
+    arrays = load_arrays("btcusdt_15m_klines.json")
+    if arrays is None:
         return
     
-    print(f"\n正在读取K线数据...")
-    with open(cache_file, 'r', encoding='utf-8') as f:
-        raw_klines = json.load(f)
-    
-    klines = [KLine(k) for k in raw_klines]
-    print(f"✓ 成功读取 {len(klines)} 根K线数据")
+    # 每个杠杆对应的现货价格止盈只算一次(出场模拟不使用止损参数)
+    price_targets = {leverage: profit_target_percent / leverage / 100 for leverage in leverage_range}
     
-    # 存储所有结果
-    results = []
-    best_result = None
+    def make_task(leverages, delays, k1_pct):
+        return (k1_pct, leverages, delays, price_targets, initial_capital)
     
-    # 遍历所有参数组合
-    print(f"\n开始参数优化...")
-    print("-"*80)
-    
-    count = 0
-    for leverage, delay_bars, k1_pct in itertools.product(leverage_range, stop_loss_delay_bars_range, min_k1_range_range):
-        count += 1
-        
-        # 计算现货价格变动百分比
-        price_profit_target = profit_target_percent / leverage / 100
-        price_stop_loss = stop_loss_percent / leverage / 100
-        min_k1_range = k1_pct / 100
-        
-        # 运行策略
-        strategy = ThreeKlineStrategy()
-        signals = strategy.find_signals(
-            klines,
-            profit_target=price_profit_target,
-            stop_loss=price_stop_loss,
-            min_k1_range=min_k1_range,
-            stop_loss_delay_bars=delay_bars,
-            allow_stop_loss_retry=True,  # 允许止损重试
-            leverage=leverage  # 传入杠杆倍数用于爆仓检测
-        )
-        
-        # 计算统计
-        stats = strategy.calculate_win_rate(signals, leverage=leverage, initial_capital=initial_capital)
-        
-        # 只记录交易次数>=100的结果
-        if stats['total_trades'] >= 100:
-            result = {
-                'leverage': leverage,
-                'stop_loss_delay_bars': delay_bars,
-                'min_k1_range_percent': k1_pct,
-                'total_trades': stats['total_trades'],
-                'win_rate': stats['win_rate'],
-                'total_pnl': stats['total_pnl'],
-                'final_capital': stats['final_capital'],
-                'profit_factor': stats['profit_factor'],
-                'avg_holding_bars': stats['avg_holding_bars'],
-                'return_rate': (stats['total_pnl'] / (stats['total_trades'] * initial_capital) * 100) if stats['total_trades'] > 0 else 0
-            }
-            results.append(result)
-            
-            # 更新最佳结果（以胜率为标准）
-            if stats['win_rate'] > (best_result['win_rate'] if best_result else 0):
-                best_result = result
-        
-        # 显示进度
-        if count % 100 == 0 or count == total_combinations:
-            best_winrate = best_result['win_rate'] if best_result else 0
-            print(f"进度: {count}/{total_combinations} ({count/total_combinations*100:.1f}%) - 当前最高胜率: {best_winrate:.2f}%", end='\r')
+    # 按(杠杆, 止损延迟, K1)的遍历顺序存放
+    all_results, valid_mask = grid_search(
+        arrays, (leverage_range, stop_loss_delay_bars_range, min_k1_range_range), RESULT_DTYPE,
+        evaluate_k1, make_task,
+        coarse_to_fine=coarse_to_fine, coarse_steps=coarse_steps, refine_top_n=refine_top_n
+    )
+    results = all_results[valid_mask]
     
     print("\n" + "-"*80)
     print(f"✓ 优化完成! 共测试了 {len(results)} 个有效参数组合")
     
     # 按胜率排序
-    results.sort(key=lambda x: x['win_rate'], reverse=True)
+    results = sort_by_winrate(results)
+    best_result = result_to_dict(results[0]) if len(results) and results[0]['win_rate'] > 0 else None
     
     # 筛选胜率超过60%的策略
-    high_winrate_results = [r for r in results if r['win_rate'] >= 60.0]
+    high_winrate_results = [result_to_dict(r) for r in results[results['win_rate'] >= 60.0]]
     print(f"✓ 找到 {len(high_winrate_results)} 个胜率>=60%的策略 (交易次数>=100)")
     
-    # 显示TOP 10结果
-    print("\n" + "="*80)
-    print("TOP 10 最高胜率参数组合 (交易次数>=100)")
-    print("="*80)
-    
-    for i, result in enumerate(results[:10], 1):
-        print(f"\n第 {i} 名:")
-        print(f"  杠杆: {result['leverage']}x | 止损延迟: {result['stop_loss_delay_bars']}根K线 ({result['stop_loss_delay_bars']*15}分钟) | K1涨跌幅: {result['min_k1_range_percent']}%")
-        print(f"  总交易数: {result['total_trades']}")
-        print(f"  胜率: {result['win_rate']:.2f}% ★")
-        print(f"  总盈亏: {result['total_pnl']:+.4f} USDT")
-        print(f"  收益率: {result['return_rate']:+.2f}%")
-        print(f"  盈亏比: {result['profit_factor']:.2f}")
-        print(f"  平均持仓: {result['avg_holding_bars']:.1f}根K线")
-    
-    # 导出完整结果到CSV和LOG
-    print("\n" + "="*80)
-    print("导出优化结果")
-    print("="*80)
-    
-    import csv
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     csv_filename = f"optimization_delay_k1_{timestamp}.csv"
     log_filename = f"optimization_delay_k1_winrate60plus_{timestamp}.log"
     
-    # 导出CSV
-    with open(csv_filename, 'w', newline='', encoding='utf-8-sig') as f:
-        fieldnames = [
-            '排名', '杠杆倍数', '止损延迟(K线)', '止损延迟(分钟)', 'K1涨跌幅%', '总交易数', '胜率%', 
-            '总盈亏USDT', '收益率%', '盈亏比', '平均持仓K线数'
-        ]
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
+    # CSV和LOG在后台线程写入(两者写不同文件，只读取结果)，同时在终端显示TOP 10
+    with ThreadPoolExecutor(max_workers=2) as io_pool:
+        # 导出CSV(逐行生成，不在内存中构造全部行)
+        csv_future = io_pool.submit(
+            write_csv,
+            csv_filename,
+            ['排名', '杠杆倍数', '止损延迟(K线)', '止损延迟(分钟)', 'K1涨跌幅%', '总交易数', '胜率%',
+             '总盈亏USDT', '收益率%', '盈亏比', '平均持仓K线数'],
+            ((i, leverage, delay_bars, delay_bars * 15, k1_pct, total_trades, f"{win_rate:.2f}", f"{total_pnl:.4f}",
+              f"{return_rate:.2f}", f"{profit_factor:.2f}", f"{avg_holding_bars:.1f}")
+             for i, (leverage, delay_bars, k1_pct, total_trades, win_rate, total_pnl, _,
+                     profit_factor, avg_holding_bars, return_rate) in enumerate((r.tolist() for r in results), 1))
+        )
         
-        for i, result in enumerate(results, 1):
-            writer.writerow({
-                '排名': i,
-                '杠杆倍数': result['leverage'],
-                '止损延迟(K线)': result['stop_loss_delay_bars'],
-                '止损延迟(分钟)': result['stop_loss_delay_bars'] * 15,
-                'K1涨跌幅%': result['min_k1_range_percent'],
-                '总交易数': result['total_trades'],
-                '胜率%': f"{result['win_rate']:.2f}",
-                '总盈亏USDT': f"{result['total_pnl']:.4f}",
-                '收益率%': f"{result['return_rate']:.2f}",
-                '盈亏比': f"{result['profit_factor']:.2f}",
-                '平均持仓K线数': f"{result['avg_holding_bars']:.1f}"
-            })
-    
-    print(f"✓ 完整结果已导出到: {csv_filename}")
-    
-    # 导出LOG文件（仅胜率>=60%）
-    if len(high_winrate_results) > 0:
-        with open(log_filename, 'w', encoding='utf-8') as f:
-            write_log_header(f, profit_target_percent, stop_loss_percent, initial_capital,
-                           total_combinations, len(results), len(high_winrate_results))
-            
-            for i, result in enumerate(high_winrate_results, 1):
-                write_strategy_detail(f, i, result, profit_target_percent, 
-                                    stop_loss_percent, initial_capital)
-            
-            write_log_footer(f)
+        # 导出LOG文件（仅胜率>=60%）
+        log_future = None
+        if len(high_winrate_results) > 0:
+            log_future = io_pool.submit(
+                export_log, log_filename, high_winrate_results, len(results), total_combinations,
+                profit_target_percent, stop_loss_percent, initial_capital
+            )
+        
+        # 显示TOP 10结果
+        print("\n" + "="*80)
+        print("TOP 10 最高胜率参数组合 (交易次数>=100)")
+        print("="*80)
+        
+        for i, result in enumerate(map(result_to_dict, results[:10]), 1):
+            print(f"\n第 {i} 名:")
+            print(f"  杠杆: {result['leverage']}x | 止损延迟: {result['stop_loss_delay_bars']}根K线 ({result['stop_loss_delay_bars']*15}分钟) | K1涨跌幅: {result['min_k1_range_percent']}%")
+            print(f"  总交易数: {result['total_trades']}")
+            print(f"  胜率: {result['win_rate']:.2f}% ★")
+            print(f"  总盈亏: {result['total_pnl']:+.4f} USDT")
+            print(f"  收益率: {result['return_rate']:+.2f}%")
+            print(f"  盈亏比: {result['profit_factor']:.2f}")
+            print(f"  平均持仓: {result['avg_holding_bars']:.1f}根K线")
+        
+        # 等待CSV和LOG导出完成
+        print("\n" + "="*80)
+        print("导出优化结果")
+        print("="*80)
         
-        print(f"✓ 胜率>=60%的策略已导出到: {log_filename} (共{len(high_winrate_results)}个)")
-    else:
-        print("✓ 未找到胜率>=60%的策略")
+        csv_future.result()
+        print(f"✓ 完整结果已导出到: {csv_filename}")
+        if log_future is not None:
+            log_future.result()
+            print(f"✓ 胜率>=60%的策略已导出到: {log_filename} (共{len(high_winrate_results)}个)")
+        else:
+            print("✓ 未找到胜率>=60%的策略")
     
     # 显示最佳参数建议
     if best_result:
@@ -7,9 +7,21 @@ import csv
 import os
 import uuid
 import time
+import random
 from 微信提醒 import send_wechat_notification
 from typing import Optional
 
+# orjson可选: 安装后解析行情推送比标准库json快数倍，未安装时使用json
+try:
+	import orjson
+	ORJSON_AVAILABLE = True
+except ImportError:
+	ORJSON_AVAILABLE = False
+
+# 重连退避：首次等待3秒，连续失败时翻倍（上限60秒），并叠加随机抖动，避免断线/限流期间按固定节奏反复冲击服务器
+RECONNECT_DELAY_MIN = 3
+RECONNECT_DELAY_MAX = 60
+
 def is_in_efficient_time(now: Optional[datetime] = None) -> bool:
 	"""
 	判断当前本地时间是否处于高效买入时段。
@@ -155,8 +167,10 @@ async def main():
 	signal_recorded = False  # 交易信号是否已记录（避免重复记录）
 	# 去重控制：仅在每个15m周期内首次突破时提示（使用 has_breakout 控制），无需额外变量
 	
+	connected = False
 	try:
 		async with websockets.connect(url) as ws:
+			connected = True
 			print("=" * 80)
 			print("WebSocket 已连接到 Binance")
 			print("已订阅 ETHUSDT 的 15分钟 和 1分钟 K线")
@@ -168,7 +182,7 @@ async def main():
 			while True:
 				try:
 					msg = await ws.recv()
-					data = json.loads(msg)
+					data = orjson.loads(msg) if ORJSON_AVAILABLE else json.loads(msg)
 					
 					# 币安K线数据格式
 					if 'e' in data and data['e'] == 'kline':
@@ -388,7 +402,6 @@ async def main():
 				
 				except websockets.exceptions.ConnectionClosed:
 					print("⚠ WebSocket 连接已断开，尝试重连...")
-					await asyncio.sleep(3)
 					break
 				except Exception as e:
 					print(f"⚠ 发生异常: {e}")
@@ -396,19 +409,30 @@ async def main():
 	
 	except Exception as e:
 		print(f"✗ 连接失败: {e}")
+	# 返回本次是否成功建立过连接，供外层决定是否重置重连退避
+	return connected
 
 if __name__ == "__main__":
 	print("启动 ETHUSDT K线监听程序 (Binance)...")
 	print("监控所有 15分钟K线")
 	print()
 	
+	backoff = RECONNECT_DELAY_MIN
 	while True:
 		try:
-			asyncio.run(main())
+			if asyncio.run(main()):
+				# 成功连接过（运行一段时间后断开），退避从头开始
+				backoff = RECONNECT_DELAY_MIN
 		except KeyboardInterrupt:
 			print("\n程序已停止")
 			break
 		except Exception as e:
 			print(f"程序异常: {e}")
-			print("3秒后重启...")
-			time.sleep(3)
+		delay = backoff + random.uniform(0, backoff / 2)
+		print(f"{delay:.1f}秒后重启...")
+		try:
+			time.sleep(delay)
+		except KeyboardInterrupt:
+			print("\n程序已停止")
+			break
+		backoff = min(backoff * 2, RECONNECT_DELAY_MAX)
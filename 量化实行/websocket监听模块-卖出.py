@@ -4,8 +4,20 @@ import json
 import csv
 import os
 import time
+import random
 from datetime import datetime
 
+# orjson可选: 安装后解析行情推送比标准库json快数倍，未安装时使用json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# 重连退避：首次等待3秒，连续失败时翻倍（上限60秒），并叠加随机抖动，避免断线/限流期间按固定节奏反复冲击服务器
+RECONNECT_DELAY_MIN = 3
+RECONNECT_DELAY_MAX = 60
+
 CSV_PATH = "trade_signals.csv"
 SYMBOL = "ethusdt"
 WS_URL = f"wss://fstream.binance.com/ws/{SYMBOL}@kline_1m"
@@ -29,16 +41,25 @@ def load_open_positions(csv_path: str):
     返回 dict: {trade_id: {"entry_price": float, "direction": str, "entry_time": str}}
     要求 CSV 表头至少包含：时间, 仓位ID, 方向, 入场价, 是否平仓
     """
+    return _read_open_positions(csv_path)[0]
+
+
+def _read_open_positions(csv_path: str):
+    """
+    load_open_positions 的实现，额外返回本次读取是否完整：
+    (open_positions, complete)。读文件失败、表头缺列或有行解析失败
+    (例如 CSV 正在被写入，最后一行只写了一半)时 complete 为 False。
+    """
     open_positions = {}
     if not os.path.exists(csv_path):
-        return open_positions
+        return open_positions, True
 
     try:
         with open(csv_path, 'r', newline='', encoding='utf-8') as f:
             reader = csv.reader(f)
             rows = list(reader)
             if not rows:
-                return open_positions
+                return open_positions, False
             header = rows[0]
             # 兼容表头找索引
             def idx(name, default=-1):
@@ -52,9 +73,12 @@ def load_open_positions(csv_path: str):
 
             # 基本校验
             if idx_dir == -1 or idx_entry == -1:
-                return open_positions
+                return open_positions, False
 
+            complete = True
             for row in rows[1:]:
+                if not row:
+                    continue
                 try:
                     direction = row[idx_dir]
                     entry_price = float(row[idx_entry])
@@ -71,12 +95,45 @@ def load_open_positions(csv_path: str):
                         "entry_time": entry_time,
                     }
                 except Exception:
+                    complete = False
                     continue
     except Exception:
         # CSV 正在被写入时可能读失败，忽略
-        return open_positions
+        return open_positions, False
+
+    return open_positions, complete
 
-    return open_positions
+
+# 未平仓列表缓存：{'key': (mtime_ns, size) | None, 'positions': dict}
+_open_positions_cache = {'key': None, 'positions': {}}
+
+
+def load_open_positions_cached(csv_path: str):
+    """
+    带缓存的 load_open_positions：仅在 CSV 的修改时间/大小变化时重新解析。
+
+    1m K线每秒推送多次，而仓位只在买入端写入或本模块平仓时才变化，
+    按文件状态判断可避免每条推送都完整读取并解析一遍 CSV。
+    """
+    key = _csv_state(csv_path)
+    if key is None or key != _open_positions_cache['key']:
+        positions, complete = _read_open_positions(csv_path)
+        # 读取失败/不完整，或读取期间文件又被改写时不缓存，下次推送重新读取
+        if complete and key is not None and _csv_state(csv_path) == key:
+            _open_positions_cache['key'] = key
+        else:
+            _open_positions_cache['key'] = None
+        _open_positions_cache['positions'] = positions
+    return _open_positions_cache['positions']
+
+
+def _csv_state(csv_path: str):
+    """返回 CSV 的 (mtime_ns, size)，文件不存在或无法访问时返回 None。"""
+    try:
+        st = os.stat(csv_path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
 
 
 def update_trade_as_closed(csv_path: str, *, trade_id: str, entry_price: float, direction: str,
@@ -235,9 +292,12 @@ async def run_ws():
     # {trade_id: {"high": float, "low": float, "activated": None|"weak"|"normal", "trail_pct": float, "entry_ts": int}}
     trail_state = {}
 
+    backoff = RECONNECT_DELAY_MIN
     while True:
         try:
             async with websockets.connect(WS_URL) as ws:
+                # 连接成功，退避从头开始
+                backoff = RECONNECT_DELAY_MIN
                 print("=" * 80)
                 print("卖出监听已连接 Binance 1m K线 (ETHUSDT)")
                 print("目标: 做多上涨≥2.36% 或 做空下跌≥2.36% 打印仓位ID 卖出")
@@ -246,13 +306,13 @@ async def run_ws():
 
                 while True:
                     msg = await ws.recv()
-                    data = json.loads(msg)
+                    data = orjson.loads(msg) if ORJSON_AVAILABLE else json.loads(msg)
                     if 'e' in data and data['e'] == 'kline':
                         k = data['k']
                         current_price = float(k['c'])  # 实时价格（k线的当前收盘）
 
-                        # 刷新未平仓列表（允许买入端新增仓位后即时纳入追踪）
-                        open_positions = load_open_positions(CSV_PATH)
+                        # 刷新未平仓列表（允许买入端新增仓位后即时纳入追踪；文件未变化时复用缓存）
+                        open_positions = load_open_positions_cached(CSV_PATH)
                         if not open_positions:
                             continue
 
@@ -387,11 +447,13 @@ async def run_ws():
                                     if updated:
                                         sold_ids.add(trade_id); continue
         except websockets.exceptions.ConnectionClosed:
-            print("⚠ WebSocket连接断开，3秒后重连...")
-            await asyncio.sleep(3)
+            print("⚠ WebSocket连接断开")
         except Exception as e:
             print(f"⚠ 发生异常: {e}")
-            await asyncio.sleep(2)
+        delay = backoff + random.uniform(0, backoff / 2)
+        print(f"⏳ {delay:.1f}秒后重连...")
+        await asyncio.sleep(delay)
+        backoff = min(backoff * 2, RECONNECT_DELAY_MAX)
 
 
 if __name__ == '__main__':
@@ -1,20 +1,42 @@
 import time
 import hmac
+import json
 import hashlib
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 
 
+def _wallet_balance(balances: dict, asset: str) -> float:
+    """
+    从按资产索引的余额字典中取钱包余额（balance 字段）；资产缺失或字段为空时返回 0.0
+    （新账户/零余额资产可能不在返回中）。
+
+    注意：钱包余额包含已被持仓占用的保证金，有持仓时大于可用余额（availableBalance），
+    这里沿用 get_balance 一直以来返回钱包余额的口径。
+    """
+    return float((balances.get(asset) or {}).get('balance') or 0.0)
+
+
 class BinanceTrader:
 
+    # 余额缓存有效期（秒）：交易决策本身基于秒级行情，数十秒内的余额同样可用
+    BALANCE_TTL = 60
+    # 批量下单接口单次最多5笔订单
+    BATCH_ORDER_LIMIT = 5
+
     def get_symbol_info(self, symbol: str):
         """
-        获取交易对信息（如最小下单量、步进等）
+        获取交易对信息（如最小下单量、步进等），结果按交易对缓存
         """
+        if symbol in self._symbol_info:
+            return self._symbol_info[symbol]
         data = self._request('GET', f"/fapi/v1/exchangeInfo", signed=False)
         for s in data['symbols']:
-            if s['symbol'] == symbol:
-                return s
+            self._symbol_info[s['symbol']] = s
+        if symbol in self._symbol_info:
+            return self._symbol_info[symbol]
         raise ValueError(f"找不到交易对信息: {symbol}")
 
     def __init__(self, api_key: str, api_secret: str, use_testnet: bool = False, base_url: str | None = None):
@@ -35,14 +57,35 @@ class BinanceTrader:
         self.headers = {
             'X-MBX-APIKEY': self.api_key,
         }
+        # 每个线程复用自己的会话（见 session 属性）：keep-alive 连接池，后续请求省去 TCP/TLS 握手
+        self._local = threading.local()
         # 与服务器时间的毫秒级偏移（正数表示本地比服务器慢）
         self.time_offset_ms = 0
+        # 余额缓存（/fapi/v2/balance 返回按资产索引 {asset: item}）及其查询时间，
+        # 超过 BALANCE_TTL 或下单/调整保证金后刷新
+        self._balances = None
+        self._balances_ts = 0.0
+        # 交易对信息缓存：LOT_SIZE 等过滤器基本不变，避免每次下单都下载整份 exchangeInfo
+        self._symbol_info = {}
         # 尝试同步时间（忽略失败，遇到-1021再重试）
         try:
             self.sync_time()
         except Exception:
             pass
     
+    @property
+    def session(self) -> requests.Session:
+        """
+        当前线程的HTTP会话（首次使用时创建）
+
+        requests.Session 不保证线程安全，buy() 并发查询价格与交易对信息时各线程各用一个会话
+        """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
     def _sign(self, params: dict) -> str:
         query_string = urlencode(params)
         return hmac.new(
@@ -62,12 +105,12 @@ class BinanceTrader:
 
         try:
             if method == 'GET':
-                response = requests.get(url, headers=self.headers, params=params, timeout=10)
+                response = self.session.get(url, headers=self.headers, params=params, timeout=10)
             elif method == 'POST':
                 # 币安官方推荐：所有参数拼到URL上，body为空
                 from urllib.parse import urlencode
                 full_url = url + '?' + urlencode(params)
-                response = requests.post(full_url, headers=self.headers, timeout=10)
+                response = self.session.post(full_url, headers=self.headers, timeout=10)
             else:
                 raise ValueError(f"Unsupported method: {method}")
 
@@ -95,7 +138,7 @@ class BinanceTrader:
         """与交易所服务器时间同步，计算时间偏移（毫秒）。"""
         url = f"{self.base_url}/fapi/v1/time"
         start = int(time.time() * 1000)
-        resp = requests.get(url, timeout=5)
+        resp = self.session.get(url, timeout=5)
         resp.raise_for_status()
         server_time = resp.json().get('serverTime')
         end = int(time.time() * 1000)
@@ -103,17 +146,25 @@ class BinanceTrader:
         local_mid = (start + end) // 2
         self.time_offset_ms = int(server_time - local_mid)
     
-    def get_balance(self):
-        """获取USDT余额"""
-        result = self._request('GET', "/fapi/v2/balance", signed=True)
-        # 预期返回为列表
-        if isinstance(result, list):
-            for item in result:
-                if isinstance(item, dict) and item.get('asset') == 'USDT':
-                    return float(item.get('balance', 0))
-            return 0.0
-        # 若为字典，可能为错误返回
-        raise RuntimeError(f"Unexpected balance response: {result}")
+    def get_balance(self, refresh: bool = False, ttl: float = None, asset: str = 'USDT'):
+        """
+        获取指定资产的钱包余额（默认USDT，不是可用余额，见 _wallet_balance）
+
+        余额只在成交/调整保证金后才会变化，因此缓存上一次查询结果：
+        缓存在 ttl 秒内（默认 BALANCE_TTL）直接返回，下单或追加保证金后自动失效；
+        refresh=True 强制重新查询。
+        """
+        if ttl is None:
+            ttl = self.BALANCE_TTL
+        if self._balances is None or refresh or time.time() - self._balances_ts >= ttl:
+            result = self._request('GET', "/fapi/v2/balance", signed=True)
+            # 预期返回为列表；若为字典，可能为错误返回
+            if not isinstance(result, list):
+                raise RuntimeError(f"Unexpected balance response: {result}")
+            # 按资产建索引后缓存，之后每次取值只需一次字典查找
+            self._balances = {item.get('asset'): item for item in result if isinstance(item, dict)}
+            self._balances_ts = time.time()
+        return _wallet_balance(self._balances, asset)
     
     def set_margin_mode(self, symbol: str, margin_type: str = "ISOLATED"):
         """
@@ -167,11 +218,14 @@ class BinanceTrader:
             'type': type_,
             'positionSide': position_side
         }
-        return self._request('POST', '/fapi/v2/positionMargin', params, signed=True)
+        result = self._request('POST', '/fapi/v2/positionMargin', params, signed=True)
+        # 保证金变动后余额缓存失效，下次查询时重新拉取
+        self._balances = None
+        return result
 
     def buy(self, symbol: str = "ETHUSDT", quantity: float = None, usdt_amount: float = None,
             leverage: int = None, margin_type: str = None, extra_margin: float = None,
-            side: str = "BUY", position_side: str = "BOTH"):
+            side: str = "BUY", position_side: str = "BOTH", price: float = None):
         """
         市价开仓（支持做多/做空）并可选追加保证金
         参数：
@@ -183,14 +237,28 @@ class BinanceTrader:
             extra_margin: 追加保证金
             side: "BUY"(做多) 或 "SELL"(做空)
             position_side: "BOTH"(单向), "LONG", "SHORT"
+            price: 当前价格（可选，由WebSocket推送的实时价传入时不再走REST查询）
         """
+        # 价格只取一次：优先使用调用方从WebSocket拿到的实时价，否则REST查询一次，
+        # 换算数量与名义价值校验共用同一个价格。
+        # 交易对信息已缓存时只剩价格一次请求；首次下单两者都要走REST，互不依赖，
+        # 并发发出（各线程使用各自的会话），等待时间取两者较慢者而非之和
+        if price is None and symbol not in self._symbol_info:
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                price_future = executor.submit(self.get_price, symbol)
+                info_future = executor.submit(self.get_symbol_info, symbol)
+                price = price_future.result()
+                symbol_info = info_future.result()
+        else:
+            if price is None:
+                price = self.get_price(symbol)
+            symbol_info = self.get_symbol_info(symbol)
+
         # 如果提供了USDT金额，自动计算数量
         if usdt_amount is not None:
-            price = self.get_price(symbol)
             quantity = usdt_amount / price
 
         # 获取交易对最小下单量和精度
-        symbol_info = self.get_symbol_info(symbol)
         lot_size = None
         step_size = None
         min_qty = None
@@ -220,7 +288,7 @@ class BinanceTrader:
 
         # 校验名义价值（notional）是否满足币安最小要求（20 USDT）
         # 注意：名义价值 = 数量 × 当前价格，和杠杆无关，杠杆只影响保证金，不影响下单最小金额
-        notional = float(quantity) * self.get_price(symbol)
+        notional = float(quantity) * price
         if notional < 20:
             raise ValueError(f"下单名义价值为 {notional:.2f} USDT，低于币安最小要求20 USDT。请增大下单金额或数量。\n（杠杆倍数不影响最小下单金额要求）")
         
@@ -250,12 +318,45 @@ class BinanceTrader:
         from urllib.parse import urlencode
         print(f"[DEBUG] 下单参数: {params}")
         print(f"[DEBUG] 完整请求URL: {self.base_url}/fapi/v1/order?{urlencode(params)}")
-        order_result = self._request('POST', "/fapi/v1/order", params, signed=True)
-        # 下单后追加保证金
-        if extra_margin is not None and extra_margin > 0:
-            self.add_position_margin(symbol, extra_margin, position_side=position_side, type_=1)
+        try:
+            order_result = self._request('POST', "/fapi/v1/order", params, signed=True)
+            # 下单后追加保证金
+            if extra_margin is not None and extra_margin > 0:
+                self.add_position_margin(symbol, extra_margin, position_side=position_side, type_=1)
+        finally:
+            # 请求超时/报错时订单也可能已成交，无论成败余额缓存都失效，下次查询时重新拉取
+            self._balances = None
         return order_result
 
+    def batch_orders(self, orders: list):
+        """
+        批量下单（/fapi/v1/batchOrders），多笔订单合并为一次签名请求
+
+        参数:
+            orders: 订单参数列表，每项与单笔下单参数一致，数值使用字符串，如
+                    {'symbol': 'ETHUSDT', 'side': 'BUY', 'type': 'MARKET',
+                     'quantity': '0.010', 'positionSide': 'BOTH'}
+        返回:
+            与 orders 一一对应的结果列表；单笔失败时对应项为 {'code': ..., 'msg': ...}
+        异常:
+            某一组请求失败时抛出 RuntimeError，之前各组已提交订单的结果挂在异常的
+            partial_results 属性上（与 orders 前若干项一一对应），便于调用方撤单/平仓
+        """
+        results = []
+        try:
+            # 超过单次上限时按 BATCH_ORDER_LIMIT 分组，每组一次签名+往返
+            for start in range(0, len(orders), self.BATCH_ORDER_LIMIT):
+                chunk = orders[start:start + self.BATCH_ORDER_LIMIT]
+                params = {'batchOrders': json.dumps(chunk, separators=(',', ':'))}
+                results.extend(self._request('POST', "/fapi/v1/batchOrders", params, signed=True))
+        except RuntimeError as e:
+            e.partial_results = results
+            raise
+        finally:
+            # 只要发出过请求就可能已有成交，余额缓存失效，下次查询时重新拉取
+            self._balances = None
+        return results
+
     def close_cross_margin_mode(self, symbol: str):
         """
         切换为逐仓模式（关闭联合保证金/全仓模式）